@@ -1,11 +1,23 @@
 from django.contrib import admin
 from django.utils import timezone
+from django.utils.html import format_html
 from django.contrib import messages
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.admin import UserAdmin
+from django.contrib.admin.views.main import ChangeList
 from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
-from .models import Patient, District, FieldAudit, Coordinator, ActionLog
+from .models import Patient, District, Hospital, FieldAudit, Coordinator, ActionLog, ExportJob, HospitalRiskScore, PatientOverlap, AuditLocationFlag
+from .projections import AUDIT_HEAVY_FIELDS, PATIENT_HEAVY_FIELDS
+from .search import search_patient_ids
+from .stats import StatsSnapshot, mark_dirty_many
+
+# Rows per INSERT when admin actions write ActionLogs in bulk
+ACTION_LOG_BATCH_SIZE = 500
+# Most patients the changelist search returns from the search index
+ADMIN_SEARCH_LIMIT = 1000
 
 # First unregister models from default admin
 admin.site.unregister(Group)
@@ -106,13 +118,33 @@ class CoordinatorAdmin(admin.ModelAdmin):
         if user:
             user.delete()
 
+class PatientChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        # The list columns never show the documents or the joined audit's free text
+        return super().get_queryset(request, exclude_parameters).defer(
+            *PATIENT_HEAVY_FIELDS, *(f'audit__{field}' for field in AUDIT_HEAVY_FIELDS)
+        )
+
+class DeviationListFilter(admin.SimpleListFilter):
+    title = 'deviation'
+    parameter_name = 'deviation'
+
+    def lookups(self, request, model_admin):
+        return Patient.DEVIATION_CHOICES
+
+    def queryset(self, request, queryset):
+        if self.value() in Patient.DEVIATION_FLAGS:
+            return queryset.with_deviation(self.value())
+        return queryset
+
 class PatientAdmin(admin.ModelAdmin):
     list_display = ('patient_name', 'case_id', 'get_district', 'get_ehcp_name', 'package_name', 'package_code', 
                    'admission_date', 'discharge_date', 'missing_records', 'money_collection', 'total_oope')
-    list_filter = ('audit__district', 'money_collection', 'missing_records', 'admission_date', 'discharge_date')
+    list_filter = ('audit__district', 'money_collection', 'missing_records', DeviationListFilter, 'admission_date', 'discharge_date')
     search_fields = ('patient_name', 'case_id', 'mobile_number', 'package_name', 'package_code', 'audit__ehcp_name')
     date_hierarchy = 'admission_date'
     ordering = ('-admission_date',)
+    list_select_related = ('audit__district',)
     
     fieldsets = (
         ('Basic Information', {
@@ -125,15 +157,24 @@ class PatientAdmin(admin.ModelAdmin):
             'fields': ('package_name', 'package_code')
         }),
         ('Documents', {
-            'fields': ('case_file', 'discharge_summary', 'bills_documents'),
+            'fields': ('case_file', 'discharge_summary', 'bills_documents', 'signature_preview'),
             'classes': ('collapse',)
         })
     )
     
-    readonly_fields = ('digital_signature',)
+    readonly_fields = ('signature_preview',)
     
     actions = ['verify_records', 'check_money_status', 'mark_audit_complete']
     
+    def signature_preview(self, obj):
+        if not obj.digital_signature_file:
+            return '-'
+        return format_html(
+            '<img src="{}" alt="Digital Signature" loading="lazy" style="max-width: 300px;">',
+            obj.digital_signature_file.url
+        )
+    signature_preview.short_description = 'Digital Signature'
+
     def get_district(self, obj):
         return obj.audit.district if obj.audit else None
     get_district.short_description = 'District'
@@ -153,80 +194,116 @@ class PatientAdmin(admin.ModelAdmin):
             return qs.filter(audit__district=coordinator.district)
         return qs.none()
 
-    def verify_records(self, request, queryset):
+    def get_search_results(self, request, queryset, search_term):
+        # Served by the search index instead of LIKE '%term%' scans over every search field
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        matches = Q(pk__in=search_patient_ids(search_term, limit=ADMIN_SEARCH_LIMIT)) | Q(
+            audit__in=FieldAudit.objects.filter(ehcp_name__icontains=search_term).values('id')
+        )
+        return queryset.filter(matches), False
+
+    def get_changelist(self, request, **kwargs):
+        return PatientChangeList
+
+    def _apply_action(self, request, queryset, action_type, description, **changes):
+        """Log ``action_type`` for every selected patient in the coordinator's
+        district and apply ``changes`` to them, as a handful of set-based queries.
+
+        Returns ``(logged, updated)``, with ``updated`` None when there are no
+        changes, or ``None`` when the user has no active coordinator.
+        """
         coordinator = Coordinator.objects.filter(user=request.user, is_active=True).first()
         if not coordinator:
             messages.error(request, "No active coordinator found.")
-            return
+            return None
+
+        with transaction.atomic():
+            patients = queryset.filter(audit__district=coordinator.district_id)
+            rows = list(patients.values_list('id', 'patient_name', 'audit__visit_date'))
+            ActionLog.objects.bulk_create(
+                [
+                    ActionLog(
+                        coordinator=coordinator,
+                        action_type=action_type,
+                        description=description.format(name=patient_name),
+                        patient_id=patient_id,
+                        district_id=coordinator.district_id,
+                        status='completed'
+                    )
+                    for patient_id, patient_name, _ in rows
+                ],
+                batch_size=ACTION_LOG_BATCH_SIZE
+            )
+
+            updated = None
+            if changes:
+                # Only touch rows whose flags actually change
+                unchanged = Q(**changes)
+                updated = Patient.objects.filter(pk__in=patients.values('pk')).exclude(unchanged).update(**changes, updated_at=timezone.now())
+                # update() bypasses the signals that maintain DailyStats
+                mark_dirty_many((coordinator.district_id, visit_date) for _, _, visit_date in rows)
+        return len(rows), updated
+
+    def _report(self, request, queryset, done, verb):
+        logged, updated = done
+        message = f"Successfully {verb} for {logged} patients"
+        if updated is not None:
+            message += f" ({updated} updated)"
+        self.message_user(request, message + ".")
+        skipped = queryset.count() - logged
+        if skipped:
+            self.message_user(request, f"Skipped {skipped} patients outside your district.", messages.WARNING)
 
-        for patient in queryset:
-            if patient.audit.district == coordinator.district:
-                ActionLog.objects.create(
-                    coordinator=coordinator,
-                    action_type='RECORD_CHECK',
-                    description=f'Records verified for patient {patient.patient_name}',
-                    patient=patient,
-                    district=patient.audit.district,
-                    status='completed'
-                )
-                patient.missing_records = False
-                patient.save()
-
-        self.message_user(request, f"Successfully verified records for {queryset.count()} patients.")
+    def verify_records(self, request, queryset):
+        done = self._apply_action(
+            request, queryset, 'RECORD_CHECK', 'Records verified for patient {name}', missing_records=False
+        )
+        if done:
+            self._report(request, queryset, done, 'verified records')
     verify_records.short_description = "Verify patient records"
 
     def check_money_status(self, request, queryset):
-        coordinator = Coordinator.objects.filter(user=request.user, is_active=True).first()
-        if not coordinator:
-            messages.error(request, "No active coordinator found.")
-            return
-
-        for patient in queryset:
-            if patient.audit.district == coordinator.district:
-                ActionLog.objects.create(
-                    coordinator=coordinator,
-                    action_type='MONEY_VERIFY',
-                    description=f'Money status verified for patient {patient.patient_name}',
-                    patient=patient,
-                    district=patient.audit.district,
-                    status='completed'
-                )
-                patient.money_collection = True
-                patient.save()
-
-        self.message_user(request, f"Successfully verified money status for {queryset.count()} patients.")
+        done = self._apply_action(
+            request, queryset, 'MONEY_VERIFY', 'Money status verified for patient {name}', money_collection=True
+        )
+        if done:
+            self._report(request, queryset, done, 'verified money status')
     check_money_status.short_description = "Verify money status"
 
     def mark_audit_complete(self, request, queryset):
-        coordinator = Coordinator.objects.filter(user=request.user, is_active=True).first()
-        if not coordinator:
-            messages.error(request, "No active coordinator found.")
-            return
-
-        for patient in queryset:
-            if patient.audit.district == coordinator.district:
-                ActionLog.objects.create(
-                    coordinator=coordinator,
-                    action_type='AUDIT',
-                    description=f'Audit completed for patient {patient.patient_name}',
-                    patient=patient,
-                    district=patient.audit.district,
-                    status='completed'
-                )
-
-        self.message_user(request, f"Successfully marked audit complete for {queryset.count()} patients.")
+        done = self._apply_action(request, queryset, 'AUDIT', 'Audit completed for patient {name}')
+        if done:
+            self._report(request, queryset, done, 'marked audit complete')
     mark_audit_complete.short_description = "Mark audit as complete"
 
+class FieldAuditChangeList(ChangeList):
+    def get_queryset(self, request, exclude_parameters=None):
+        return super().get_queryset(request, exclude_parameters).defer(*AUDIT_HEAVY_FIELDS)
+
+    def get_results(self, request):
+        super().get_results(request)
+        # Resolve the coordinator of every district on this page in one query
+        district_ids = {audit.district_id for audit in self.result_list}
+        coordinators = {}
+        for coordinator in Coordinator.objects.filter(district_id__in=district_ids, is_active=True).order_by('name', 'pk'):
+            coordinators.setdefault(coordinator.district_id, coordinator)
+        for audit in self.result_list:
+            audit.assigned_coordinator = coordinators.get(audit.district_id)
+
 class FieldAuditAdmin(admin.ModelAdmin):
     list_display = ('ehcp_name', 'district', 'visit_date', 'total_patients', 'completed_patients', 'assigned_coordinator')
     list_filter = ('district', 'visit_date', 'status')
     date_hierarchy = 'visit_date'
     ordering = ('-visit_date',)
+    list_select_related = ('district',)
     inlines = [PatientInline]
+    autocomplete_fields = ('hospital',)
 
     fieldsets = (
         ('Hospital Information', {
-            'fields': (('district', 'hospital_id'), ('ehcp_name', 'ehcp_type')),
+            'fields': (('district', 'hospital'), ('ehcp_name', 'ehcp_type')),
             'classes': ('wide',),
             'description': 'Basic details about the healthcare facility'
         }),
@@ -299,7 +376,15 @@ class FieldAuditAdmin(admin.ModelAdmin):
             messages.error(request, f'Error saving related data: {str(e)}')
 
     def get_queryset(self, request):
-        qs = super().get_queryset(request)
+        # Correlated counts rather than a join: a GROUP BY over every audit
+        # column would also leak into the changelist count and date_hierarchy queries
+        patients = Patient.objects.filter(audit=OuterRef('pk')).order_by().values('audit')
+        qs = super().get_queryset(request).annotate(
+            patient_count=Coalesce(Subquery(patients.annotate(n=Count('pk')).values('n')), 0),
+            completed_patient_count=Coalesce(Subquery(
+                patients.filter(missing_records=False, money_collection=True).annotate(n=Count('pk')).values('n')
+            ), 0),
+        )
         if request.user.is_superuser:
             return qs
         coordinator = Coordinator.objects.filter(user=request.user).first()
@@ -307,16 +392,24 @@ class FieldAuditAdmin(admin.ModelAdmin):
             return qs.filter(district=coordinator.district)
         return qs.none()
 
+    def get_changelist(self, request, **kwargs):
+        return FieldAuditChangeList
+
     def total_patients(self, obj):
-        return obj.patients.count()
+        return obj.patient_count
     total_patients.short_description = 'Total Patients'
+    total_patients.admin_order_field = 'patient_count'
 
     def completed_patients(self, obj):
-        return obj.patients.filter(missing_records=False, money_collection=True).count()
+        return obj.completed_patient_count
     completed_patients.short_description = 'Completed'
+    completed_patients.admin_order_field = 'completed_patient_count'
 
     def assigned_coordinator(self, obj):
-        coordinator = Coordinator.objects.filter(district=obj.district, is_active=True).first()
+        if hasattr(obj, 'assigned_coordinator'):
+            coordinator = obj.assigned_coordinator
+        else:
+            coordinator = Coordinator.objects.filter(district=obj.district_id, is_active=True).first()
         return coordinator.name if coordinator else 'Not Assigned'
     assigned_coordinator.short_description = 'Assigned Coordinator'
 
@@ -336,6 +429,101 @@ class ActionLogAdmin(admin.ModelAdmin):
             return qs.filter(coordinator=coordinator)
         return qs.none()
 
+class HospitalAdmin(admin.ModelAdmin):
+    list_display = ('code', 'name', 'ehcp_type', 'district', 'latitude', 'longitude')
+    list_filter = ('district', 'ehcp_type')
+    search_fields = ('code', 'name')
+    ordering = ('name',)
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request).select_related('district')
+        if request.user.is_superuser:
+            return qs
+        coordinator = Coordinator.objects.filter(user=request.user).first()
+        if coordinator:
+            return qs.filter(district=coordinator.district)
+        return qs.none()
+
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('export_type', 'hospital_id', 'requested_by', 'status', 'progress', 'attempts', 'created_at', 'expires_at')
+    list_filter = ('export_type', 'status', 'created_at')
+    search_fields = ('hospital_id', 'requested_by__username', 'error')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at',)
+    readonly_fields = ('progress', 'attempts', 'file', 'error', 'started_at', 'finished_at', 'expires_at')
+
+class HospitalRiskScoreAdmin(admin.ModelAdmin):
+    list_display = ('hospital', 'score', 'patients', 'audits', 'deviation_rate', 'money_collection_rate',
+                    'oope_p90', 'package_concentration', 'repeat_findings', 'fraud_findings', 'scored_at')
+    list_filter = ('hospital__district',)
+    search_fields = ('hospital__code', 'hospital__name')
+    ordering = ('-score',)
+    list_select_related = ('hospital',)
+
+    # Written only by the score_hospitals command
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class PatientOverlapAdmin(admin.ModelAdmin):
+    list_display = ('patient_summary', 'other_summary', 'match', 'overlap_days', 'status', 'last_seen')
+    list_filter = ('status', 'match', 'patient__audit__district')
+    search_fields = ('patient__case_id', 'other__case_id', 'patient__mobile_number', 'patient__patient_name')
+    ordering = ('-last_seen', '-overlap_days')
+    list_select_related = ('patient__audit', 'other__audit')
+    list_editable = ('status',)
+    readonly_fields = ('patient', 'other', 'match', 'overlap_days', 'detected_at', 'last_seen')
+    actions = ['mark_confirmed', 'mark_dismissed']
+
+    def _summary(self, patient):
+        return format_html(
+            '{} ({})<br><small>{} &middot; {} to {}</small>',
+            patient.patient_name, patient.case_id, patient.audit.ehcp_name,
+            patient.admission_date, patient.discharge_date or '?'
+        )
+
+    def patient_summary(self, obj):
+        return self._summary(obj.patient)
+    patient_summary.short_description = 'Admission'
+
+    def other_summary(self, obj):
+        return self._summary(obj.other)
+    other_summary.short_description = 'Overlapping admission'
+
+    def has_add_permission(self, request):
+        return False
+
+    def mark_confirmed(self, request, queryset):
+        updated = queryset.update(status='confirmed')
+        messages.success(request, f"Marked {updated} pair(s) as confirmed double claims.")
+    mark_confirmed.short_description = "Mark as confirmed double claims"
+
+    def mark_dismissed(self, request, queryset):
+        updated = queryset.update(status='dismissed')
+        messages.success(request, f"Dismissed {updated} pair(s).")
+    mark_dismissed.short_description = "Dismiss selected pairs"
+
+class AuditLocationFlagAdmin(admin.ModelAdmin):
+    list_display = ('audit', 'auditor_name', 'off_site', 'distance_km', 'impossible_travel',
+                    'previous_audit', 'travel_km', 'travel_hours', 'speed_kmh', 'last_seen')
+    list_filter = ('off_site', 'impossible_travel', 'audit__district')
+    search_fields = ('audit__auditor_name', 'audit__ehcp_name', 'audit__hospital__code')
+    ordering = ('-last_seen', '-speed_kmh')
+    list_select_related = ('audit', 'previous_audit')
+
+    def auditor_name(self, obj):
+        return obj.audit.auditor_name
+    auditor_name.short_description = 'Auditor'
+
+    # Written only by the verify_locations command
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 class DistrictAdmin(admin.ModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
@@ -368,9 +556,10 @@ class HospitalAdminSite(AdminSite):
 
     def index(self, request, extra_context=None):
         # Get statistics
-        total_patients = Patient.objects.count()
-        total_audits = FieldAudit.objects.count()
-        total_issues = Patient.objects.filter(missing_records=True).count()
+        totals = StatsSnapshot().totals
+        total_patients = totals['patients']
+        total_audits = totals['audits']
+        total_issues = totals['patients_missing_records']
 
         # Get recent actions
         from django.contrib.admin.models import LogEntry
@@ -397,10 +586,15 @@ admin_site = HospitalAdminSite(name='hospital_admin')
 
 # Register your models with the custom admin site
 admin_site.register(District, DistrictAdmin)
+admin_site.register(Hospital, HospitalAdmin)
 admin_site.register(Patient, PatientAdmin)
 admin_site.register(FieldAudit, FieldAuditAdmin)
 admin_site.register(Coordinator, CoordinatorAdmin)
 admin_site.register(ActionLog, ActionLogAdmin)
+admin_site.register(ExportJob, ExportJobAdmin)
+admin_site.register(HospitalRiskScore, HospitalRiskScoreAdmin)
+admin_site.register(PatientOverlap, PatientOverlapAdmin)
+admin_site.register(AuditLocationFlag, AuditLocationFlagAdmin)
 
 # Unregister models from the default admin site
 from django.contrib import admin
@@ -0,0 +1,194 @@
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from django.db.models import Count, FloatField, Max
+from django.db.models.functions import Cast
+
+from .models import DailyStats, FieldAudit, Patient
+
+
+# Rows fetched per round trip while loading the cube
+LOAD_CHUNK_SIZE = 5000
+
+AUDIT_DIMENSIONS = ('district', 'month', 'ehcp_type', 'auditor', 'status')
+PATIENT_DIMENSIONS = AUDIT_DIMENSIONS + ('package', 'deviation')
+
+AUDIT_MEASURES = ('audits', 'beneficiaries')
+PATIENT_MEASURES = ('patients', 'total_oope', 'missing_records', 'money_collection', 'flagged')
+
+# The deviation dimension's label for patients without any deviation
+NO_DEVIATION = 'none'
+
+
+class AnalyticsError(ValueError):
+    pass
+
+
+def data_version():
+    """Changes whenever the source data of the cube does.
+
+    Every change the signals see recounts its DailyStats buckets by deleting
+    and re-inserting them, and primary keys are never reused, so the highest
+    id moves on every insert and the row count drops on deletes.
+    """
+    version = DailyStats.objects.aggregate(last=Max('id'), rows=Count('id'))
+    return version['last'], version['rows']
+
+
+def _frame(rows, columns):
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+class Cube:
+    """Audit and patient counters pre-aggregated over every dimension.
+
+    Built from two column-only queries and aggregated with pandas. Pivots
+    filter and regroup these aggregates in memory and never go back to the
+    database. A patient counts under each of its deviations in the
+    deviation dimension, so its values do not add up to the patient total.
+    """
+
+    def __init__(self):
+        audits = _frame(
+            FieldAudit.objects.order_by().values_list(
+                'id', 'district__name', 'visit_date', 'ehcp_type', 'auditor_name', 'status', 'beneficiaries'
+            ).iterator(chunk_size=LOAD_CHUNK_SIZE),
+            ['audit_id', 'district', 'visit_date', 'ehcp_type', 'auditor', 'status', 'beneficiaries'],
+        )
+        audits['month'] = pd.to_datetime(audits['visit_date']).dt.strftime('%Y-%m')
+        audits['audits'] = 1
+        audits['beneficiaries'] = audits['beneficiaries'].fillna(0).astype(np.int64)
+        for dimension in AUDIT_DIMENSIONS:
+            audits[dimension] = audits[dimension].fillna('').astype('category')
+
+        patients = _frame(
+            Patient.objects.order_by().values_list(
+                'audit_id', 'package_name', 'deviation_flags', 'missing_records', 'money_collection',
+                Cast('total_oope', FloatField()),
+            ).iterator(chunk_size=LOAD_CHUNK_SIZE),
+            ['audit_id', 'package', 'deviation_flags', 'missing_records', 'money_collection', 'total_oope'],
+        )
+        patients = patients.merge(audits[['audit_id', *AUDIT_DIMENSIONS]], on='audit_id')
+        patients['package'] = patients['package'].fillna('').astype('category')
+        patients['patients'] = 1
+        patients['total_oope'] = patients['total_oope'].fillna(0.0)
+        patients['missing_records'] = patients['missing_records'].astype(np.int64)
+        patients['money_collection'] = patients['money_collection'].astype(np.int64)
+        patients['flagged'] = (patients['missing_records'] | patients['money_collection']).astype(np.int64)
+
+        self.audits = self._aggregate(audits, AUDIT_DIMENSIONS, AUDIT_MEASURES)
+        self.patients = self._aggregate(
+            patients, AUDIT_DIMENSIONS + ('package', 'deviation_flags'), PATIENT_MEASURES
+        )
+        self.patients_by_deviation = self._by_deviation(self.patients)
+
+    @staticmethod
+    def _aggregate(frame, dimensions, measures):
+        return frame.groupby(list(dimensions), observed=True, sort=False)[list(measures)].sum().reset_index()
+
+    @staticmethod
+    def _by_deviation(patients):
+        labelled = []
+        for deviation, flag in Patient.DEVIATION_FLAGS.items():
+            labelled.append(patients[(patients['deviation_flags'] & flag) > 0].assign(deviation=deviation))
+        labelled.append(patients[patients['deviation_flags'] == 0].assign(deviation=NO_DEVIATION))
+        frame = pd.concat(labelled, ignore_index=True)
+        frame['deviation'] = frame['deviation'].astype('category')
+        return frame
+
+    def pivot(self, measure, rows, columns=None, filters=None, since=None, until=None):
+        """``measure`` summed by the ``rows`` dimension (and ``columns``, if given).
+
+        ``filters`` maps dimensions to the values to keep; ``since`` and
+        ``until`` bound the months ('YYYY-MM', inclusive).
+        """
+        if not rows:
+            raise AnalyticsError('A rows dimension is required.')
+        filters = filters or {}
+        dimensions = [dimension for dimension in (rows, columns) if dimension]
+        if measure in AUDIT_MEASURES:
+            allowed = AUDIT_DIMENSIONS
+        elif measure in PATIENT_MEASURES:
+            allowed = PATIENT_DIMENSIONS
+        else:
+            raise AnalyticsError(f'Unknown measure "{measure}".')
+        for dimension in dimensions + list(filters):
+            if dimension not in allowed:
+                raise AnalyticsError(f'"{measure}" cannot be broken down or filtered by "{dimension}".')
+        if columns and columns == rows:
+            raise AnalyticsError('Rows and columns must be different dimensions.')
+
+        if measure in AUDIT_MEASURES:
+            frame = self.audits
+        elif 'deviation' in dimensions:
+            frame = self.patients_by_deviation
+        else:
+            frame = self.patients
+
+        keep = np.ones(len(frame), dtype=bool)
+        for dimension, values in filters.items():
+            if dimension == 'deviation' and 'deviation' not in dimensions:
+                keep &= self._deviation_mask(frame, values)
+            else:
+                keep &= frame[dimension].isin(values).to_numpy()
+        if since or until:
+            months = [
+                month for month in frame['month'].cat.categories
+                if (not since or month >= since) and (not until or month <= until)
+            ]
+            keep &= frame['month'].isin(months).to_numpy()
+
+        totals = frame[keep].groupby(dimensions, observed=True)[measure].sum()
+        if measure == 'total_oope':
+            totals = totals.round(2)
+        if not columns:
+            return {
+                'rows': [str(label) for label in totals.index],
+                'values': totals.tolist(),
+            }
+        table = totals.unstack(fill_value=0)
+        return {
+            'rows': [str(label) for label in table.index],
+            'columns': [str(label) for label in table.columns],
+            'values': table.to_numpy().tolist(),
+        }
+
+    @staticmethod
+    def _deviation_mask(frame, deviations):
+        flags = frame['deviation_flags'].to_numpy()
+        keep = np.zeros(len(frame), dtype=bool)
+        for deviation in deviations:
+            if deviation == NO_DEVIATION:
+                keep |= flags == 0
+            elif deviation in Patient.DEVIATION_FLAGS:
+                keep |= (flags & Patient.DEVIATION_FLAGS[deviation]) > 0
+            else:
+                raise AnalyticsError(f'Unknown deviation "{deviation}".')
+        return keep
+
+
+# The cube of the latest data version, per process
+_cube = {'version': None, 'cube': None}
+_cube_lock = threading.Lock()
+
+
+def get_cube():
+    """The cube for the current data version, built at most once per version."""
+    version = data_version()
+    with _cube_lock:
+        if _cube['version'] != version:
+            _cube['cube'] = Cube()
+            _cube['version'] = version
+        return _cube['cube'], version
+
+
+def parse_month(value):
+    """Validate a 'YYYY-MM' query parameter."""
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(f'{value}-01').strftime('%Y-%m')
+    except ValueError:
+        raise AnalyticsError(f'"{value}" is not a month (YYYY-MM).')
@@ -0,0 +1,214 @@
+import resource
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, reverse
+from django.utils.http import urlencode
+from django.utils import timezone
+
+from . import urls
+from .admin import admin_site
+from .models import District, ExportJob, FieldAudit, Hospital, Patient
+
+
+PERCENTILES = (50, 90, 95, 99)
+# Views that change data on GET are never benchmarked; the patient downloads queue export jobs
+MUTATING_VIEWS = ('delete_district', 'delete_user', 'download_patient_data', 'download_patient_excel')
+# Streaming exports of the whole data set are timed fewer times
+EXPORT_VIEWS = ('download_all_data', 'download_export')
+# Latency changes smaller than this are timer noise, whatever their ratio
+MIN_REGRESSION_MS = 5
+
+
+def _peak_rss_reset():
+    """Reset the kernel's peak-RSS mark (Linux); False where that is unsupported."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _status_kb(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(f'{field}:'):
+                return int(line.split()[1])
+    return 0
+
+
+def _rss_kb(reset_supported):
+    """``(current, peak)`` RSS in KB; without a reset, the peak is the whole process's."""
+    if reset_supported:
+        return _status_kb('VmRSS'), _status_kb('VmHWM')
+    # ru_maxrss is the peak of the whole process: an upper bound per request
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak, peak
+
+
+def data_scale():
+    return {
+        'districts': District.objects.count(),
+        'hospitals': Hospital.objects.count(),
+        'audits': FieldAudit.objects.count(),
+        'patients': Patient.objects.count(),
+    }
+
+
+def _samples(user):
+    """URL arguments and query strings filled in from the current data."""
+    patient = Patient.objects.filter(audit__latitude__isnull=False).order_by().only('id', 'patient_name', 'audit_id').first()
+    patient = patient or Patient.objects.order_by().only('id', 'patient_name', 'audit_id').first()
+    audits = FieldAudit.objects.order_by().only('id', 'hospital_id', 'district_id', 'latitude', 'longitude')
+    audit = audits.filter(id=patient.audit_id).first() if patient else audits.first()
+    job = ExportJob.objects.filter(requested_by=user).order_by('-id').only('id').first()
+    kwargs = {
+        'audit_id': audit.id if audit else None,
+        'patient_id': patient.id if patient else None,
+        'hospital_id': audit.hospital_id if audit else None,
+        'district_id': audit.district_id if audit else None,
+        'user_id': user.id,
+        'job_id': job.id if job else None,
+        'export_type': 'all_data',
+    }
+    point = {'lat': float(audit.latitude), 'lon': float(audit.longitude)} if audit and audit.latitude is not None else {}
+    queries = {
+        'search': {'q': patient.patient_name.split()[0] if patient else 'ra'},
+        'audits_nearby': point,
+        'hospitals_nearest': point,
+        'resolve_district': point,
+    }
+    return kwargs, queries
+
+
+def endpoints(user):
+    """``(name, url)`` of every audit URL and admin changelist that can be requested with GET.
+
+    Returns the endpoints and a ``{name: reason}`` dict of the ones skipped.
+    """
+    kwargs, queries = _samples(user)
+    found, skipped = [], {}
+    for pattern in urls.urlpatterns:
+        name = pattern.name
+        if name in MUTATING_VIEWS or name in dict(found):
+            continue
+        arguments = {key: kwargs.get(key) for key in pattern.pattern.converters}
+        missing = [key for key, value in arguments.items() if value is None]
+        if missing:
+            skipped[name] = f'no data for {", ".join(missing)}'
+            continue
+        url = reverse(name, kwargs=arguments)
+        if name in queries:
+            if not queries[name]:
+                skipped[name] = 'no audit with coordinates'
+                continue
+            url += '?' + urlencode(queries[name])
+        found.append((name, url))
+
+    for model in admin_site._registry:
+        name = f'admin {model._meta.verbose_name_plural}'
+        try:
+            found.append((name, reverse(f'{admin_site.name}:{model._meta.app_label}_{model._meta.model_name}_changelist')))
+        except NoReverseMatch:
+            skipped[name] = 'admin site is not mounted'
+    return found, skipped
+
+
+def measure(client, url, repeat):
+    """Time ``repeat`` GETs of ``url`` after one warm-up request."""
+    response = client.get(url)
+    if response.status_code == 405:
+        return None
+    reset_supported = _peak_rss_reset()
+    timings, queries, peak, growth = [], [], 0, 0
+    for _ in range(repeat):
+        _peak_rss_reset()
+        before, _ = _rss_kb(reset_supported)
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            size = sum(len(chunk) for chunk in response.streaming_content) if response.streaming else len(response.content)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured.captured_queries))
+        _, request_peak = _rss_kb(reset_supported)
+        peak, growth = max(peak, request_peak), max(growth, request_peak - before)
+    percentiles = np.percentile(timings, PERCENTILES)
+    return {
+        'url': url,
+        'status': response.status_code,
+        'bytes': size,
+        'runs': repeat,
+        **{f'p{percentile}_ms': round(float(value), 2) for percentile, value in zip(PERCENTILES, percentiles)},
+        'mean_ms': round(float(np.mean(timings)), 2),
+        'max_ms': round(float(np.max(timings)), 2),
+        'queries': int(np.median(queries)),
+        'peak_rss_mb': round(peak / 1024, 1),
+        # How far the request pushed RSS above where it started
+        'rss_growth_mb': round(growth / 1024, 1),
+        'peak_rss_per_request': reset_supported,
+    }
+
+
+def _client():
+    # A host the settings accept, so requests are not rejected before reaching the view
+    hosts = [host.lstrip('.') for host in settings.ALLOWED_HOSTS if '*' not in host]
+    return Client(
+        raise_request_exception=False,
+        HTTP_HOST=hosts[0] if hosts else 'localhost',
+        **({'wsgi.url_scheme': 'https'} if settings.SECURE_SSL_REDIRECT else {}),
+    )
+
+
+def run(user, repeat=20, export_repeat=3, only=None, progress=None):
+    """Benchmark every endpoint as ``user``; returns one scale's results for the report."""
+    client = _client()
+    client.force_login(user)
+    found, skipped = endpoints(user)
+    results = {}
+    for name, url in found:
+        if only and not any(term in name for term in only):
+            continue
+        result = measure(client, url, export_repeat if name in EXPORT_VIEWS else repeat)
+        if result is None:
+            skipped[name] = 'POST only'
+            continue
+        results[name] = result
+        if progress:
+            progress(f"{name:<40} p50 {result['p50_ms']:>9.1f} ms  p95 {result['p95_ms']:>9.1f} ms  "
+                     f"{result['queries']:>4} queries  {result['peak_rss_mb']:>7.1f} MB (+{result['rss_growth_mb']:.1f})")
+    return {
+        'measured_at': timezone.now().isoformat(),
+        'scale': data_scale(),
+        'endpoints': results,
+        'skipped': skipped,
+    }
+
+
+def compare(previous, current, threshold=0.2):
+    """Rows ``(scale, endpoint, metric, before, after, regressed)`` of two reports.
+
+    Runs are matched by their ``target`` (or position), endpoints by name. A
+    latency is a regression when it grew by more than ``threshold`` and by
+    at least ``MIN_REGRESSION_MS``; any increase in the query count is one.
+    """
+    before_runs = {before.get('target', index): before for index, before in enumerate(previous.get('runs', []))}
+    rows = []
+    for index, after_run in enumerate(current.get('runs', [])):
+        key = after_run.get('target', index)
+        before_run = before_runs.get(key)
+        if not before_run:
+            continue
+        for name, after in after_run['endpoints'].items():
+            before = before_run['endpoints'].get(name)
+            if not before:
+                continue
+            for metric in ('p50_ms', 'p95_ms'):
+                regressed = after[metric] > before[metric] * (1 + threshold) and after[metric] - before[metric] >= MIN_REGRESSION_MS
+                rows.append((key, name, metric, before[metric], after[metric], regressed))
+            rows.append((key, name, 'queries', before['queries'], after['queries'], after['queries'] > before['queries']))
+    return rows
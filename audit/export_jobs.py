@@ -0,0 +1,125 @@
+import tempfile
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import F
+from django.utils import timezone
+
+from .exports import (
+    all_data_filename, patient_data_filename, patient_excel_filename,
+    write_all_data, write_patient_data, write_patient_excel,
+)
+from .models import ExportJob, Hospital
+
+
+# How long a finished export stays downloadable before the worker deletes it.
+EXPORT_ARTIFACT_TTL = timedelta(hours=getattr(settings, 'EXPORT_ARTIFACT_TTL_HOURS', 24))
+
+# A running job whose progress has not moved for this long is assumed to
+# belong to a worker that died, and is handed out again.
+STALE_JOB_TIMEOUT = timedelta(minutes=getattr(settings, 'EXPORT_STALE_JOB_MINUTES', 30))
+
+# Claims before a job whose worker keeps dying (e.g. out of memory) is failed
+# instead of handed out again.
+EXPORT_MAX_ATTEMPTS = getattr(settings, 'EXPORT_MAX_ATTEMPTS', 3)
+
+
+class _ProgressReporter:
+    """Persists job progress, writing only when the percentage changes."""
+
+    def __init__(self, job):
+        self.job = job
+        self.last_percent = job.progress
+
+    def __call__(self, done, total):
+        percent = min(99, int(done * 100 / total)) if total else 0
+        if percent != self.last_percent:
+            self.last_percent = percent
+            ExportJob.objects.filter(pk=self.job.pk).update(progress=percent, updated_at=timezone.now())
+
+
+def claim_next_job():
+    """Atomically move the oldest pending job to Running and return it.
+
+    The conditional UPDATE means several workers can poll the same table
+    without two of them picking up the same job.
+    """
+    while True:
+        job = ExportJob.objects.filter(status='Pending').order_by('created_at').first()
+        if job is None:
+            return None
+        now = timezone.now()
+        claimed = ExportJob.objects.filter(pk=job.pk, status='Pending').update(
+            status='Running', started_at=now, updated_at=now, progress=0, attempts=F('attempts') + 1
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def requeue_stale_jobs():
+    """Hand stale running jobs out again, failing those with no attempts left.
+
+    Returns ``(requeued, failed)`` counts.
+    """
+    now = timezone.now()
+    stale = ExportJob.objects.filter(status='Running', updated_at__lt=now - STALE_JOB_TIMEOUT)
+    failed = stale.filter(attempts__gte=EXPORT_MAX_ATTEMPTS).update(
+        status='Failed',
+        error=f'The export worker stopped during this export {EXPORT_MAX_ATTEMPTS} times; '
+              'it may be too large to build. Please contact support.',
+        finished_at=now, updated_at=now,
+    )
+    requeued = stale.filter(attempts__lt=EXPORT_MAX_ATTEMPTS).update(status='Pending', progress=0, updated_at=now)
+    return requeued, failed
+
+
+def _build_artifact(job, output, progress):
+    if job.export_type == 'all_data':
+        write_all_data(output, progress)
+        return all_data_filename()
+
+    hospital = Hospital.objects.select_related('district').get(code=job.hospital_id)
+    if job.export_type == 'patient_data':
+        write_patient_data(hospital, output, progress)
+        return patient_data_filename(hospital)
+    if job.export_type == 'patient_excel':
+        write_patient_excel(hospital, output, progress)
+        return patient_excel_filename()
+    raise ValueError(f'Unknown export type: {job.export_type}')
+
+
+def run_job(job):
+    """Build the artifact for a claimed job and store it under MEDIA_ROOT."""
+    try:
+        with tempfile.TemporaryFile() as output:
+            filename = _build_artifact(job, output, _ProgressReporter(job))
+            output.seek(0)
+            job.file.save(filename, File(output, name=filename), save=False)
+        now = timezone.now()
+        job.status = 'Completed'
+        job.progress = 100
+        job.finished_at = now
+        job.expires_at = now + EXPORT_ARTIFACT_TTL
+        job.save(update_fields=['file', 'status', 'progress', 'finished_at', 'expires_at', 'updated_at'])
+    except Exception as e:
+        print(f'Error running export job {job.id}: {str(e)}')
+        traceback.print_exc()
+        job.status = 'Failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'updated_at'])
+    return job
+
+
+def purge_expired_artifacts():
+    """Delete artifact files past their expiry; the job rows are kept as history."""
+    purged = 0
+    expired = ExportJob.objects.filter(expires_at__lte=timezone.now()).exclude(file='').exclude(file__isnull=True)
+    for job in expired.iterator():
+        job.file.delete(save=False)
+        job.save(update_fields=['file', 'updated_at'])
+        purged += 1
+    return purged
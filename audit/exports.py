@@ -0,0 +1,488 @@
+import re
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+from xml.sax.saxutils import escape
+
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.utils import get_column_letter
+
+from .models import Patient
+from .storage import content_storage
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Rows are buffered in memory only until this many have been written, then
+# the compressed bytes are handed to the response.
+ROWS_PER_FLUSH = 500
+QUERY_CHUNK_SIZE = 2000
+
+_ILLEGAL_XML_CHARS = re.compile(r'[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_CONTENT_TYPES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '<Override PartName="/xl/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    '</Types>'
+)
+
+_ROOT_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+
+_WORKBOOK_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+_WORKBOOK_RELS_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+
+# Style 0 is the default cell, style 1 is the bold header cell.
+_STYLES_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+    '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+    '</styleSheet>'
+)
+
+_SHEET_HEADER_XML = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetData>'
+)
+
+_SHEET_FOOTER_XML = '</sheetData></worksheet>'
+
+
+class _StreamBuffer:
+    """Write-only, unseekable file object that hands back what was written.
+
+    ``zipfile`` falls back to data descriptors when the target cannot seek,
+    which is what lets the archive be produced front to back.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _cell_xml(value, style=0):
+    style_attr = f' s="{style}"' if style else ''
+    if value is None:
+        return f'<c{style_attr}/>'
+    if isinstance(value, bool):
+        value = 'Yes' if value else 'No'
+    elif isinstance(value, (int, float, Decimal)):
+        return f'<c{style_attr}><v>{value}</v></c>'
+    elif isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    text = escape(_ILLEGAL_XML_CHARS.sub('', str(value)))
+    return f'<c{style_attr} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row_xml(values, style=0):
+    return '<row>' + ''.join(_cell_xml(value, style) for value in values) + '</row>'
+
+
+def stream_xlsx(headers, rows, sheet_name='Sheet1'):
+    """Yield the bytes of a single-sheet XLSX workbook as rows are produced.
+
+    Cells are written as inline strings so no shared-string table has to be
+    kept in memory; only the rows since the last flush are ever buffered.
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES_XML)
+        archive.writestr('_rels/.rels', _ROOT_RELS_XML)
+        archive.writestr('xl/workbook.xml', _WORKBOOK_XML.format(sheet_name=escape(sheet_name, {'"': '&quot;'})))
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS_XML)
+        archive.writestr('xl/styles.xml', _STYLES_XML)
+        yield buffer.drain()
+
+        # The sheet's size is unknown up front and passes 2 GiB uncompressed
+        # at about a million rows, which needs ZIP64 headers
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            sheet.write((_SHEET_HEADER_XML + _row_xml(headers, style=1)).encode('utf-8'))
+            pending = 0
+            for row in rows:
+                sheet.write(_row_xml(row).encode('utf-8'))
+                pending += 1
+                if pending >= ROWS_PER_FLUSH:
+                    pending = 0
+                    data = buffer.drain()
+                    if data:
+                        yield data
+            sheet.write(_SHEET_FOOTER_XML.encode('utf-8'))
+    yield buffer.drain()
+
+
+# Column title -> (queryset field, formatter). The formatters reproduce the
+# values the original in-memory export wrote for each cell.
+def _or_na(value):
+    return value or 'N/A'
+
+
+def _date(value):
+    return value.strftime('%Y-%m-%d') if value else 'N/A'
+
+
+def _time(value):
+    return value.strftime('%H:%M:%S') if value else 'N/A'
+
+
+def _yes_no(value):
+    return 'Yes' if value else 'No'
+
+
+# File columns and the text written when a patient has no such file
+FILE_COLUMNS = {
+    'patient_photo': 'No Photo',
+    'case_file': 'No File',
+    'discharge_summary': 'No Summary',
+    'bills_documents': 'No Documents',
+}
+
+ALL_DATA_COLUMNS = [
+    ('Hospital ID', 'audit__hospital_id', None),
+    ('Hospital Name', 'audit__ehcp_name', None),
+    ('District', 'audit__district__name', _or_na),
+    ('Hospital Type', 'audit__ehcp_type', None),
+    ('Visit Date', 'audit__visit_date', _date),
+    ('Visit Time', 'audit__visit_time', _time),
+    ('Auditor Name', 'audit__auditor_name', None),
+    ('Designation', 'audit__designation', None),
+    ('Location', 'audit__current_location', None),
+    ('EKGP Patients', 'audit__ekgp_patients', lambda value: value or 0),
+    ('PMJAY Patients', 'audit__pmjay_patients', lambda value: value or 0),
+    ('Total Beneficiaries', 'audit__beneficiaries', lambda value: value or 0),
+    ('Findings Type', 'audit__findings_type', _or_na),
+    ('Audit Findings Value', 'audit__audit_findings_value', _or_na),
+    ('Finding Type', 'audit__finding_type', _or_na),
+    ('Abuse Type', 'audit__abuse_type', _or_na),
+    ('OOPE Type', 'audit__oope_type', _or_na),
+    ('HNQA Value', 'audit__hnqa_value', _or_na),
+    ('HNQA Type', 'audit__hnqa_type', _or_na),
+    ('Infrastructure Type', 'audit__infrastructure_type', _or_na),
+    ('HR Type', 'audit__hr_type', _or_na),
+    ('Services Type', 'audit__services_type', _or_na),
+    ('Fraudulent Value', 'audit__fraudulent_value', _or_na),
+    ('Fraudulent Type', 'audit__fraudulent_type', _or_na),
+    ('Observations', 'audit__observations', lambda value: value or ''),
+    ('Case ID', 'case_id', None),
+    ('Patient Name', 'patient_name', None),
+    ('Mobile Number', 'mobile_number', _or_na),
+    ('Admission Date', 'admission_date', _date),
+    ('Discharge Date', 'discharge_date', _date),
+    ('Package Name', 'package_name', None),
+    ('Package Code', 'package_code', _or_na),
+    ('Mandatory Records', 'missing_records', _yes_no),
+    ('Money Collection', 'money_collection', _yes_no),
+    ('Case Summary', 'case_summary', lambda value: value or ''),
+    ('Deviations', 'deviation_flags', lambda value: ', '.join(Patient.deviations_from_flags(value)) or 'None'),
+    ('Total OOPE', 'total_oope', lambda value: value or 0),
+    ('Patient Photo', 'patient_photo', None),
+    ('Case File', 'case_file', None),
+    ('Discharge Summary', 'discharge_summary', None),
+    ('Bills & Documents', 'bills_documents', None),
+]
+
+
+def iter_all_data_rows(patients=None):
+    """Yield one formatted row per patient, joined with its audit's columns.
+
+    Only the exported columns are selected and the queryset is read with a
+    server-side cursor in chunks, so memory does not grow with the table.
+    """
+    if patients is None:
+        patients = Patient.objects.all()
+    fields = [field for _, field, _ in ALL_DATA_COLUMNS]
+    formatters = [formatter for _, _, formatter in ALL_DATA_COLUMNS]
+    rows = patients.order_by(
+        '-audit__visit_date', 'audit_id', '-admission_date', 'id'
+    ).values_list(*fields).iterator(chunk_size=QUERY_CHUNK_SIZE)
+    file_columns = [(index, FILE_COLUMNS[field]) for index, field in enumerate(fields) if field in FILE_COLUMNS]
+    storage = content_storage()
+    while chunk := list(islice(rows, QUERY_CHUNK_SIZE)):
+        # Files live in blob storage under other paths; resolve the chunk's names together
+        urls = storage.urls(row[index] for row in chunk for index, _ in file_columns)
+        for row in chunk:
+            values = [
+                formatter(value) if formatter else value
+                for value, formatter in zip(row, formatters)
+            ]
+            for index, missing_text in file_columns:
+                values[index] = urls[row[index]] if row[index] else missing_text
+            yield values
+
+
+def stream_all_data_xlsx(patients=None):
+    headers = [title for title, _, _ in ALL_DATA_COLUMNS]
+    return stream_xlsx(headers, iter_all_data_rows(patients), sheet_name='All Data')
+
+
+def all_data_filename():
+    return f'audit_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+
+
+def patient_data_filename(hospital):
+    return f'{hospital.name}_patients_{datetime.now().strftime("%Y%m%d")}.xlsx'
+
+
+def patient_excel_filename():
+    return f'patient_details_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
+
+
+def _report_progress(progress, done, total):
+    if progress is not None:
+        progress(done, total)
+
+
+def write_all_data(output, progress=None):
+    """Write the all-data workbook to ``output``, reporting rows written."""
+    total = Patient.objects.count()
+    written = 0
+
+    def counted_rows():
+        nonlocal written
+        for row in iter_all_data_rows():
+            yield row
+            written += 1
+            if written % ROWS_PER_FLUSH == 0:
+                _report_progress(progress, written, total)
+
+    headers = [title for title, _, _ in ALL_DATA_COLUMNS]
+    for data in stream_xlsx(headers, counted_rows(), sheet_name='All Data'):
+        output.write(data)
+    _report_progress(progress, total, total)
+
+
+def write_patient_data(hospital, output, progress=None):
+    """Write the per-hospital patient summary workbook to ``output``."""
+    patients = Patient.objects.for_table().filter(audit__hospital=hospital)
+    total = patients.count()
+
+    # Create data for Excel
+    data = []
+    for index, patient in enumerate(patients.iterator(chunk_size=QUERY_CHUNK_SIZE), 1):
+        # Get deviation list as comma-separated string
+        deviations = ', '.join(patient.deviations) or 'None'
+
+        # Get document status
+        documents = []
+        if patient.patient_photo:
+            documents.append('Photo')
+        if patient.case_file:
+            documents.append('Case File')
+        if patient.discharge_summary:
+            documents.append('Discharge Summary')
+        if patient.bills_documents:
+            documents.append('Bills')
+        documents_status = ', '.join(documents) if documents else 'None'
+
+        data.append({
+            'Hospital Name': hospital.name,
+            'Hospital ID': hospital.code,
+            'District': hospital.district.name,
+            'Case ID': patient.case_id,
+            'Patient Name': patient.patient_name,
+            'Mobile Number': patient.mobile_number,
+            'Admission Date': patient.admission_date.strftime('%d/%m/%Y') if patient.admission_date else '',
+            'Discharge Date': patient.discharge_date.strftime('%d/%m/%Y') if patient.discharge_date else '',
+            'Package Name': patient.package_name,
+            'Package Code': patient.package_code,
+            'Mandatory Records': 'No' if patient.missing_records else 'Yes',
+            'Deviations': deviations,
+            'OOPE Amount': patient.total_oope,
+            'Documents': documents_status
+        })
+        if index % ROWS_PER_FLUSH == 0:
+            _report_progress(progress, index, total)
+
+    # Create DataFrame
+    df = pd.DataFrame(data)
+
+    # Write to Excel
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=False, sheet_name='Patient Data')
+
+        # Auto-adjust columns' width
+        worksheet = writer.sheets['Patient Data']
+        for idx, col in enumerate(df.columns):
+            max_length = max(
+                df[col].astype(str).apply(len).max(),
+                len(str(col))
+            ) + 2
+            worksheet.column_dimensions[chr(65 + idx)].width = min(max_length, 50)
+    _report_progress(progress, total, total)
+
+
+def write_patient_excel(hospital, output, progress=None):
+    """Write the formatted per-hospital patient details workbook to ``output``."""
+    patients = Patient.objects.for_table().filter(audit__hospital=hospital)
+    total = patients.count()
+
+    # Create a new workbook and select the active sheet
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Patient Details"
+
+    # Define styles
+    header_font = Font(name='Arial', size=11, bold=True, color='FFFFFF')
+    header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
+    hospital_font = Font(name='Arial', size=11, bold=True)
+    border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+
+    # Add hospital details in first row
+    ws.merge_cells('A1:B1')
+    ws.merge_cells('C1:D1')
+    ws.merge_cells('E1:F1')
+
+    ws['A1'] = f"Hospital Name: {hospital.name}"
+    ws['C1'] = f"Hospital ID: {hospital.code}"
+    ws['E1'] = f"District: {hospital.district.name if hospital.district else ''}"
+
+    # Style hospital details
+    for cell in ['A1', 'C1', 'E1']:
+        ws[cell].font = hospital_font
+        ws[cell].border = border
+        ws[cell].alignment = Alignment(horizontal='left', vertical='center')
+
+    # Add headers in second row
+    headers = [
+        'SI.NO', 'Case ID', 'Patient Name', 'Mobile Number', 'Admission Date',
+        'Discharge Date', 'Package Name', 'Package Code', 'Mandatory Records',
+        'Deviations', 'OOPE Amount'
+    ]
+
+    # Write and style headers
+    for col, header in enumerate(headers, 1):
+        cell = ws.cell(row=2, column=col, value=header)
+        cell.font = header_font
+        cell.fill = header_fill
+        cell.border = border
+        cell.alignment = Alignment(horizontal='center', vertical='center')
+
+    # Write data starting from row 3
+    row = 3
+    for index, patient in enumerate(patients.iterator(chunk_size=QUERY_CHUNK_SIZE), 1):
+        # Format deviations - convert list to string
+        deviations = ', '.join(patient.deviations) or 'None'
+
+        # Add data
+        data = [
+            index,  # SI.NO
+            patient.case_id,
+            patient.patient_name,
+            patient.mobile_number,
+            patient.admission_date.strftime('%d/%m/%Y') if patient.admission_date else '',
+            patient.discharge_date.strftime('%d/%m/%Y') if patient.discharge_date else '',
+            patient.package_name,
+            patient.package_code,
+            'Yes' if patient.missing_records else 'No',
+            deviations,
+            patient.total_oope if patient.total_oope else 0
+        ]
+
+        # Write and style each cell
+        for col, value in enumerate(data, 1):
+            cell = ws.cell(row=row, column=col, value=value)
+            cell.border = border
+            cell.alignment = Alignment(horizontal='left', vertical='center')
+            cell.font = Font(name='Arial', size=10)
+
+            # Center align specific columns
+            if col in [1, 3, 4, 5, 8]:  # SI.NO, Mobile, Dates, and Mandatory Records
+                cell.alignment = Alignment(horizontal='center', vertical='center')
+
+            # Right align amount
+            if col == 11:  # OOPE Amount (now column 11 due to SI.NO)
+                cell.alignment = Alignment(horizontal='right', vertical='center')
+                cell.number_format = '#,##0.00'
+
+        row += 1
+        if index % ROWS_PER_FLUSH == 0:
+            _report_progress(progress, index, total)
+
+    # Auto-adjust column widths
+    for col in range(1, len(headers) + 1):
+        column = get_column_letter(col)
+        max_length = 0
+        column_cells = ws[column]
+
+        for cell in column_cells:
+            try:
+                if len(str(cell.value)) > max_length:
+                    max_length = len(str(cell.value))
+            except:
+                pass
+
+        adjusted_width = (max_length + 2)
+        ws.column_dimensions[column].width = min(adjusted_width, 25)  # Reduced max width to make columns more compact
+
+    # Set row heights
+    ws.row_dimensions[1].height = 20  # Hospital details row
+    ws.row_dimensions[2].height = 20  # Headers row
+
+    # Freeze the header rows
+    ws.freeze_panes = 'A3'
+
+    wb.save(output)
+    _report_progress(progress, total, total)
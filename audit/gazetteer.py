@@ -0,0 +1,124 @@
+import json
+import math
+import os
+import threading
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+
+# GeoJSON FeatureCollection of district boundaries, one (Multi)Polygon per district.
+# The bundled file is approximate (cells around each district's centre within a
+# traced state outline); point this at surveyed boundaries where they are available.
+DISTRICT_BOUNDARIES_FILE = getattr(
+    settings, 'DISTRICT_BOUNDARIES_FILE',
+    os.path.join(os.path.dirname(__file__), 'data', 'district_boundaries.geojson'),
+)
+# Feature property holding the district name, matched against District.name
+DISTRICT_NAME_PROPERTY = getattr(settings, 'DISTRICT_NAME_PROPERTY', 'district')
+# Side of a grid index cell in degrees (about 11 km)
+GRID_CELL_DEGREES = 0.1
+# Lookups are cached per point rounded to this many decimals (about 1 m)
+CACHE_DECIMALS = 5
+CACHE_SIZE = 4096
+
+
+class _Polygon:
+    """One polygon of a district: its bounding box and ring edges as arrays."""
+
+    def __init__(self, name, rings):
+        self.name = name
+        outer = np.asarray(rings[0], dtype=float)
+        self.min_lon, self.min_lat = outer[:, 0].min(), outer[:, 1].min()
+        self.max_lon, self.max_lat = outer[:, 0].max(), outer[:, 1].max()
+        # Edges of every ring together: the even-odd rule treats holes the same way
+        edges = [(ring[:-1], ring[1:]) for ring in (np.asarray(ring, dtype=float) for ring in rings) if len(ring) > 2]
+        start = np.concatenate([edge[0] for edge in edges])
+        end = np.concatenate([edge[1] for edge in edges])
+        self.x1, self.y1 = start[:, 0], start[:, 1]
+        self.x2, self.y2 = end[:, 0], end[:, 1]
+
+    def contains(self, longitude, latitude):
+        if not (self.min_lon <= longitude <= self.max_lon and self.min_lat <= latitude <= self.max_lat):
+            return False
+        # Ray casting towards +longitude over all edges at once
+        straddles = (self.y1 > latitude) != (self.y2 > latitude)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossing_lon = self.x1 + (latitude - self.y1) * (self.x2 - self.x1) / (self.y2 - self.y1)
+        return bool(np.count_nonzero(straddles & (longitude < crossing_lon)) % 2)
+
+
+class DistrictIndex:
+    """District polygons bucketed into a grid of ``GRID_CELL_DEGREES`` cells.
+
+    Each cell lists the polygons whose bounding box touches it, so a lookup
+    tests only the few polygons near the point.
+    """
+
+    def __init__(self, features):
+        self.polygons = []
+        for feature in features:
+            name = (feature.get('properties') or {}).get(DISTRICT_NAME_PROPERTY)
+            geometry = feature.get('geometry') or {}
+            if not name:
+                continue
+            if geometry.get('type') == 'Polygon':
+                parts = [geometry['coordinates']]
+            elif geometry.get('type') == 'MultiPolygon':
+                parts = geometry['coordinates']
+            else:
+                continue
+            self.polygons.extend(_Polygon(name, rings) for rings in parts if rings)
+
+        self.grid = {}
+        for number, polygon in enumerate(self.polygons):
+            for x in range(self._cell(polygon.min_lon), self._cell(polygon.max_lon) + 1):
+                for y in range(self._cell(polygon.min_lat), self._cell(polygon.max_lat) + 1):
+                    self.grid.setdefault((x, y), []).append(number)
+
+    @staticmethod
+    def _cell(degrees):
+        return math.floor(degrees / GRID_CELL_DEGREES)
+
+    def resolve(self, latitude, longitude):
+        """Name of the district containing the point, or None."""
+        for number in self.grid.get((self._cell(longitude), self._cell(latitude)), ()):
+            polygon = self.polygons[number]
+            if polygon.contains(longitude, latitude):
+                return polygon.name
+        return None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def load_index(path=DISTRICT_BOUNDARIES_FILE):
+    try:
+        with open(path, encoding='utf-8') as f:
+            features = json.load(f).get('features', [])
+    except (OSError, ValueError) as e:
+        print(f"Error loading district boundaries from {path}: {e}")
+        features = []
+    return DistrictIndex(features)
+
+
+def get_index():
+    """The process-wide index, built from the boundaries file on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = load_index()
+    return _index
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _resolve_rounded(latitude, longitude):
+    return get_index().resolve(latitude, longitude)
+
+
+def resolve_district_name(latitude, longitude):
+    """Boundary name of the district containing a point, without any network call."""
+    return _resolve_rounded(round(latitude, CACHE_DECIMALS), round(longitude, CACHE_DECIMALS))
@@ -0,0 +1,119 @@
+import math
+
+import numpy as np
+
+
+# Geohash alphabet; prefixes sort in the same order as the cells they name
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Stored precision: cells of about 4.8 m x 4.8 m
+GEOHASH_LENGTH = 9
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode(latitude, longitude, length=GEOHASH_LENGTH):
+    """Geohash of a point: interleaved longitude/latitude bisection bits, 5 per character."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < length:
+        interval, coordinate = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def bounds(geohash):
+    """``(min_lat, max_lat, min_lon, max_lon)`` of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def center(geohash):
+    min_lat, max_lat, min_lon, max_lon = bounds(geohash)
+    return (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+
+def cell_degrees(length):
+    """``(height, width)`` in degrees of the cells of a geohash length."""
+    lon_bits = (5 * length + 1) // 2
+    lat_bits = 5 * length // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """Geohash prefixes whose cells together cover the circle around a point.
+
+    Uses the longest prefix whose cells are at least ``radius_km`` high and
+    wide, so the point's cell and its eight neighbours contain the circle.
+    An empty prefix (the whole world) is returned for very large radii.
+    """
+    # Cells narrow towards the poles; size them at the circle's widest latitude
+    widest = min(abs(latitude) + radius_km / KM_PER_DEGREE, 89.9)
+    length = 0
+    for candidate in range(1, GEOHASH_LENGTH + 1):
+        height, width = cell_degrees(candidate)
+        if height * KM_PER_DEGREE < radius_km or width * KM_PER_DEGREE * math.cos(math.radians(widest)) < radius_km:
+            break
+        length = candidate
+    if not length:
+        return ['']
+
+    height, width = cell_degrees(length)
+    cell_lat, cell_lon = center(encode(latitude, longitude, length))
+    cells = set()
+    for d_lat in (-height, 0, height):
+        for d_lon in (-width, 0, width):
+            lat = cell_lat + d_lat
+            if not -90 < lat < 90:
+                continue
+            lon = (cell_lon + d_lon + 180) % 360 - 180
+            cells.add(encode(lat, lon, length))
+    return sorted(cells)
+
+
+def prefix_upper_bound(prefix):
+    """Smallest geohash prefix above every geohash starting with ``prefix``, or None.
+
+    The last character is bumped to the next one in ``BASE32``, carrying into
+    the previous one after 'z'. The bound holds only geohash characters, so
+    it compares the same under any collation; a sentinel like '~' does not
+    (it sorts before letters and digits in en_US.UTF-8). None means no bound:
+    ``prefix`` is empty or all 'z'.
+    """
+    while prefix:
+        position = BASE32.index(prefix[-1])
+        if position + 1 < len(BASE32):
+            return prefix[:-1] + BASE32[position + 1]
+        prefix = prefix[:-1]
+    return None
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km; accepts scalars or NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
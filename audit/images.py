@@ -0,0 +1,123 @@
+import base64
+import binascii
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+from .storage import content_storage
+
+
+# Longest side of the stored display image and of its thumbnail, in pixels
+IMAGE_MAX_DIMENSION = getattr(settings, 'IMAGE_MAX_DIMENSION', 1600)
+THUMBNAIL_MAX_DIMENSION = getattr(settings, 'IMAGE_THUMBNAIL_DIMENSION', 320)
+IMAGE_QUALITY = getattr(settings, 'IMAGE_QUALITY', 80)
+IMAGE_WORKERS = getattr(settings, 'IMAGE_WORKERS', min(4, os.cpu_count() or 1))
+
+# WebP is several times smaller than camera JPEGs and screenshot PNGs at the
+# same visual quality; Pillow builds without libwebp fall back to JPEG.
+if features.check('webp'):
+    IMAGE_FORMAT, IMAGE_EXTENSION = 'WEBP', 'webp'
+else:
+    IMAGE_FORMAT, IMAGE_EXTENSION = 'JPEG', 'jpg'
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def _encode(image, max_dimension):
+    rendition = image.copy()
+    rendition.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    # No exif= argument, so camera metadata (GPS position included) is dropped
+    rendition.save(buffer, IMAGE_FORMAT, quality=IMAGE_QUALITY, optimize=True)
+    return buffer.getvalue(), rendition.size
+
+
+def process_image(data):
+    """Return the display image and thumbnail renditions of one uploaded image.
+
+    Runs inside the worker processes, so it takes and returns plain bytes.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as original:
+            # Bake the EXIF orientation into the pixels before the metadata goes
+            image = ImageOps.exif_transpose(original)
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha and IMAGE_FORMAT == 'WEBP' else 'RGB')
+            display, (width, height) = _encode(image, IMAGE_MAX_DIMENSION)
+            thumbnail, _ = _encode(image, THUMBNAIL_MAX_DIMENSION)
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImage(f'Not a valid image: {str(e)}') from e
+    return {'image': display, 'thumbnail': thumbnail, 'width': width, 'height': height}
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn rather than fork: forking a multi-threaded server process is unsafe
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _pool
+
+
+def process_images(images):
+    """Process several encoded images, in parallel when there is more than one."""
+    global _pool
+    if len(images) < 2 or IMAGE_WORKERS < 2:
+        return [process_image(data) for data in images]
+    try:
+        return list(_get_pool().map(process_image, images))
+    except BrokenProcessPool as e:
+        print(f'Image worker pool failed, processing inline: {str(e)}')
+        _pool = None
+        return [process_image(data) for data in images]
+
+
+def rendition_name(name):
+    stem = os.path.splitext(os.path.basename(name))[0] or 'image'
+    return f'{stem}.{IMAGE_EXTENSION}'
+
+
+def save_renditions(directory, name, renditions, storage=None):
+    """Store the renditions of ``name`` under ``directory`` and describe them.
+
+    The returned dict is what ``FieldAudit.photos`` holds for each photo.
+    """
+    storage = storage or content_storage()
+    filename = rendition_name(name)
+    return {
+        'name': name,
+        'image': storage.save(f'{directory}/{filename}', ContentFile(renditions['image'])),
+        'thumbnail': storage.save(f'{directory}/thumbnails/{filename}', ContentFile(renditions['thumbnail'])),
+        'width': renditions['width'],
+        'height': renditions['height'],
+    }
+
+
+def signature_from_data_url(data_url, name='signature.png'):
+    """Turn a ``canvas.toDataURL()`` PNG into a compact file for a signature field.
+
+    Signature pads draw dark strokes on a transparent canvas, so the image is
+    stored as greyscale plus alpha, which cuts the RGBA PNG down to a fraction.
+    Returns None for an empty value.
+    """
+    if not data_url:
+        return None
+    try:
+        header, _, encoded = data_url.partition(',')
+        data = base64.b64decode(encoded if header.startswith('data:') else data_url, validate=True)
+        with Image.open(io.BytesIO(data)) as image:
+            buffer = io.BytesIO()
+            image.convert('LA').save(buffer, 'PNG', optimize=True)
+    except (binascii.Error, OSError, ValueError) as e:
+        raise InvalidImage(f'Not a valid signature image: {str(e)}') from e
+    return ContentFile(buffer.getvalue(), name=name)
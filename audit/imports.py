@@ -0,0 +1,407 @@
+import csv
+import io
+import os
+import re
+import zipfile
+from datetime import date, datetime, timedelta
+from xml.etree import ElementTree
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+
+from .models import Patient
+from .search import index_patients
+from .stats import mark_dirty
+
+
+# Rows validated and inserted per bulk_create; only one batch is held in memory
+IMPORT_BATCH_SIZE = 1000
+# Row errors kept for the report; the rest are only counted
+MAX_REPORTED_ERRORS = 100
+# Patients accepted in one batch submission
+MAX_BATCH_PATIENTS = 100
+# Exports put the hospital details above the header row, so look a few rows down
+HEADER_SEARCH_ROWS = 10
+
+SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+# Day zero of Excel's serial dates (1900 date system)
+EXCEL_EPOCH = date(1899, 12, 30)
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y')
+YES_VALUES = {'yes', 'y', 'true', '1', 'on'}
+NO_VALUES = {'no', 'n', 'false', '0', ''}
+
+# Normalized header -> Patient field. Covers the field names and the headers
+# of the patient exports, so an exported workbook can be imported again.
+HEADER_FIELDS = {
+    'case_id': 'case_id',
+    'case_id_ip_number': 'case_id',
+    'ip_number': 'case_id',
+    'patient_name': 'patient_name',
+    'mobile_number': 'mobile_number',
+    'mobile': 'mobile_number',
+    'admission_date': 'admission_date',
+    'discharge_date': 'discharge_date',
+    'package_name': 'package_name',
+    'package_code': 'package_code',
+    # The verbose name of missing_records, as the exports head the column
+    'mandatory_records': 'missing_records',
+    'missing_records': 'missing_records',
+    'money_collection': 'money_collection',
+    'deviations': 'deviations',
+    'total_oope': 'total_oope',
+    'oope_amount': 'total_oope',
+    'case_summary': 'case_summary',
+    'remarks': 'remarks',
+}
+REQUIRED_FIELDS = ('case_id', 'patient_name', 'admission_date', 'package_name')
+# add_patient also insists on the discharge date
+BATCH_REQUIRED_FIELDS = REQUIRED_FIELDS + ('discharge_date',)
+BATCH_FILE_FIELDS = ('case_file', 'discharge_summary', 'bills_documents')
+
+# Deviations may be given by key or by label, as the exports write them
+DEVIATIONS = {name.lower(): key for key, label in Patient.DEVIATION_CHOICES for name in (key, label)}
+
+
+class ImportFileError(ValueError):
+    """The upload as a whole cannot be imported (format, headers)."""
+
+
+class ImportReport:
+    def __init__(self):
+        self.imported = 0
+        self.error_count = 0
+        self.errors = []
+
+    def add_error(self, row_number, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((row_number, message))
+
+
+def _normalize_header(value):
+    return re.sub(r'[^a-z0-9]+', '_', str(value or '').strip().lower()).strip('_')
+
+
+def _column_index(reference):
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def _first_sheet_path(archive):
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    sheet = workbook.find(f'{SHEET_NS}sheets/{SHEET_NS}sheet')
+    rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    for rel in rels:
+        if rel.get('Id') == sheet.get(f'{REL_NS}id'):
+            target = rel.get('Target')
+            return target.lstrip('/') if target.startswith('/') else f'xl/{target}'
+    raise ImportFileError('The workbook has no worksheet.')
+
+
+def _shared_strings(archive):
+    if 'xl/sharedStrings.xml' not in archive.namelist():
+        return []
+    strings = []
+    with archive.open('xl/sharedStrings.xml') as f:
+        for _, element in ElementTree.iterparse(f):
+            if element.tag == f'{SHEET_NS}si':
+                strings.append(''.join(t.text or '' for t in element.iter(f'{SHEET_NS}t')))
+                element.clear()
+    return strings
+
+
+def _cell_value(cell, shared_strings):
+    cell_type = cell.get('t', 'n')
+    if cell_type == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iter(f'{SHEET_NS}t'))
+    value = cell.findtext(f'{SHEET_NS}v')
+    if value is None:
+        return None
+    if cell_type == 's':
+        return shared_strings[int(value)]
+    if cell_type == 'n':
+        number = float(value)
+        return int(number) if number.is_integer() else number
+    if cell_type == 'b':
+        return value == '1'
+    return value
+
+
+def _xlsx_rows(upload):
+    """Yield ``(row_number, values)`` of the first worksheet.
+
+    openpyxl, even in read-only mode, builds a cell object per value and
+    needs seconds per ten thousand rows; the sheet XML is parsed here
+    directly instead, the way exports.stream_xlsx writes it. Dates arrive
+    as Excel serial numbers (the styles that mark them are not read).
+    """
+    with zipfile.ZipFile(upload) as archive:
+        shared_strings = _shared_strings(archive)
+        with archive.open(_first_sheet_path(archive)) as sheet:
+            row_number = 0
+            for _, element in ElementTree.iterparse(sheet):
+                if element.tag != f'{SHEET_NS}row':
+                    continue
+                row_number = int(element.get('r') or row_number + 1)
+                values = []
+                for cell in element.iter(f'{SHEET_NS}c'):
+                    reference = cell.get('r')
+                    if reference:
+                        values.extend([None] * (_column_index(reference) - len(values)))
+                    values.append(_cell_value(cell, shared_strings))
+                element.clear()
+                yield row_number, values
+
+
+def _csv_rows(upload):
+    upload.seek(0)
+    # utf-8-sig drops the byte order mark Excel writes in front of CSV exports
+    yield from enumerate(csv.reader(io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')), 1)
+
+
+def read_rows(upload):
+    """Yield ``(row_number, {field: raw value})`` for each data row of an XLSX or CSV upload."""
+    extension = os.path.splitext(upload.name)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        rows = _xlsx_rows(upload)
+    elif extension == '.csv':
+        rows = _csv_rows(upload)
+    else:
+        raise ImportFileError('Upload an .xlsx or .csv file.')
+
+    try:
+        columns = None
+        for row_number, row in rows:
+            if columns is None:
+                headers = [HEADER_FIELDS.get(_normalize_header(value)) for value in row]
+                if 'case_id' in headers:
+                    columns = headers
+                    missing = [field for field in REQUIRED_FIELDS if field not in columns]
+                    if missing:
+                        raise ImportFileError(f'Missing column(s): {", ".join(_label(field) for field in missing)}.')
+                elif row_number >= HEADER_SEARCH_ROWS:
+                    break
+                continue
+            if all(value is None or str(value).strip() == '' for value in row):
+                continue
+            yield row_number, {field: value for field, value in zip(columns, row) if field}
+    except (csv.Error, UnicodeDecodeError, zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+        raise ImportFileError(f'Could not read the file: {str(e)}') from e
+    if columns is None:
+        raise ImportFileError('No header row with a Case ID column was found.')
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store case IDs and phone numbers as numbers
+        value = int(value)
+    return str(value).strip()
+
+
+def _date(value, label):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return EXCEL_EPOCH + timedelta(days=int(value))
+    text = _text(value)
+    if not text:
+        return None
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise ValidationError(f'{label} "{text}" is not a date (use YYYY-MM-DD or DD/MM/YYYY).')
+
+
+def _flag(value, label):
+    text = _text(value).lower()
+    if text in YES_VALUES:
+        return True
+    if text in NO_VALUES:
+        return False
+    raise ValidationError(f'{label} must be Yes or No, not "{_text(value)}".')
+
+
+def _deviations(value):
+    deviations = []
+    items = value if isinstance(value, (list, tuple)) else _text(value).split(',')
+    for item in items:
+        item = _text(item)
+        item = item.lower()
+        if not item or item == 'none':
+            continue
+        if item not in DEVIATIONS:
+            raise ValidationError(f'Unknown deviation "{item}".')
+        if DEVIATIONS[item] not in deviations:
+            deviations.append(DEVIATIONS[item])
+    return deviations
+
+
+def _label(field_name):
+    return Patient._meta.get_field(field_name).verbose_name.capitalize()
+
+
+def _clean(field_name, value):
+    try:
+        return Patient._meta.get_field(field_name).clean(value, None)
+    except ValidationError as e:
+        raise ValidationError(f'{_label(field_name)}: {" ".join(e.messages)}') from e
+
+
+def clean_row(values, required=REQUIRED_FIELDS):
+    """Validate one row's raw values and return the Patient field values."""
+    for field in required:
+        if not _text(values.get(field)):
+            raise ValidationError(f'{_label(field)} is required.')
+
+    admission_date = _date(values['admission_date'], 'Admission date')
+    discharge_date = _date(values.get('discharge_date'), 'Discharge date')
+    if discharge_date and discharge_date < admission_date:
+        raise ValidationError('Discharge date cannot be earlier than admission date.')
+
+    deviations = _deviations(values.get('deviations'))
+    missing_records = _flag(values.get('missing_records'), _label('missing_records'))
+    if 'money_collection' in values:
+        money_collection = _flag(values['money_collection'], 'Money collection')
+        # The patient forms record money collection as a deviation as well
+        if money_collection and 'money_collection' not in deviations:
+            deviations.append('money_collection')
+    else:
+        money_collection = 'money_collection' in deviations
+
+    return {
+        'case_id': _clean('case_id', _text(values['case_id'])),
+        'patient_name': _clean('patient_name', _text(values['patient_name'])),
+        'mobile_number': _clean('mobile_number', _text(values.get('mobile_number')) or None),
+        'admission_date': admission_date,
+        'discharge_date': discharge_date,
+        'package_name': _clean('package_name', _text(values['package_name'])),
+        'package_code': _clean('package_code', _text(values.get('package_code')) or 'NA'),
+        'missing_records': missing_records,
+        'money_collection': money_collection,
+        'deviations': deviations,
+        'total_oope': _clean('total_oope', _text(values.get('total_oope')) or '0'),
+        'case_summary': _text(values.get('case_summary')),
+        'remarks': _text(values.get('remarks')),
+    }
+
+
+def import_patient_file(audit, upload, batch_size=IMPORT_BATCH_SIZE):
+    """Validate every row of ``upload`` and add the patients to ``audit``.
+
+    Rows are streamed from the file and inserted with bulk_create one batch
+    at a time inside a single transaction. Any row error rolls the whole
+    import back, so a file is either imported completely or not at all,
+    and the report lists the problems to fix.
+    """
+    report = ImportReport()
+    seen_case_ids = set()
+
+    def flush(batch):
+        existing = set(Patient.objects.filter(
+            case_id__in=[patient.case_id for _, patient in batch]
+        ).values_list('case_id', flat=True))
+        for row_number, patient in batch:
+            if patient.case_id in existing:
+                report.add_error(row_number, f'Case ID "{patient.case_id}" already exists.')
+        if not report.error_count:
+            created = Patient.objects.bulk_create([patient for _, patient in batch], batch_size=batch_size)
+            index_patients(patient.pk for patient in created)
+            report.imported += len(batch)
+
+    try:
+        with transaction.atomic():
+            batch = []
+            for row_number, values in read_rows(upload):
+                try:
+                    fields = clean_row(values)
+                except ValidationError as e:
+                    report.add_error(row_number, ' '.join(e.messages))
+                    continue
+                if fields['case_id'] in seen_case_ids:
+                    report.add_error(row_number, f'Case ID "{fields["case_id"]}" appears more than once in the file.')
+                    continue
+                seen_case_ids.add(fields['case_id'])
+                batch.append((row_number, Patient(audit=audit, **fields)))
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+            if batch:
+                flush(batch)
+
+            if report.error_count:
+                transaction.set_rollback(True)
+                report.imported = 0
+            elif report.imported:
+                # bulk_create bypasses the signals that maintain DailyStats;
+                # the search index was updated batch by batch
+                mark_dirty(audit.district_id, audit.visit_date)
+    except IntegrityError as e:
+        raise ImportFileError('Some case IDs were added by someone else during the import. Please import the file again.') from e
+    # Duplicates of existing case IDs are found a batch later than the other errors
+    report.errors.sort()
+    return report
+
+
+def add_patient_batch(audit, entries):
+    """Add the patients of one batch submission to ``audit``.
+
+    ``entries`` are dicts with the client's idempotency ``key``, the form
+    ``values`` and the uploaded ``files``. Entries whose key was stored by
+    an earlier attempt are reported as duplicates, invalid ones with their
+    errors, and the rest are inserted together with bulk_create. Returns
+    one result dict per entry, in order.
+    """
+    results = [{'key': entry['key']} for entry in entries]
+    stored = dict(Patient.objects.filter(
+        idempotency_key__in=[entry['key'] for entry in entries]
+    ).values_list('idempotency_key', 'id'))
+
+    pending = []
+    case_ids = set()
+    for entry, result in zip(entries, results):
+        if entry['key'] in stored:
+            result.update(status='duplicate', id=stored[entry['key']])
+            continue
+        try:
+            fields = clean_row(entry['values'], required=BATCH_REQUIRED_FIELDS)
+            for name, upload in entry['files'].items():
+                fields[name] = _clean(name, upload)
+        except ValidationError as e:
+            result.update(status='invalid', errors=e.messages)
+            continue
+        if fields['case_id'] in case_ids:
+            result.update(status='invalid', errors=[f'Case ID "{fields["case_id"]}" appears more than once in the batch.'])
+            continue
+        case_ids.add(fields['case_id'])
+        pending.append((result, Patient(audit=audit, idempotency_key=entry['key'], **fields)))
+
+    taken = set(Patient.objects.filter(case_id__in=case_ids).values_list('case_id', flat=True))
+    patients = []
+    for result, patient in pending:
+        if patient.case_id in taken:
+            result.update(status='invalid', errors=[f'Case ID "{patient.case_id}" already exists.'])
+        else:
+            patients.append((result, patient))
+
+    if patients:
+        with transaction.atomic():
+            # Uploaded files are written to storage as each row is prepared
+            Patient.objects.bulk_create([patient for _, patient in patients])
+            # bulk_create bypasses the signals that maintain DailyStats and the search index
+            mark_dirty(audit.district_id, audit.visit_date)
+            index_patients(patient.pk for _, patient in patients)
+        for result, patient in patients:
+            result.update(status='created', id=patient.pk)
+    return results
@@ -0,0 +1,212 @@
+import bisect
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('audit.requests')
+
+# Upper bounds (ms) of the latency buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# The histogram covers this many one-minute windows
+WINDOW_MINUTES = getattr(settings, 'REQUEST_METRICS_WINDOW_MINUTES', 15)
+# Requests slower than this are logged as warnings
+SLOW_REQUEST_MS = getattr(settings, 'REQUEST_METRICS_SLOW_MS', 1000)
+# The same SQL run this many times in one request is reported as a likely N+1
+DUPLICATE_QUERY_THRESHOLD = 5
+# Duplicate-query fingerprints kept per URL name
+MAX_FINGERPRINTS = 10
+
+
+def fingerprint(sql):
+    """Short stable ID of a query's SQL text, whose parameters are placeholders."""
+    return hashlib.sha1(sql.encode()).hexdigest()[:12]
+
+
+class _QueryRecorder:
+    """``execute_wrapper`` that counts and times the queries of one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+
+    def duplicates(self):
+        return {sql: count for sql, count in self.statements.items() if count >= DUPLICATE_QUERY_THRESHOLD}
+
+
+class _ViewStats:
+    def __init__(self):
+        self.requests = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.wall_ms = 0.0
+        self.max_ms = 0.0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.bytes = 0
+        self.errors = 0
+        self.with_duplicates = 0
+        self.fingerprints = {}
+
+    def add(self, record, duplicates):
+        self.requests += 1
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, record['wall_ms'])] += 1
+        self.wall_ms += record['wall_ms']
+        self.max_ms = max(self.max_ms, record['wall_ms'])
+        self.queries += record['queries']
+        self.sql_ms += record['sql_ms']
+        self.bytes += record['bytes'] or 0
+        self.errors += record['status'] >= 500
+        if duplicates:
+            self.with_duplicates += 1
+            for sql, count in duplicates.items():
+                key = fingerprint(sql)
+                if key in self.fingerprints or len(self.fingerprints) < MAX_FINGERPRINTS:
+                    seen = self.fingerprints.setdefault(key, {'sql': sql[:300], 'requests': 0, 'max_count': 0})
+                    seen['requests'] += 1
+                    seen['max_count'] = max(seen['max_count'], count)
+
+    def merge(self, other):
+        self.requests += other.requests
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        self.wall_ms += other.wall_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+        self.queries += other.queries
+        self.sql_ms += other.sql_ms
+        self.bytes += other.bytes
+        self.errors += other.errors
+        self.with_duplicates += other.with_duplicates
+        for key, seen in other.fingerprints.items():
+            merged = self.fingerprints.setdefault(key, {'sql': seen['sql'], 'requests': 0, 'max_count': 0})
+            merged['requests'] += seen['requests']
+            merged['max_count'] = max(merged['max_count'], seen['max_count'])
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the ``fraction`` quantile, in ms."""
+        rank = fraction * self.requests
+        seen = 0
+        for bound, count in zip((*LATENCY_BUCKETS_MS, None), self.buckets):
+            seen += count
+            if seen >= rank:
+                return bound if bound is not None else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def summary(self):
+        requests = max(self.requests, 1)
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'mean_ms': round(self.wall_ms / requests, 1),
+            'max_ms': round(self.max_ms, 1),
+            'mean_queries': round(self.queries / requests, 1),
+            'mean_sql_ms': round(self.sql_ms / requests, 1),
+            'mean_bytes': round(self.bytes / requests),
+            'requests_with_duplicate_queries': self.with_duplicates,
+            'duplicate_queries': sorted(
+                ({'fingerprint': key, **seen} for key, seen in self.fingerprints.items()),
+                key=lambda seen: -seen['requests'],
+            ),
+            'histogram': {
+                (f'<={bound}ms' if bound is not None else f'>{LATENCY_BUCKETS_MS[-1]}ms'): count
+                for bound, count in zip((*LATENCY_BUCKETS_MS, None), self.buckets)
+            },
+        }
+
+
+class RollingHistogram:
+    """Per-view stats in one-minute windows; windows older than ``minutes`` are dropped."""
+
+    def __init__(self, minutes=WINDOW_MINUTES):
+        self.minutes = minutes
+        self.windows = deque()
+        self.lock = threading.Lock()
+
+    def add(self, view, record, duplicates):
+        minute = int(time.time() // 60)
+        with self.lock:
+            if not self.windows or self.windows[-1][0] != minute:
+                self.windows.append((minute, {}))
+                while self.windows[0][0] <= minute - self.minutes:
+                    self.windows.popleft()
+            views = self.windows[-1][1]
+            stats = views.get(view)
+            if stats is None:
+                stats = views[view] = _ViewStats()
+            stats.add(record, duplicates)
+
+    def snapshot(self):
+        oldest = int(time.time() // 60) - self.minutes
+        merged = {}
+        with self.lock:
+            for minute, views in self.windows:
+                if minute <= oldest:
+                    continue
+                for view, stats in views.items():
+                    merged.setdefault(view, _ViewStats()).merge(stats)
+        return {view: stats.summary() for view, stats in sorted(merged.items())}
+
+
+histogram = RollingHistogram()
+
+
+class RequestMetricsMiddleware:
+    """Record wall time, queries, SQL time, duplicate queries and response size per request.
+
+    Add ``'audit.instrumentation.RequestMetricsMiddleware'`` near the top of
+    ``MIDDLEWARE``. Each request is logged as one JSON line on the
+    ``audit.requests`` logger (a warning when slow or repeating a query) and
+    added to the rolling ``histogram`` that the ``request_metrics`` view shows.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = _QueryRecorder()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        wall_ms = (time.perf_counter() - started) * 1000
+
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        record = {
+            'view': view,
+            'method': request.method,
+            'status': response.status_code,
+            'wall_ms': round(wall_ms, 2),
+            'queries': recorder.count,
+            'sql_ms': round(recorder.seconds * 1000, 2),
+            # Streaming bodies are produced after the view returns; their size is unknown here
+            'bytes': None if response.streaming else len(response.content),
+        }
+        duplicates = recorder.duplicates()
+        histogram.add(view, record, duplicates)
+
+        level = logging.WARNING if wall_ms >= SLOW_REQUEST_MS or duplicates else logging.INFO
+        if logger.isEnabledFor(level):
+            if duplicates:
+                record['duplicate_queries'] = {fingerprint(sql): count for sql, count in duplicates.items()}
+            logger.log(level, json.dumps(record))
+        return response
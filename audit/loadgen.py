@@ -0,0 +1,227 @@
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, time, timedelta
+
+from django.db import connection, transaction
+
+from .models import District, FieldAudit, Hospital, Patient
+from .search import index_patients
+from .stats import rebuild_daily_stats
+
+
+# Karnataka districts and their approximate centres; hospitals are placed around them
+DISTRICTS = (
+    ('Bagalkot', 16.18, 75.70), ('Ballari', 15.14, 76.92), ('Belagavi', 15.85, 74.50),
+    ('Bengaluru Rural', 13.28, 77.54), ('Bengaluru Urban', 12.97, 77.59), ('Bidar', 17.91, 77.52),
+    ('Chamarajanagar', 11.92, 76.94), ('Chikkaballapur', 13.43, 77.73), ('Chikkamagaluru', 13.32, 75.77),
+    ('Chitradurga', 14.23, 76.40), ('Dakshina Kannada', 12.87, 74.88), ('Davanagere', 14.46, 75.92),
+    ('Dharwad', 15.46, 75.01), ('Gadag', 15.43, 75.63), ('Hassan', 13.00, 76.10),
+    ('Haveri', 14.79, 75.40), ('Kalaburagi', 17.33, 76.83), ('Kodagu', 12.42, 75.74),
+    ('Kolar', 13.14, 78.13), ('Koppal', 15.35, 76.15), ('Mandya', 12.52, 76.90),
+    ('Mysuru', 12.30, 76.64), ('Raichur', 16.20, 77.36), ('Ramanagara', 12.72, 77.28),
+    ('Shivamogga', 13.93, 75.57), ('Tumakuru', 13.34, 77.10), ('Udupi', 13.34, 74.75),
+    ('Uttara Kannada', 14.80, 74.13), ('Vijayanagara', 15.27, 76.39), ('Vijayapura', 16.83, 75.71),
+    ('Yadgir', 16.77, 77.14),
+)
+FIRST_NAMES = (
+    'Aishwarya', 'Anil', 'Anitha', 'Basavaraj', 'Bhagya', 'Chandrashekar', 'Deepa', 'Ganesh', 'Geetha',
+    'Hanumantha', 'Kavya', 'Krishna', 'Lakshmi', 'Mahesh', 'Manjula', 'Manjunath', 'Mohan', 'Nagaraj',
+    'Nandini', 'Pavithra', 'Prakash', 'Ramesh', 'Rekha', 'Santosh', 'Shanthamma', 'Shivakumar',
+    'Shobha', 'Sridhar', 'Sunitha', 'Suresh', 'Venkatesh', 'Yallappa',
+)
+LAST_NAMES = (
+    'Gowda', 'Hegde', 'Kulkarni', 'Naik', 'Patil', 'Rao', 'Reddy', 'Shetty', 'Bhat', 'Desai',
+    'Hiremath', 'Kamath', 'Murthy', 'Nayak', 'Pujari', 'Shastry',
+)
+HOSPITAL_KINDS = ('District Hospital', 'Taluk Hospital', 'Multispeciality Hospital', 'Nursing Home',
+                  'Medical College Hospital', 'Eye Hospital', 'Maternity Home', 'Heart Centre')
+# (package code, name, relative frequency); a few packages dominate, as in real claims
+PACKAGES = (
+    ('M1.1', 'Acute febrile illness', 30), ('S3.2', 'Cataract surgery', 18), ('O2.5', 'Caesarean delivery', 15),
+    ('M5.4', 'Dialysis', 12), ('C4.3', 'Chemotherapy', 8), ('S1.7', 'Appendicectomy', 6),
+    ('O3.1', 'Normal delivery', 6), ('C2.2', 'Coronary angioplasty', 3), ('T1.4', 'Fracture fixation', 3),
+    ('NA', 'Not specified', 4),
+)
+DESIGNATIONS = ('District Coordinator', 'Medical Auditor', 'Field Officer')
+FIRST_VISIT = date(2023, 1, 1)
+VISIT_DAYS = 900
+
+# Patients created per task handed to a worker
+TASK_SIZE = 20000
+INSERT_BATCH_SIZE = 5000
+
+_audits = None
+
+
+def _name(rng):
+    return f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+
+
+def _near(rng, latitude, longitude, spread):
+    return round(latitude + rng.uniform(-spread, spread), 6), round(longitude + rng.uniform(-spread, spread), 6)
+
+
+def ensure_districts():
+    """The generator's districts with their centres, creating any that are missing."""
+    existing = {district.name: district for district in District.objects.filter(name__in=[name for name, _, _ in DISTRICTS])}
+    District.objects.bulk_create(
+        [District(name=name) for name, _, _ in DISTRICTS if name not in existing], ignore_conflicts=True
+    )
+    districts = {district.name: district for district in District.objects.filter(name__in=[name for name, _, _ in DISTRICTS])}
+    return [(districts[name], latitude, longitude) for name, latitude, longitude in DISTRICTS]
+
+
+def create_hospitals(rng, districts, count, prefix, start):
+    hospitals = []
+    for number in range(start, start + count):
+        district, latitude, longitude = rng.choice(districts)
+        # Most hospitals are unsurveyed; the location checks fall back to their audits
+        surveyed = rng.random() < 0.3
+        hospital_lat, hospital_lon = _near(rng, latitude, longitude, 0.4)
+        hospitals.append(Hospital(
+            code=f'{prefix}H{number:06d}',
+            name=f'{district.name} {rng.choice(HOSPITAL_KINDS)} {number}',
+            ehcp_type='Public' if rng.random() < 0.35 else 'Private',
+            district=district,
+            latitude=hospital_lat if surveyed else None,
+            longitude=hospital_lon if surveyed else None,
+        ))
+        # Remember the true location for the audits even when it is not stored
+        hospitals[-1].site = (hospital_lat, hospital_lon)
+    Hospital.objects.bulk_create(hospitals, batch_size=INSERT_BATCH_SIZE)
+    return hospitals
+
+
+def create_audits(rng, hospitals, count, auditors):
+    audits = []
+    for _ in range(count):
+        hospital = rng.choice(hospitals)
+        latitude, longitude = _near(rng, *hospital.site, 0.003)
+        ekgp, pmjay = rng.randint(0, 40), rng.randint(0, 60)
+        findings = rng.random() < 0.2
+        audit = FieldAudit(
+            district=hospital.district,
+            hospital=hospital,
+            ehcp_name=hospital.name,
+            ehcp_type=hospital.ehcp_type,
+            auditor_name=rng.choice(auditors),
+            designation=rng.choice(DESIGNATIONS),
+            visit_date=FIRST_VISIT + timedelta(days=rng.randrange(VISIT_DAYS)),
+            visit_time=time(rng.randint(8, 17), rng.choice((0, 15, 30, 45))),
+            current_location=f'{latitude}, {longitude}',
+            latitude=latitude,
+            longitude=longitude,
+            ekgp_patients=ekgp,
+            pmjay_patients=pmjay,
+            beneficiaries=ekgp + pmjay,
+            findings_type='audit_findings' if findings else None,
+            audit_findings_value='Yes' if findings else 'No',
+            hnqa_value='Yes' if rng.random() < 0.1 else 'No',
+            fraudulent_value='Yes' if rng.random() < 0.03 else 'No',
+            status=rng.choices(('Completed', 'Pending', 'In Progress'), weights=(70, 20, 10))[0],
+        )
+        # bulk_create skips save(), which derives the geohash
+        audit.geohash = audit.compute_geohash()
+        audits.append(audit)
+    return FieldAudit.objects.bulk_create(audits, batch_size=INSERT_BATCH_SIZE)
+
+
+def _init_worker(audits):
+    global _audits
+    import django
+    django.setup()
+    _audits = audits
+
+
+def _patient(rng, number, prefix, audits, shared_mobiles):
+    audit_id, visit_date = rng.choice(audits)
+    admitted = visit_date - timedelta(days=rng.randint(0, 60))
+    code, package, _ = rng.choices(PACKAGES, weights=[weight for _, _, weight in PACKAGES])[0]
+    oope = round(rng.lognormvariate(7.5, 1.0), 2) if rng.random() < 0.12 else 0
+    deviations = 0
+    for flag in Patient.DEVIATION_FLAGS.values():
+        if rng.random() < 0.04:
+            deviations |= flag
+    return Patient(
+        audit_id=audit_id,
+        case_id=f'{prefix}C{number:09d}',
+        patient_name=_name(rng),
+        # A small pool of numbers recurs across hospitals, like real repeat beneficiaries
+        mobile_number=rng.choice(shared_mobiles) if rng.random() < 0.02 else str(rng.randint(6000000000, 9999999999)),
+        admission_date=admitted,
+        discharge_date=None if rng.random() < 0.05 else admitted + timedelta(days=rng.randint(1, 12)),
+        package_name=package,
+        package_code=code,
+        missing_records=rng.random() < 0.08,
+        money_collection=rng.random() < 0.04,
+        deviation_flags=deviations,
+        total_oope=oope,
+        case_summary=f'{package} admission',
+    )
+
+
+def create_patients(task, audits=None):
+    """Insert one task's patients; runs in a worker process or inline."""
+    start, count, prefix, seed = task
+    audits = audits if audits is not None else _audits
+    rng = random.Random(seed)
+    shared_mobiles = [str(9000000000 + number) for number in range(1000)]
+    for offset in range(start, start + count, INSERT_BATCH_SIZE):
+        batch = [
+            _patient(rng, number, prefix, audits, shared_mobiles)
+            for number in range(offset, min(offset + INSERT_BATCH_SIZE, start + count))
+        ]
+        with transaction.atomic():
+            created = Patient.objects.bulk_create(batch)
+            # bulk_create skips the signals that maintain the SQLite search tables
+            index_patients(patient.pk for patient in created)
+    return count
+
+
+def generate(patients, hospitals=None, audits=None, prefix='LOAD', workers=1, seed=0, progress=None):
+    """Add a realistic data set of ``patients`` patients and proportional hospitals and audits.
+
+    Runs are additive: numbering continues after the rows an earlier run
+    with the same ``prefix`` created, so a data set can be grown scale by
+    scale. Patients are inserted in ``TASK_SIZE`` tasks spread over
+    ``workers`` processes, each with its own database connection.
+    Returns the number of districts, hospitals, audits and patients added.
+    """
+    hospitals = max(10, patients // 500) if hospitals is None else hospitals
+    audits = max(20, patients // 50) if audits is None else audits
+    hospital_start = Hospital.objects.filter(code__startswith=f'{prefix}H').count()
+    patient_start = Patient.objects.filter(case_id__startswith=f'{prefix}C').count()
+    rng = random.Random(f'{seed}-{prefix}-{patient_start}')
+
+    district_count = District.objects.count()
+    districts = ensure_districts()
+    auditors = sorted({_name(rng) for _ in range(max(5, audits // 200))})
+    created_hospitals = create_hospitals(rng, districts, hospitals, prefix, hospital_start)
+    created_audits = [(audit.pk, audit.visit_date) for audit in create_audits(rng, created_hospitals, audits, auditors)]
+    if progress:
+        progress(f'Created {hospitals} hospital(s) and {audits} audit(s).')
+
+    tasks = [
+        (start, min(TASK_SIZE, patient_start + patients - start), prefix, f'{seed}-{prefix}-{start}')
+        for start in range(patient_start, patient_start + patients, TASK_SIZE)
+    ]
+    done = 0
+    # SQLite takes one writer at a time; parallel workers would only wait on its lock
+    if workers <= 1 or connection.vendor == 'sqlite':
+        for task in tasks:
+            done += create_patients(task, created_audits)
+            if progress:
+                progress(f'Created {done} of {patients} patient(s).')
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(created_audits,),
+        ) as pool:
+            for count in pool.map(create_patients, tasks):
+                done += count
+                if progress:
+                    progress(f'Created {done} of {patients} patient(s).')
+
+    rebuild_daily_stats()
+    return District.objects.count() - district_count, hospitals, audits, patients
@@ -0,0 +1,93 @@
+import json
+import os
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from audit import benchmark
+from audit.loadgen import generate
+from audit.models import Patient
+
+
+class Command(BaseCommand):
+    help = (
+        'Time every GET view in audit/urls.py, the admin changelists and the exports, and write '
+        'latency percentiles, query counts and peak RSS to a JSON report. With --scales, the '
+        'database is first grown with generate_load_data to each patient count in turn.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scales', help='Comma-separated patient counts to grow the data to and benchmark at, e.g. 10000,100000,1000000.'
+        )
+        parser.add_argument('--repeat', type=int, default=20, help='Timed requests per endpoint (default 20).')
+        parser.add_argument('--export-repeat', type=int, default=3, help='Timed requests per export (default 3).')
+        parser.add_argument('--only', action='append', help='Only endpoints whose name contains this; repeatable.')
+        parser.add_argument('--user', help='Username to request as (default: the first superuser).')
+        parser.add_argument('--output', help='Report path (default benchmark-<timestamp>.json).')
+        parser.add_argument('--compare', help='Earlier report to compare this run with.')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Latency growth counted as a regression (default 0.2).')
+        parser.add_argument('--fail-on-regression', action='store_true', help='Exit with an error when a regression is found.')
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1), help='Processes for data generation.')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or options['export_repeat'] < 1:
+            raise CommandError('--repeat and --export-repeat must be at least 1.')
+        try:
+            scales = [int(scale) for scale in options['scales'].split(',')] if options['scales'] else [None]
+        except ValueError:
+            raise CommandError('--scales must be a comma-separated list of patient counts.')
+        users = User.objects.filter(username=options['user']) if options['user'] else User.objects.filter(is_superuser=True)
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError('No such user.' if options['user'] else 'No superuser to request as; pass --user.')
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    previous = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read {options["compare"]}: {e}')
+
+        report = {
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'export_repeat': options['export_repeat'],
+            'runs': [],
+        }
+        for target in sorted(scales, key=lambda scale: scale or 0):
+            if target is not None:
+                missing = target - Patient.objects.count()
+                if missing > 0:
+                    self.stdout.write(f'Generating {missing} patient(s) to reach {target}...')
+                    generate(missing, workers=options['workers'])
+                elif missing < 0:
+                    self.stdout.write(self.style.WARNING(
+                        f'The database already holds {target - missing} patients; benchmarking at that scale.'
+                    ))
+                self.stdout.write(f'--- {target} patients ---')
+            run = benchmark.run(
+                user, repeat=options['repeat'], export_repeat=options['export_repeat'],
+                only=options['only'], progress=self.stdout.write,
+            )
+            run['target'] = target
+            report['runs'].append(run)
+            for name, reason in run['skipped'].items():
+                self.stdout.write(f'SKIP  {name} ({reason})')
+
+        output = options['output'] or f'benchmark-{timezone.now():%Y%m%d-%H%M%S}.json'
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Wrote {output}.'))
+
+        if previous is not None:
+            rows = benchmark.compare(previous, report, options['threshold'])
+            regressions = [row for row in rows if row[5]]
+            for target, name, metric, before, after, _ in regressions:
+                self.stdout.write(self.style.ERROR(f'REGRESSION  {name} {metric}: {before} -> {after}' + (f' at {target} patients' if target else '')))
+            self.stdout.write(f'Compared {len(rows)} measurement(s) with {options["compare"]}: {len(regressions)} regression(s).')
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} regression(s).')
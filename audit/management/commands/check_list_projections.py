@@ -0,0 +1,93 @@
+import re
+
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import NoReverseMatch, resolve, reverse
+
+from audit.admin import admin_site
+from audit.models import FieldAudit, Hospital, Patient
+from audit.projections import AUDIT_HEAVY_FIELDS, PATIENT_HEAVY_FIELDS
+
+
+def heavy_columns():
+    """``"table"."column"`` patterns of the columns list pages must not read."""
+    columns = []
+    for model, fields in ((FieldAudit, AUDIT_HEAVY_FIELDS), (Patient, PATIENT_HEAVY_FIELDS)):
+        for field in fields:
+            column = model._meta.get_field(field).column
+            pattern = re.compile(rf'"{model._meta.db_table}"\."{column}"')
+            columns.append((f'{model.__name__}.{field}', pattern))
+    return columns
+
+
+def list_pages():
+    """Every list page and list JSON endpoint, as (name, path)."""
+    hospital_code = Hospital.objects.order_by().values_list('code', flat=True).first() or 'unknown'
+    pages = [
+        ('home', reverse('home')),
+        ('view_records', reverse('view_records')),
+        ('view_records_page', reverse('view_records_page')),
+        ('hospital_patients', reverse('hospital_patients', args=[hospital_code])),
+        ('hospital_patients_page', reverse('hospital_patients_page', args=[hospital_code])),
+        ('admin_panel', reverse('admin_panel')),
+        ('admin_dashboard', reverse('admin_dashboard')),
+    ]
+    for model in (FieldAudit, Patient):
+        name = f'{admin_site.name}:{model._meta.app_label}_{model._meta.model_name}_changelist'
+        try:
+            pages.append((f'admin {model._meta.model_name} changelist', reverse(name)))
+        except NoReverseMatch:
+            # The custom admin site is not routed in this project
+            pass
+    return pages
+
+
+class Command(BaseCommand):
+    help = (
+        'Render every list page and list JSON endpoint and fail if any of them reads '
+        'a heavy column (photos, signatures, free-text notes) of FieldAudit or Patient, '
+        'either in its main query or through a deferred field loaded per row.'
+    )
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(is_superuser=True, is_active=True).first()
+        if user is None:
+            raise CommandError('A superuser is needed to render the admin pages; create one first.')
+
+        factory = RequestFactory()
+        columns = heavy_columns()
+        failures = []
+        for name, path in list_pages():
+            request = factory.get(path)
+            request.user = user
+            request.session = SessionStore()
+            request._messages = FallbackStorage(request)
+            match = resolve(path)
+
+            with CaptureQueriesContext(connection) as queries:
+                response = match.func(request, *match.args, **match.kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+
+            if response.status_code != 200:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'FAIL  {name}: HTTP {response.status_code}'))
+                continue
+
+            loaded = sorted({
+                label for query in queries.captured_queries
+                for label, pattern in columns if pattern.search(query['sql'])
+            })
+            if loaded:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'LOAD  {name}: reads {", ".join(loaded)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK    {name} ({len(queries)} queries)'))
+
+        if failures:
+            raise CommandError(f'{len(failures)} list page(s) read heavy columns: {", ".join(failures)}')
@@ -0,0 +1,89 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from audit.models import FieldAudit, Hospital, Patient
+
+
+# Full scans of these tables are what the index set is meant to prevent.
+AUDIT_TABLES = ('audit_fieldaudit', 'audit_patient', 'audit_hospital', 'audit_actionlog')
+
+POSTGRES_SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+SQLITE_FULL_SCAN = re.compile(r'\bSCAN (\w+)(?!.*\bUSING\b)')
+
+
+def _sample(model, field, default):
+    value = model.objects.order_by().values_list(field, flat=True).first()
+    return value if value is not None else default
+
+
+def main_queries():
+    """The main query of each view and admin changelist, as (name, queryset, postgres_only)."""
+    today = timezone.now().date()
+    hospital_code = _sample(Hospital, 'code', '')
+    visit_date = _sample(FieldAudit, 'visit_date', today)
+    admission_date = _sample(Patient, 'admission_date', today)
+    month_ago = admission_date - timedelta(days=30)
+
+    audits = FieldAudit.objects.select_related('district')
+    return [
+        ('view_records', audits.order_by('-visit_date', 'ehcp_name')[:50], False),
+        ('view_records (keyset page)', audits.filter(visit_date__lte=visit_date).filter(
+            Q(visit_date__lt=visit_date) | Q(visit_date=visit_date, id__lt=10 ** 9)
+        ).order_by('-visit_date', '-id')[:51], False),
+        ('view_records?ehcp_type', audits.filter(ehcp_type='Public').order_by('-visit_date')[:50], False),
+        ('view_records?visit_date', audits.filter(visit_date=visit_date).order_by('-visit_date'), False),
+        # A leading-wildcard LIKE can only be served by the PostgreSQL trigram index
+        ('view_records?ehcp_name', audits.filter(ehcp_name__icontains='hosp').order_by('-visit_date')[:50], True),
+        ('hospital_records', Hospital.objects.select_related('district').order_by('name')[:50], False),
+        ('get_hospital', Hospital.objects.filter(code=hospital_code), False),
+        ('get_hospital (latest audit)', FieldAudit.objects.filter(hospital_id=hospital_code).order_by('-visit_date', '-id')[:1], False),
+        ('hospital_patients', Patient.objects.filter(audit__hospital_id=hospital_code).order_by('-admission_date'), False),
+        ('admin patients', Patient.objects.select_related('audit').order_by('-admission_date')[:100], False),
+        ('admin patients?money_collection', Patient.objects.filter(money_collection=True).order_by('-admission_date')[:100], False),
+        ('admin patients?missing_records', Patient.objects.filter(missing_records=True).order_by('-admission_date')[:100], False),
+        ('admin patients?date_hierarchy', Patient.objects.filter(admission_date__range=(month_ago, admission_date)).order_by('-admission_date')[:100], False),
+        ('admin patients?compliant', Patient.objects.filter(Q(money_collection=False) & Q(missing_records=False)).order_by('-admission_date')[:100], False),
+        ('admin audits?date_hierarchy', FieldAudit.objects.filter(visit_date__range=(visit_date - timedelta(days=30), visit_date)).order_by('-visit_date')[:100], False),
+        ('admin audits?status', FieldAudit.objects.filter(status='Completed').order_by('-visit_date')[:100], False),
+    ]
+
+
+def full_scans(plan):
+    if connection.vendor == 'postgresql':
+        tables = POSTGRES_SEQ_SCAN.findall(plan)
+    else:
+        tables = [match for line in plan.splitlines() for match in SQLITE_FULL_SCAN.findall(line)]
+    return sorted({table for table in tables if table in AUDIT_TABLES})
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN the main query of every list view and admin changelist and fail '
+        'if any of them scans a whole audit table. Run it against a database seeded '
+        'with production-sized data; planners legitimately prefer full scans of tiny tables.'
+    )
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, queryset, postgres_only in main_queries():
+            if postgres_only and connection.vendor != 'postgresql':
+                self.stdout.write(f'SKIP  {name} (needs PostgreSQL trigram index)')
+                continue
+
+            plan = queryset.explain()
+            scanned = full_scans(plan)
+            if scanned:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'SCAN  {name}: full scan of {", ".join(scanned)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'OK    {name}'))
+            if options['verbosity'] > 1 or scanned:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f'{len(failures)} querie(s) fall back to a full table scan: {", ".join(failures)}')
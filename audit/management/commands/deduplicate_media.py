@@ -0,0 +1,54 @@
+import os
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from audit.models import StoredBlob, StoredFile
+from audit.storage import content_storage
+
+
+# MEDIA_ROOT directories whose files belong to ContentAddressedStorage
+CONTENT_DIRECTORIES = ('audit_photos', 'patient_photos', 'case_files', 'discharge_summaries', 'bills')
+
+
+class Command(BaseCommand):
+    help = (
+        'Move audit photos and patient documents uploaded before content-addressed storage '
+        'into the blob store, keeping one copy of each distinct file, and delete blob files '
+        'that no upload refers to.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-hours', type=float,
+            help='Keep unreferenced blob files modified within this many hours '
+                 '(default CONTENT_STORAGE_ORPHAN_GRACE_HOURS, 24).'
+        )
+
+    def handle(self, *args, **options):
+        storage = content_storage()
+        adopted = 0
+        for directory in CONTENT_DIRECTORIES:
+            root = os.path.join(storage.location, directory)
+            for dirpath, _, filenames in os.walk(root):
+                for filename in filenames:
+                    name = os.path.relpath(os.path.join(dirpath, filename), storage.location).replace(os.sep, '/')
+                    try:
+                        if storage.adopt(name):
+                            adopted += 1
+                    except OSError as e:
+                        self.stdout.write(self.style.WARNING(f'Skipping {name}: {str(e)}'))
+
+        if options['grace_hours'] is None:
+            removed = storage.remove_orphaned_blobs()
+        else:
+            removed = storage.remove_orphaned_blobs(options['grace_hours'] * 3600)
+        for path in removed:
+            self.stdout.write(f'Deleted unreferenced blob {path}')
+
+        stored = StoredBlob.objects.aggregate(total=Sum('size'))['total'] or 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Adopted {adopted} file(s), deleted {len(removed)} unreferenced blob(s). '
+            f'{StoredFile.objects.count()} name(s) now share '
+            f'{StoredBlob.objects.count()} blob(s), {stored} bytes.'
+        ))
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from audit.overlaps import detect_overlaps
+
+
+class Command(BaseCommand):
+    help = (
+        'Find admissions of the same beneficiary (same mobile number, or same name in the same '
+        'district) in different hospitals at overlapping dates, and store them for review.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        pairs, removed, skipped = detect_overlaps()
+        self.stdout.write(self.style.SUCCESS(
+            f'Found {pairs} overlapping admission pair(s) and removed {removed} that no longer overlap '
+            f'in {time.perf_counter() - started:.1f}s.'
+        ))
+        if skipped:
+            self.stdout.write(self.style.WARNING(
+                f'Skipped {skipped} key(s) shared by too many simultaneous admissions to be one person.'
+            ))
@@ -0,0 +1,43 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from audit.loadgen import generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Add a realistic synthetic data set (districts, hospitals, audits and patients) for load '
+        'testing. Runs are additive, so a database can be grown scale by scale. Never run it '
+        'against production.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--patients', type=int, default=10000, help='Patients to add (default 10000).')
+        parser.add_argument('--hospitals', type=int, help='Hospitals to add (default one per 500 patients).')
+        parser.add_argument('--audits', type=int, help='Audits to add (default one per 50 patients).')
+        parser.add_argument('--prefix', default='LOAD', help='Prefix of generated hospital codes and case IDs.')
+        parser.add_argument(
+            '--workers', type=int, default=min(4, os.cpu_count() or 1),
+            help='Processes inserting patients in parallel; SQLite always uses one.',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed, for reproducible data sets.')
+
+    def handle(self, *args, **options):
+        if options['patients'] < 0:
+            raise CommandError('--patients must not be negative.')
+        started = time.perf_counter()
+        districts, hospitals, audits, patients = generate(
+            options['patients'],
+            hospitals=options['hospitals'],
+            audits=options['audits'],
+            prefix=options['prefix'],
+            workers=options['workers'],
+            seed=options['seed'],
+            progress=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Added {districts} district(s), {hospitals} hospital(s), {audits} audit(s) and {patients} '
+            f'patient(s) in {time.perf_counter() - started:.1f}s.'
+        ))
@@ -0,0 +1,108 @@
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+from audit.images import InvalidImage, process_images, rendition_name, save_renditions
+from audit.models import FieldAudit, Patient
+from audit.storage import content_storage
+
+
+class Command(BaseCommand):
+    help = (
+        'Re-encode audit and patient photos uploaded before the image pipeline existed: '
+        'strip EXIF, downscale, convert and generate thumbnails, then delete the originals.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=20,
+            help='Images handed to the worker pool at a time (default: 20).'
+        )
+        parser.add_argument(
+            '--keep-originals', action='store_true',
+            help='Leave the original files in storage.'
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.keep_originals = options['keep_originals']
+        patients = self.process_patients()
+        audits = self.process_audits()
+        self.stdout.write(self.style.SUCCESS(f'Processed {patients} patient photo(s) and {audits} audit photo(s).'))
+
+    def _render(self, paths):
+        """Process the files at ``paths``; missing or unreadable ones come back as None."""
+        images = {}
+        for path in paths:
+            try:
+                with content_storage().open(path, 'rb') as f:
+                    images[path] = f.read()
+            except OSError as e:
+                self.stdout.write(self.style.WARNING(f'Skipping {path}: {str(e)}'))
+
+        try:
+            rendered = dict(zip(images, process_images(list(images.values()))))
+        except InvalidImage:
+            # Retry one by one so a single bad file does not sink the batch
+            rendered = {}
+            for path, data in images.items():
+                try:
+                    rendered[path] = process_images([data])[0]
+                except InvalidImage as e:
+                    self.stdout.write(self.style.WARNING(f'Skipping {path}: {str(e)}'))
+        return [rendered.get(path) for path in paths]
+
+    def _delete_original(self, path):
+        if not self.keep_originals:
+            content_storage().delete(path)
+
+    def process_patients(self):
+        pending = Patient.objects.exclude(patient_photo='').exclude(patient_photo__isnull=True).filter(
+            Q(patient_photo_thumbnail='') | Q(patient_photo_thumbnail__isnull=True)
+        ).only('id', 'patient_photo')
+        processed = 0
+        last_id = 0
+        while True:
+            batch = list(pending.filter(id__gt=last_id).order_by('id')[:self.batch_size])
+            if not batch:
+                return processed
+            last_id = batch[-1].id
+            for patient, renditions in zip(batch, self._render([p.patient_photo.name for p in batch])):
+                if renditions is None:
+                    continue
+                original = patient.patient_photo.name
+                name = rendition_name(original)
+                patient.patient_photo.save(name, ContentFile(renditions['image']), save=False)
+                patient.patient_photo_thumbnail.save(name, ContentFile(renditions['thumbnail']), save=False)
+                Patient.objects.filter(pk=patient.pk).update(
+                    patient_photo=patient.patient_photo.name,
+                    patient_photo_thumbnail=patient.patient_photo_thumbnail.name,
+                    updated_at=timezone.now()
+                )
+                self._delete_original(original)
+                processed += 1
+
+    def process_audits(self):
+        processed = 0
+        for audit in FieldAudit.objects.filter(photos__isnull=False).only('id', 'photos').iterator():
+            # Entries written by the pipeline carry their dimensions
+            legacy = [photo for photo in audit.photos if 'width' not in photo]
+            if not legacy:
+                continue
+            renditions = {}
+            for start in range(0, len(legacy), self.batch_size):
+                chunk = legacy[start:start + self.batch_size]
+                renditions.update(zip([photo['image'] for photo in chunk], self._render([photo['image'] for photo in chunk])))
+
+            photos = []
+            for photo in audit.photos:
+                rendered = renditions.get(photo['image']) if 'width' not in photo else None
+                if rendered is None:
+                    photos.append(photo)
+                    continue
+                photos.append(save_renditions(f'audit_photos/{audit.id}', photo['name'], rendered))
+                self._delete_original(photo['image'])
+                processed += 1
+            FieldAudit.objects.filter(pk=audit.pk).update(photos=photos)
+        return processed
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from audit.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = (
+        'Repopulate the SQLite patient search tables from the patient table. Run it after '
+        'bulk loads or raw SQL that bypassed the model signals. PostgreSQL keeps its '
+        'search vector in a generated column and needs no rebuild.'
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write('The search index is maintained by the database; nothing to rebuild.')
+            return
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Rebuilt the patient search index.'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from audit.models import DailyStats
+from audit.stats import rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount the DailyStats rollup from the audit and patient tables. Run it after '
+        'bulk loads or raw SQL that bypassed the model signals, or to repair drift.'
+    )
+
+    def handle(self, *args, **options):
+        rebuild_daily_stats()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {DailyStats.objects.count()} daily statistics row(s).'))
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from audit.export_jobs import claim_next_job, purge_expired_artifacts, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = 'Process queued export jobs, polling the database for new work.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--poll-interval', type=float, default=5.0,
+            help='Seconds to sleep when there is no pending job (default: 5).'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Process every pending job and exit instead of polling forever.'
+        )
+
+    def handle(self, *args, **options):
+        poll_interval = options['poll_interval']
+        self.stdout.write('Export worker started.')
+        try:
+            while True:
+                requeued, failed = requeue_stale_jobs()
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Re-queued {requeued} stale export job(s).'))
+                if failed:
+                    self.stdout.write(self.style.ERROR(f'Failed {failed} stale export job(s) with no attempts left.'))
+
+                job = claim_next_job()
+                if job is not None:
+                    self.stdout.write(f'Running export job {job.id} ({job.export_type})...')
+                    job = run_job(job)
+                    if job.status == 'Completed':
+                        self.stdout.write(self.style.SUCCESS(f'Export job {job.id} completed.'))
+                    else:
+                        self.stdout.write(self.style.ERROR(f'Export job {job.id} failed: {job.error}'))
+                    continue
+
+                purged = purge_expired_artifacts()
+                if purged:
+                    self.stdout.write(f'Deleted {purged} expired export file(s).')
+                if options['once']:
+                    break
+                time.sleep(poll_interval)
+        except KeyboardInterrupt:
+            self.stdout.write('Export worker stopped.')
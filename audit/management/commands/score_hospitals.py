@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from audit.risk import update_risk_scores
+
+
+class Command(BaseCommand):
+    help = (
+        'Compute fraud-risk scores for the hospitals whose audits or patients changed since '
+        'they were last scored. Run it periodically (e.g. nightly from cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rescore every hospital, changed or not.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        scored, removed = update_risk_scores(rescore_all=options['all'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Scored {scored} hospital(s) and removed {removed} stale score(s) '
+            f'in {time.perf_counter() - started:.1f}s.'
+        ))
@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from audit.verification import verify_locations
+
+
+class Command(BaseCommand):
+    help = (
+        'Check every audit\'s submitted coordinates against its hospital\'s location and the '
+        'auditor\'s previous visit, and store the audits that fail for review.'
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        off_site, impossible_travel, cleared = verify_locations()
+        self.stdout.write(self.style.SUCCESS(
+            f'Flagged {off_site} off-site audit(s) and {impossible_travel} with impossible travel, '
+            f'cleared {cleared} earlier flag(s) in {time.perf_counter() - started:.1f}s.'
+        ))
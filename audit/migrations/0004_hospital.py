@@ -0,0 +1,67 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_hospitals(apps, schema_editor):
+    """Create one Hospital per distinct hospital_id, using its latest audit's details."""
+    FieldAudit = apps.get_model('audit', 'FieldAudit')
+    Hospital = apps.get_model('audit', 'Hospital')
+
+    audits = FieldAudit.objects.order_by('hospital_id', '-visit_date', '-id').values_list(
+        'hospital_id', 'ehcp_name', 'ehcp_type', 'district_id'
+    )
+    hospitals = []
+    seen = set()
+    for code, name, ehcp_type, district_id in audits.iterator(chunk_size=2000):
+        if code in seen:
+            continue
+        seen.add(code)
+        hospitals.append(Hospital(code=code, name=name, ehcp_type=ehcp_type, district_id=district_id))
+    Hospital.objects.bulk_create(hospitals, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0003_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hospital',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50, unique=True, verbose_name='Hospital ID')),
+                ('name', models.CharField(max_length=200)),
+                ('ehcp_type', models.CharField(choices=[('Public', 'Public'), ('Private', 'Private')], max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('district', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='hospitals', to='audit.district')),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.RunPython(create_hospitals, migrations.RunPython.noop),
+        # Rename the field but keep the column: the existing hospital_id values
+        # become the foreign key to Hospital.code.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='fieldaudit',
+                    name='hospital_id',
+                ),
+                migrations.AddField(
+                    model_name='fieldaudit',
+                    name='hospital',
+                    field=models.CharField(db_column='hospital_id', max_length=50, default=''),
+                    preserve_default=False,
+                ),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='fieldaudit',
+            name='hospital',
+            field=models.ForeignKey(db_column='hospital_id', on_delete=django.db.models.deletion.PROTECT, related_name='audits', to='audit.hospital', to_field='code', verbose_name='Hospital'),
+        ),
+    ]
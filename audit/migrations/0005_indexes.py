@@ -0,0 +1,113 @@
+# Generated by Django 5.1.6 on 2026-10-18 18:54
+
+from django.db import migrations, models
+
+
+# icontains compiles to UPPER(col::text) LIKE UPPER('%term%') on PostgreSQL, so
+# the trigram indexes are built over the same expression. Other backends keep
+# the plain B-tree indexes declared on the models.
+TRIGRAM_INDEXES = [
+    ('audit_fa_ehcp_name_trgm', 'audit_fieldaudit', 'ehcp_name'),
+    ('audit_pat_name_trgm', 'audit_patient', 'patient_name'),
+    ('audit_pat_package_trgm', 'audit_patient', 'package_name'),
+]
+
+
+def create_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin (UPPER({column}::text) gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0004_hospital'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='actionlog',
+            index=models.Index(fields=['coordinator', '-timestamp'], name='audit_log_coord_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='actionlog',
+            index=models.Index(fields=['-timestamp'], name='audit_log_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fieldaudit',
+            index=models.Index(fields=['-visit_date', 'ehcp_name'], name='audit_fa_visit_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fieldaudit',
+            index=models.Index(fields=['hospital', '-visit_date'], name='audit_fa_hospital_visit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fieldaudit',
+            index=models.Index(fields=['ehcp_type', '-visit_date'], name='audit_fa_type_visit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fieldaudit',
+            index=models.Index(fields=['district', '-visit_date'], name='audit_fa_district_visit_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fieldaudit',
+            index=models.Index(fields=['ehcp_name'], name='audit_fa_ehcp_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fieldaudit',
+            index=models.Index(fields=['status'], name='audit_fa_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='fieldaudit',
+            index=models.Index(fields=['-created_at'], name='audit_fa_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hospital',
+            index=models.Index(fields=['name'], name='audit_hospital_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['audit', '-admission_date'], name='audit_pat_audit_adm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['-admission_date'], name='audit_pat_admission_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['discharge_date'], name='audit_pat_discharge_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(condition=models.Q(('money_collection', True)), fields=['-admission_date'], name='audit_pat_money_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(condition=models.Q(('missing_records', True)), fields=['-admission_date'], name='audit_pat_missing_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(condition=models.Q(('missing_records', False), ('money_collection', False)), fields=['-admission_date'], name='audit_pat_compliant_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['mobile_number'], name='audit_pat_mobile_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['package_code'], name='audit_pat_package_code_idx'),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
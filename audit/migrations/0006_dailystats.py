@@ -0,0 +1,72 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_daily_stats(apps, schema_editor):
+    # Same counting as audit.stats.rebuild_daily_stats, against the historical models
+    FieldAudit = apps.get_model('audit', 'FieldAudit')
+    Patient = apps.get_model('audit', 'Patient')
+    DailyStats = apps.get_model('audit', 'DailyStats')
+
+    buckets = {}
+    audit_rows = FieldAudit.objects.order_by().values('district_id', 'visit_date').annotate(
+        audits=Count('id'),
+        audits_completed=Count('id', filter=Q(status='Completed')),
+        audits_pending=Count('id', filter=Q(status='Pending')),
+        audits_in_progress=Count('id', filter=Q(status='In Progress')),
+        beneficiaries=Coalesce(Sum('beneficiaries'), 0),
+    )
+    for row in audit_rows:
+        buckets[row.pop('district_id'), row.pop('visit_date')] = row
+    patient_rows = Patient.objects.order_by().values('audit__district_id', 'audit__visit_date').annotate(
+        patients=Count('id'),
+        patients_missing_records=Count('id', filter=Q(missing_records=True)),
+        patients_money_collection=Count('id', filter=Q(money_collection=True)),
+        patients_flagged=Count('id', filter=Q(money_collection=True) | Q(missing_records=True)),
+    )
+    for row in patient_rows:
+        buckets[row.pop('audit__district_id'), row.pop('audit__visit_date')].update(row)
+
+    DailyStats.objects.bulk_create(
+        [DailyStats(district_id=district_id, date=date, **totals) for (district_id, date), totals in buckets.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0005_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('audits', models.PositiveIntegerField(default=0)),
+                ('audits_completed', models.PositiveIntegerField(default=0)),
+                ('audits_pending', models.PositiveIntegerField(default=0)),
+                ('audits_in_progress', models.PositiveIntegerField(default=0)),
+                ('beneficiaries', models.PositiveIntegerField(default=0)),
+                ('patients', models.PositiveIntegerField(default=0)),
+                ('patients_missing_records', models.PositiveIntegerField(default=0)),
+                ('patients_money_collection', models.PositiveIntegerField(default=0)),
+                ('patients_flagged', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('district', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='audit.district')),
+            ],
+            options={
+                'verbose_name': 'Daily Statistics',
+                'verbose_name_plural': 'Daily Statistics',
+                'ordering': ['-date', 'district'],
+                'constraints': [models.UniqueConstraint(fields=('district', 'date'), name='audit_dailystats_district_date_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:05
+
+import django.core.validators
+import os
+
+from django.db import migrations, models
+
+
+def describe_legacy_photos(apps, schema_editor):
+    # Older audits stored bare paths; give them the rendition shape, pointing
+    # both renditions at the original until process_stored_images re-encodes it
+    FieldAudit = apps.get_model('audit', 'FieldAudit')
+    for audit in FieldAudit.objects.filter(photos__isnull=False).only('id', 'photos').iterator():
+        if not any(isinstance(photo, str) for photo in audit.photos or []):
+            continue
+        photos = [
+            {'name': os.path.basename(photo), 'image': photo, 'thumbnail': photo} if isinstance(photo, str) else photo
+            for photo in audit.photos
+        ]
+        FieldAudit.objects.filter(pk=audit.pk).update(photos=photos)
+
+
+def restore_legacy_photos(apps, schema_editor):
+    FieldAudit = apps.get_model('audit', 'FieldAudit')
+    for audit in FieldAudit.objects.filter(photos__isnull=False).only('id', 'photos').iterator():
+        photos = [photo['image'] if isinstance(photo, dict) else photo for photo in audit.photos or []]
+        FieldAudit.objects.filter(pk=audit.pk).update(photos=photos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0006_dailystats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='patient_photo_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='patient_photos/thumbnails/%Y/%m/%d/'),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='patient_photo',
+            field=models.ImageField(blank=True, null=True, upload_to='patient_photos/%Y/%m/%d/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'webp'])], verbose_name='Patient Photo'),
+        ),
+        migrations.RunPython(describe_legacy_photos, restore_legacy_photos),
+    ]
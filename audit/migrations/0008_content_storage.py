@@ -0,0 +1,60 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:07
+
+import audit.storage
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0007_image_renditions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('sha256', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('size', models.BigIntegerField()),
+                ('path', models.CharField(max_length=255)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='bills_documents',
+            field=models.FileField(blank=True, null=True, storage=audit.storage.content_storage, upload_to='bills/%Y/%m/%d/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'jpg', 'jpeg', 'png'])], verbose_name='Bills and Documents'),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='case_file',
+            field=models.FileField(blank=True, null=True, storage=audit.storage.content_storage, upload_to='case_files/%Y/%m/%d/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx'])], verbose_name='Case File'),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='discharge_summary',
+            field=models.FileField(blank=True, null=True, storage=audit.storage.content_storage, upload_to='discharge_summaries/%Y/%m/%d/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx'])]),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='patient_photo',
+            field=models.ImageField(blank=True, null=True, storage=audit.storage.content_storage, upload_to='patient_photos/%Y/%m/%d/', validators=[django.core.validators.FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'webp'])], verbose_name='Patient Photo'),
+        ),
+        migrations.AlterField(
+            model_name='patient',
+            name='patient_photo_thumbnail',
+            field=models.ImageField(blank=True, editable=False, null=True, storage=audit.storage.content_storage, upload_to='patient_photos/thumbnails/%Y/%m/%d/'),
+        ),
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='files', to='audit.storedblob')),
+            ],
+        ),
+    ]
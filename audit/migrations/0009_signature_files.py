@@ -0,0 +1,109 @@
+# Generated by Django 5.1.6 on 2026-10-18 19:09
+
+import base64
+import binascii
+import io
+
+import audit.storage
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+from PIL import Image
+
+
+BATCH_SIZE = 200
+
+# (model, data URL column, file column)
+SIGNATURE_COLUMNS = [
+    ('FieldAudit', 'signature', 'signature_file'),
+    ('Patient', 'digital_signature', 'digital_signature_file'),
+]
+
+
+def _signature_png(data_url):
+    """The signature as a greyscale-plus-alpha PNG, or None if it is not a readable image.
+
+    A frozen copy of audit.images.signature_from_data_url as of this migration,
+    so later changes to that module cannot change what this migration does.
+    """
+    try:
+        header, _, encoded = data_url.partition(',')
+        data = base64.b64decode(encoded if header.startswith('data:') else data_url, validate=True)
+        with Image.open(io.BytesIO(data)) as image:
+            buffer = io.BytesIO()
+            image.convert('LA').save(buffer, 'PNG', optimize=True)
+    except (binascii.Error, OSError, ValueError, Image.DecompressionBombError):
+        return None
+    return buffer.getvalue()
+
+
+def signatures_to_files(apps, schema_editor):
+    for model_name, source, target in SIGNATURE_COLUMNS:
+        model = apps.get_model('audit', model_name)
+        pending = model.objects.exclude(**{f'{source}__isnull': True}).exclude(**{source: ''}).only('id', source)
+        kept_raw = []
+        last_id = 0
+        while True:
+            # Walk the table by primary key so each batch only holds a few hundred blobs
+            batch = list(pending.filter(id__gt=last_id).order_by('id')[:BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1].id
+            for obj in batch:
+                value = getattr(obj, source)
+                png = _signature_png(value)
+                if png is None:
+                    # The column is dropped below: keep the value verbatim so nothing is lost
+                    kept_raw.append(obj.id)
+                    content = ContentFile(value.encode('utf-8'), name=f'{obj.id}.bin')
+                else:
+                    content = ContentFile(png, name=f'{obj.id}.png')
+                getattr(obj, target).save(content.name, content, save=False)
+            model.objects.bulk_update(batch, [target])
+        if kept_raw:
+            print(
+                f'{len(kept_raw)} unreadable {model_name} signature(s) kept unconverted as .bin files: '
+                f'{", ".join(map(str, kept_raw))}'
+            )
+
+
+def files_to_signatures(apps, schema_editor):
+    for model_name, source, target in SIGNATURE_COLUMNS:
+        model = apps.get_model('audit', model_name)
+        for obj in model.objects.exclude(**{f'{target}__isnull': True}).exclude(**{target: ''}).only('id', target).iterator():
+            with getattr(obj, target).open('rb') as f:
+                data = f.read()
+            if getattr(obj, target).name.endswith('.bin'):
+                # Kept verbatim by signatures_to_files
+                value = data.decode('utf-8')
+            else:
+                value = 'data:image/png;base64,' + base64.b64encode(data).decode('ascii')
+            model.objects.filter(pk=obj.pk).update(**{source: value})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0008_content_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fieldaudit',
+            name='signature_file',
+            field=models.FileField(blank=True, null=True, storage=audit.storage.content_storage, upload_to='signatures/audits/%Y/%m/'),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='digital_signature_file',
+            field=models.FileField(blank=True, null=True, storage=audit.storage.content_storage, upload_to='signatures/patients/%Y/%m/', verbose_name='Digital Signature'),
+        ),
+        migrations.RunPython(signatures_to_files, files_to_signatures),
+        migrations.RemoveField(
+            model_name='fieldaudit',
+            name='signature',
+        ),
+        migrations.RemoveField(
+            model_name='patient',
+            name='digital_signature',
+        ),
+    ]
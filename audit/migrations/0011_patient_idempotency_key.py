@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0010_patient_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:05
+
+from django.db import migrations
+
+
+SEARCH_COLUMNS = ('patient_name', 'case_id', 'mobile_number', 'package_name', 'package_code')
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    columns = ', '.join(SEARCH_COLUMNS)
+    if vendor == 'postgresql':
+        # A stored generated column keeps the vector current without triggers
+        document = " || ' ' || ".join(f"coalesce({column}, '')" for column in SEARCH_COLUMNS)
+        schema_editor.execute(
+            'ALTER TABLE audit_patient ADD COLUMN IF NOT EXISTS search_vector tsvector '
+            f"GENERATED ALWAYS AS (to_tsvector('simple'::regconfig, {document})) STORED"
+        )
+        schema_editor.execute('CREATE INDEX IF NOT EXISTS audit_pat_search_idx ON audit_patient USING gin (search_vector)')
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS audit_hosp_name_trgm ON audit_hospital USING gin (UPPER(name::text) gin_trgm_ops)'
+        )
+    elif vendor == 'sqlite':
+        # FTS5 shadow tables; audit.signals and audit.search.index_patients keep them in sync
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS audit_patient_search USING fts5({columns}, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3 4')"
+        )
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS audit_patient_name_trigram USING fts5(patient_name, tokenize='trigram')"
+        )
+        schema_editor.execute(f'INSERT INTO audit_patient_search (rowid, {columns}) SELECT id, {columns} FROM audit_patient')
+        schema_editor.execute('INSERT INTO audit_patient_name_trigram (rowid, patient_name) SELECT id, patient_name FROM audit_patient')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS audit_hosp_name_trgm')
+        schema_editor.execute('DROP INDEX IF EXISTS audit_pat_search_idx')
+        schema_editor.execute('ALTER TABLE audit_patient DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS audit_patient_name_trigram')
+        schema_editor.execute('DROP TABLE IF EXISTS audit_patient_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0011_patient_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
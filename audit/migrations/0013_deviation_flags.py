@@ -0,0 +1,57 @@
+# Generated by Django 5.1.6 on 2026-10-18 21:40
+
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+# Patient.DEVIATION_FLAGS when this migration was written
+DEVIATION_FLAGS = {'money_collection': 1, 'package_upcoding': 2, 'incomplete_records': 4}
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def flags_from_deviations(apps, schema_editor):
+    Patient = apps.get_model('audit', 'Patient')
+    # At most eight distinct flag values, so one UPDATE per value and chunk
+    ids_by_flags = defaultdict(list)
+    for patient_id, deviations in Patient.objects.values_list('id', 'deviations').iterator(chunk_size=BACKFILL_CHUNK_SIZE):
+        flags = 0
+        for deviation in deviations or ():
+            flags |= DEVIATION_FLAGS.get(deviation, 0)
+        if flags:
+            ids_by_flags[flags].append(patient_id)
+    for flags, ids in ids_by_flags.items():
+        for start in range(0, len(ids), BACKFILL_CHUNK_SIZE):
+            Patient.objects.filter(pk__in=ids[start:start + BACKFILL_CHUNK_SIZE]).update(deviation_flags=flags)
+
+
+def deviations_from_flags(apps, schema_editor):
+    Patient = apps.get_model('audit', 'Patient')
+    for flags in range(1, 1 << len(DEVIATION_FLAGS)):
+        Patient.objects.filter(deviation_flags=flags).update(
+            deviations=[deviation for deviation, flag in DEVIATION_FLAGS.items() if flags & flag]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0012_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='patient',
+            name='deviation_flags',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(flags_from_deviations, deviations_from_flags),
+        migrations.RemoveField(
+            model_name='patient',
+            name='deviations',
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(condition=models.Q(('deviation_flags__gt', 0)), fields=['deviation_flags', 'audit'], name='audit_pat_deviation_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.6 on 2026-10-18 22:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0013_deviation_flags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HospitalRiskScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('patients', models.PositiveIntegerField(default=0)),
+                ('audits', models.PositiveIntegerField(default=0)),
+                ('deviation_rate', models.FloatField(default=0)),
+                ('money_collection_rate', models.FloatField(default=0)),
+                ('oope_rate', models.FloatField(default=0)),
+                ('oope_p90', models.FloatField(default=0, verbose_name='90th percentile OOPE')),
+                ('package_concentration', models.FloatField(default=0)),
+                ('repeat_findings', models.PositiveIntegerField(default=0)),
+                ('fraud_findings', models.PositiveIntegerField(default=0)),
+                ('fingerprint', models.CharField(max_length=40)),
+                ('scored_at', models.DateTimeField(auto_now=True)),
+                ('hospital', models.OneToOneField(db_column='hospital_id', on_delete=django.db.models.deletion.CASCADE, related_name='risk_score', to='audit.hospital', to_field='code')),
+            ],
+            options={
+                'verbose_name': 'Hospital Risk Score',
+                'verbose_name_plural': 'Hospital Risk Scores',
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['-score'], name='audit_risk_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 5.1.6 on 2026-10-18 22:40
+
+import django.db.models.deletion
+import django.db.models.functions.comparison
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0014_hospitalriskscore'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PatientOverlap',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('match', models.CharField(choices=[('mobile', 'Same mobile number'), ('name', 'Same name in the same district')], max_length=10)),
+                ('overlap_days', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('confirmed', 'Confirmed double claim'), ('dismissed', 'Dismissed')], default='open', max_length=10)),
+                ('detected_at', models.DateTimeField(auto_now_add=True)),
+                ('last_seen', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Overlapping Admission',
+                'verbose_name_plural': 'Overlapping Admissions',
+                'ordering': ['-last_seen', '-overlap_days'],
+            },
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='mobile_key',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Right(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.comparison.Coalesce('mobile_number', models.Value('')), models.Value(' ')), models.Value('-')), models.Value('+')), 10), output_field=models.CharField(max_length=15)),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='name_key',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Upper(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace('patient_name', models.Value(' ')), models.Value('.'))), output_field=models.CharField(max_length=200)),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['mobile_key', 'admission_date'], name='audit_pat_mobile_key_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patient',
+            index=models.Index(fields=['name_key', 'admission_date'], name='audit_pat_name_key_idx'),
+        ),
+        migrations.AddField(
+            model_name='patientoverlap',
+            name='other',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='audit.patient'),
+        ),
+        migrations.AddField(
+            model_name='patientoverlap',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='overlaps', to='audit.patient'),
+        ),
+        migrations.AddIndex(
+            model_name='patientoverlap',
+            index=models.Index(fields=['status', '-last_seen'], name='audit_overlap_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='patientoverlap',
+            index=models.Index(fields=['last_seen'], name='audit_overlap_seen_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='patientoverlap',
+            constraint=models.UniqueConstraint(fields=('patient', 'other', 'match'), name='audit_overlap_pair_uniq'),
+        ),
+    ]
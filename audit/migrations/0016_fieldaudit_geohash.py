@@ -0,0 +1,42 @@
+# Generated by Django 5.1.6 on 2026-10-18 23:05
+
+from django.db import migrations, models
+
+from audit.geo import encode
+
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_geohash(apps, schema_editor):
+    FieldAudit = apps.get_model('audit', 'FieldAudit')
+    audits = FieldAudit.objects.filter(latitude__isnull=False, longitude__isnull=False).only('id', 'latitude', 'longitude')
+    batch = []
+    for audit in audits.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        audit.geohash = encode(float(audit.latitude), float(audit.longitude))
+        batch.append(audit)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            FieldAudit.objects.bulk_update(batch, ['geohash'])
+            batch = []
+    if batch:
+        FieldAudit.objects.bulk_update(batch, ['geohash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0015_patient_overlaps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='fieldaudit',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=9, null=True),
+        ),
+        migrations.RunPython(backfill_geohash, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='fieldaudit',
+            index=models.Index(condition=models.Q(('geohash__isnull', False)), fields=['geohash'], name='audit_fa_geohash_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.6 on 2026-10-18 23:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0016_fieldaudit_geohash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='hospital',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='hospital',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.CreateModel(
+            name='AuditLocationFlag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('off_site', models.BooleanField(default=False)),
+                ('distance_km', models.FloatField(blank=True, null=True, verbose_name='Distance from hospital (km)')),
+                ('impossible_travel', models.BooleanField(default=False)),
+                ('travel_km', models.FloatField(blank=True, null=True)),
+                ('travel_hours', models.FloatField(blank=True, null=True)),
+                ('speed_kmh', models.FloatField(blank=True, null=True, verbose_name='Implied speed (km/h)')),
+                ('last_seen', models.DateTimeField()),
+                ('audit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='location_flag', to='audit.fieldaudit')),
+                ('previous_audit', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='audit.fieldaudit')),
+            ],
+            options={
+                'verbose_name': 'Audit Location Flag',
+                'verbose_name_plural': 'Audit Location Flags',
+                'ordering': ['-last_seen'],
+            },
+        ),
+    ]
@@ -1,6 +1,14 @@
 from django.db import models
+from django.db.models.functions import Coalesce, Replace, Right, Upper
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator, FileExtensionValidator
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from . import geo
+from .images import process_image, rendition_name
+from .projections import AUDIT_LIST_FIELDS, AUDIT_SUMMARY_FIELDS, PATIENT_DETAIL_FIELDS, PATIENT_TABLE_FIELDS
+from .storage import content_storage
 
 class District(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -11,6 +19,47 @@ class District(models.Model):
     class Meta:
         ordering = ['name']
 
+class Hospital(models.Model):
+    EHCP_TYPES = [
+        ('Public', 'Public'),
+        ('Private', 'Private'),
+    ]
+
+    code = models.CharField(max_length=50, unique=True, verbose_name='Hospital ID')
+    name = models.CharField(max_length=200)
+    ehcp_type = models.CharField(max_length=10, choices=EHCP_TYPES)
+    district = models.ForeignKey(District, on_delete=models.PROTECT, related_name='hospitals')
+    # Surveyed location; when unset, location checks use the median of its audit coordinates
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.code})"
+
+    def latest_audit(self, *fields):
+        """The most recent audit, loading only ``fields`` when given."""
+        audits = self.audits.order_by('-visit_date', '-id')
+        return (audits.only(*fields) if fields else audits).first()
+
+    class Meta:
+        ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='audit_hospital_name_idx'),
+        ]
+
+class FieldAuditQuerySet(models.QuerySet):
+    def for_list(self):
+        """Rows for view_records: the listed columns and the district name."""
+        return self.select_related('district').only(*AUDIT_LIST_FIELDS)
+
+    def for_summary(self):
+        """Rows for the recent audit cards on the dashboards."""
+        return self.select_related('district').only(*AUDIT_SUMMARY_FIELDS)
+
 class FieldAudit(models.Model):
     STATUS_CHOICES = [
         ('Pending', 'Pending'),
@@ -25,7 +74,18 @@ class FieldAudit(models.Model):
 
     # Basic Information
     district = models.ForeignKey(District, on_delete=models.PROTECT)
-    hospital_id = models.CharField(max_length=50)
+    # Keyed on the hospital code so ``hospital_id`` keeps holding the code
+    # that URLs and filters already use.
+    hospital = models.ForeignKey(
+        Hospital,
+        on_delete=models.PROTECT,
+        to_field='code',
+        db_column='hospital_id',
+        related_name='audits',
+        verbose_name='Hospital'
+    )
+    # The hospital's name and type as recorded at this visit. Hospital holds the
+    # current ones; earlier audits keep what the hospital was called back then.
     ehcp_name = models.CharField(max_length=200)
     ehcp_type = models.CharField(max_length=10, choices=EHCP_TYPES)
     auditor_name = models.CharField(max_length=100)
@@ -37,6 +97,8 @@ class FieldAudit(models.Model):
     current_location = models.CharField(max_length=200)
     latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
     longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    # Derived from latitude/longitude on save; proximity queries range-scan its index
+    geohash = models.CharField(max_length=geo.GEOHASH_LENGTH, null=True, blank=True, editable=False)
     
     # Patient Statistics
     ekgp_patients = models.IntegerField(default=0)
@@ -72,8 +134,10 @@ class FieldAudit(models.Model):
     fraudulent_type = models.CharField(max_length=100, null=True, blank=True)
     
     # Signature and Photos
-    signature = models.TextField(null=True, blank=True)  # Store base64 signature data
-    photos = models.JSONField(null=True, blank=True)  # Store list of photo paths
+    # Compact PNG of the auditor's signature; only detail views load it
+    signature_file = models.FileField(upload_to='signatures/audits/%Y/%m/', storage=content_storage, null=True, blank=True)
+    # List of {'name', 'image', 'thumbnail', 'width', 'height'} dicts from audit.images.save_renditions
+    photos = models.JSONField(null=True, blank=True)
     
     # Assessment Scores
     infrastructure_score = models.IntegerField(default=0)
@@ -92,15 +156,50 @@ class FieldAudit(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = FieldAuditQuerySet.as_manager()
+
     def save(self, *args, **kwargs):
         self.beneficiaries = self.ekgp_patients + self.pmjay_patients
+        self.geohash = self.compute_geohash()
+        if kwargs.get('update_fields') is not None and {'latitude', 'longitude'} & set(kwargs['update_fields']):
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'geohash'}
         super().save(*args, **kwargs)
 
+    def compute_geohash(self):
+        # Views assign the coordinates straight from the form, so they may still be strings
+        try:
+            return geo.encode(float(self.latitude), float(self.longitude))
+        except (TypeError, ValueError):
+            return None
+
     def __str__(self):
         return f"{self.ehcp_name} - {self.visit_date}"
 
+    def photo_urls(self):
+        storage = content_storage()
+        return [
+            {'name': photo['name'], 'image': storage.url(photo['image']), 'thumbnail': storage.url(photo['thumbnail'])}
+            for photo in self.photos or []
+        ]
+
     class Meta:
         ordering = ['-visit_date', 'ehcp_name']
+        indexes = [
+            # view_records default listing and the visit_date filter / date_hierarchy
+            models.Index(fields=['-visit_date', 'ehcp_name'], name='audit_fa_visit_date_idx'),
+            # Latest audit of a hospital (get_hospital, hospital_patients)
+            models.Index(fields=['hospital', '-visit_date'], name='audit_fa_hospital_visit_idx'),
+            # view_records type filter and per-district admin listings
+            models.Index(fields=['ehcp_type', '-visit_date'], name='audit_fa_type_visit_idx'),
+            models.Index(fields=['district', '-visit_date'], name='audit_fa_district_visit_idx'),
+            # Hospital name lookups; the icontains search gets a trigram index on PostgreSQL
+            models.Index(fields=['ehcp_name'], name='audit_fa_ehcp_name_idx'),
+            models.Index(fields=['status'], name='audit_fa_status_idx'),
+            # Recent audits on admin_panel and admin_dashboard
+            models.Index(fields=['-created_at'], name='audit_fa_created_idx'),
+            # Geohash prefix ranges for proximity queries and heatmaps (audit.spatial)
+            models.Index(fields=['geohash'], condition=models.Q(geohash__isnull=False), name='audit_fa_geohash_idx'),
+        ]
 
 class Coordinator(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -157,6 +256,36 @@ class ActionLog(models.Model):
         ordering = ['-timestamp']
         verbose_name = 'Action Log'
         verbose_name_plural = 'Action Logs'
+        indexes = [
+            models.Index(fields=['coordinator', '-timestamp'], name='audit_log_coord_time_idx'),
+            models.Index(fields=['-timestamp'], name='audit_log_time_idx'),
+        ]
+
+class PatientQuerySet(models.QuerySet):
+    def for_table(self):
+        """Rows for the hospital patient table."""
+        return self.only(*PATIENT_TABLE_FIELDS)
+
+    def for_detail(self):
+        """A single patient for the get_patient payload."""
+        return self.only(*PATIENT_DETAIL_FIELDS)
+
+    def with_deviation(self, deviation):
+        """Patients flagged with ``deviation``, one of Patient.DEVIATION_CHOICES."""
+        # An IN list of whole flag values, plus the partial index's condition,
+        # so both PostgreSQL and SQLite read audit_pat_deviation_idx
+        return self.filter(deviation_flags__gt=0, deviation_flags__in=Patient.flag_values_with(deviation))
+
+    def deviation_counts(self, *group_by):
+        """Patients per deviation, grouped by ``group_by`` (e.g. 'audit__district')."""
+        counts = {
+            deviation: models.Count('id', filter=models.Q(deviation_flags__in=Patient.flag_values_with(deviation)))
+            for deviation, _ in Patient.DEVIATION_CHOICES
+        }
+        flagged = self.filter(deviation_flags__gt=0).order_by()
+        if not group_by:
+            return flagged.aggregate(**counts)
+        return flagged.values(*group_by).annotate(**counts).order_by(*group_by)
 
 class Patient(models.Model):
     DEVIATION_CHOICES = [
@@ -164,6 +293,7 @@ class Patient(models.Model):
         ('package_upcoding', 'Package Upcoding'),
         ('incomplete_records', 'Incomplete Case Records')
     ]
+    DEVIATION_FLAGS = {deviation: 1 << bit for bit, (deviation, _) in enumerate(DEVIATION_CHOICES)}
     
     audit = models.ForeignKey(FieldAudit, on_delete=models.CASCADE, related_name='patients')
     case_id = models.CharField(max_length=100, unique=True, verbose_name='Case ID / IP Number')
@@ -177,18 +307,35 @@ class Patient(models.Model):
     money_collection = models.BooleanField(default=False, verbose_name='Money Collection')
     case_summary = models.TextField(blank=True)
     remarks = models.TextField(blank=True, null=True)
-    deviations = models.JSONField(default=list, help_text='List of deviations found')
+    # Bitmask of DEVIATION_FLAGS; read and set it through ``deviations``
+    deviation_flags = models.PositiveSmallIntegerField(default=0, editable=False)
     total_oope = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name='Total Out of Pocket Expenses')
-    digital_signature = models.TextField(null=True, blank=True, verbose_name='Digital Signature')
+    digital_signature_file = models.FileField(
+        upload_to='signatures/patients/%Y/%m/',
+        storage=content_storage,
+        null=True,
+        blank=True,
+        verbose_name='Digital Signature'
+    )
     patient_photo = models.ImageField(
         upload_to='patient_photos/%Y/%m/%d/',
-        validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png'])],
+        storage=content_storage,
+        validators=[FileExtensionValidator(allowed_extensions=['jpg', 'jpeg', 'png', 'webp'])],
         null=True,
         blank=True,
         verbose_name='Patient Photo'
     )
+    # Derived from patient_photo on save
+    patient_photo_thumbnail = models.ImageField(
+        upload_to='patient_photos/thumbnails/%Y/%m/%d/',
+        storage=content_storage,
+        null=True,
+        blank=True,
+        editable=False
+    )
     case_file = models.FileField(
         upload_to='case_files/%Y/%m/%d/',
+        storage=content_storage,
         validators=[FileExtensionValidator(allowed_extensions=['pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx'])],
         null=True,
         blank=True,
@@ -196,25 +343,335 @@ class Patient(models.Model):
     )
     discharge_summary = models.FileField(
         upload_to='discharge_summaries/%Y/%m/%d/',
+        storage=content_storage,
         validators=[FileExtensionValidator(allowed_extensions=['pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx'])],
         null=True,
         blank=True
     )
     bills_documents = models.FileField(
         upload_to='bills/%Y/%m/%d/',
+        storage=content_storage,
         validators=[FileExtensionValidator(allowed_extensions=['pdf', 'jpg', 'jpeg', 'png'])],
         null=True,
         blank=True,
         verbose_name='Bills and Documents'
     )
+    # Versions the get_patient payload; QuerySet.update() callers must set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
+    # Client-generated key of a batch submission, so a retried batch does not add the patient twice
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+    # Normalized keys the overlap detector (audit.overlaps) sorts and groups by:
+    # the last 10 digits of the mobile number without separators or country
+    # code, and the upper-case name without spaces and dots
+    mobile_key = models.GeneratedField(
+        expression=Right(
+            Replace(Replace(Replace(Coalesce('mobile_number', models.Value('')), models.Value(' ')), models.Value('-')), models.Value('+')),
+            10
+        ),
+        output_field=models.CharField(max_length=15),
+        db_persist=True,
+    )
+    name_key = models.GeneratedField(
+        expression=Upper(Replace(Replace('patient_name', models.Value(' ')), models.Value('.'))),
+        output_field=models.CharField(max_length=200),
+        db_persist=True,
+    )
+
+    objects = PatientQuerySet.as_manager()
+
+    @classmethod
+    def flag_values_with(cls, deviation):
+        """Every deviation_flags value that includes ``deviation``."""
+        flag = cls.DEVIATION_FLAGS[deviation]
+        return [value for value in range(1 << len(cls.DEVIATION_FLAGS)) if value & flag]
+
+    @classmethod
+    def deviations_from_flags(cls, flags):
+        return [deviation for deviation, flag in cls.DEVIATION_FLAGS.items() if flags & flag]
+
+    @property
+    def deviations(self):
+        """The deviation keys set on this patient, in DEVIATION_CHOICES order."""
+        return self.deviations_from_flags(self.deviation_flags)
+
+    @deviations.setter
+    def deviations(self, deviations):
+        flags = 0
+        for deviation in deviations or ():
+            if deviation not in self.DEVIATION_FLAGS:
+                raise ValueError(f'Unknown deviation "{deviation}"')
+            flags |= self.DEVIATION_FLAGS[deviation]
+        self.deviation_flags = flags
 
     class Meta:
         ordering = ['-admission_date']
         verbose_name = "Patient"
         verbose_name_plural = "Patients"
+        indexes = [
+            # Patients of an audit/hospital, newest admission first (hospital_patients)
+            models.Index(fields=['audit', '-admission_date'], name='audit_pat_audit_adm_idx'),
+            # Admin changelist ordering, date_hierarchy and date filters
+            models.Index(fields=['-admission_date'], name='audit_pat_admission_idx'),
+            models.Index(fields=['discharge_date'], name='audit_pat_discharge_idx'),
+            # Deviation flags are rarely set, so partial indexes stay small
+            models.Index(
+                fields=['-admission_date'],
+                condition=models.Q(money_collection=True),
+                name='audit_pat_money_idx'
+            ),
+            models.Index(
+                fields=['-admission_date'],
+                condition=models.Q(missing_records=True),
+                name='audit_pat_missing_idx'
+            ),
+            models.Index(
+                fields=['deviation_flags', 'audit'],
+                condition=models.Q(deviation_flags__gt=0),
+                name='audit_pat_deviation_idx'
+            ),
+            models.Index(
+                fields=['-admission_date'],
+                condition=models.Q(money_collection=False, missing_records=False),
+                name='audit_pat_compliant_idx'
+            ),
+            models.Index(fields=['mobile_number'], name='audit_pat_mobile_idx'),
+            models.Index(fields=['package_code'], name='audit_pat_package_code_idx'),
+            # Rows in the order the overlap detector sweeps them
+            models.Index(fields=['mobile_key', 'admission_date'], name='audit_pat_mobile_key_idx'),
+            models.Index(fields=['name_key', 'admission_date'], name='audit_pat_name_key_idx'),
+        ]
 
     def __str__(self):
         return f"{self.patient_name} - {self.case_id}"
 
     def save(self, *args, **kwargs):
+        # A freshly uploaded photo is downscaled, stripped and re-encoded
+        # before it reaches storage
+        if self.patient_photo and not self.patient_photo._committed:
+            self.process_photo()
         super().save(*args, **kwargs)
+
+    def process_photo(self):
+        self.patient_photo.seek(0)
+        renditions = process_image(self.patient_photo.read())
+        name = rendition_name(self.patient_photo.name)
+        self.patient_photo = ContentFile(renditions['image'], name=name)
+        self.patient_photo_thumbnail = ContentFile(renditions['thumbnail'], name=name)
+
+class ExportJob(models.Model):
+    STATUS_CHOICES = [
+        ('Pending', 'Pending'),
+        ('Running', 'Running'),
+        ('Completed', 'Completed'),
+        ('Failed', 'Failed'),
+    ]
+
+    EXPORT_TYPES = [
+        ('all_data', 'All Audit Data'),
+        ('patient_data', 'Hospital Patient Data'),
+        ('patient_excel', 'Hospital Patient Details'),
+    ]
+
+    export_type = models.CharField(max_length=20, choices=EXPORT_TYPES)
+    hospital_id = models.CharField(max_length=50, blank=True)
+    requested_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Pending')
+    progress = models.PositiveSmallIntegerField(default=0, validators=[MinValueValidator(0), MaxValueValidator(100)])
+    file = models.FileField(upload_to='exports/%Y/%m/%d/', null=True, blank=True)
+    error = models.TextField(blank=True)
+    # Times a worker has claimed the job; a job that keeps killing its worker is failed
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.get_export_type_display()} - {self.status} ({self.progress}%)"
+
+    @property
+    def is_expired(self):
+        return self.expires_at is not None and self.expires_at <= timezone.now()
+
+    @property
+    def is_downloadable(self):
+        return self.status == 'Completed' and bool(self.file) and not self.is_expired
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = 'Export Job'
+        verbose_name_plural = 'Export Jobs'
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+class DailyStats(models.Model):
+    """Audit and patient counters for one district on one visit date.
+
+    Kept current by the signal handlers in ``audit.signals`` so dashboards
+    read a few hundred rollup rows instead of counting every patient.
+    Patients are bucketed under their audit's district and visit date.
+    """
+    district = models.ForeignKey(District, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField()
+
+    audits = models.PositiveIntegerField(default=0)
+    audits_completed = models.PositiveIntegerField(default=0)
+    audits_pending = models.PositiveIntegerField(default=0)
+    audits_in_progress = models.PositiveIntegerField(default=0)
+    beneficiaries = models.PositiveIntegerField(default=0)
+
+    patients = models.PositiveIntegerField(default=0)
+    patients_missing_records = models.PositiveIntegerField(default=0)
+    patients_money_collection = models.PositiveIntegerField(default=0)
+    # Patients with money collection or missing records (counted once)
+    patients_flagged = models.PositiveIntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.district} - {self.date}"
+
+    class Meta:
+        ordering = ['-date', 'district']
+        verbose_name = 'Daily Statistics'
+        verbose_name_plural = 'Daily Statistics'
+        constraints = [
+            models.UniqueConstraint(fields=['district', 'date'], name='audit_dailystats_district_date_uniq'),
+        ]
+
+class HospitalRiskScore(models.Model):
+    """Fraud-risk score of a hospital and the indicators behind it.
+
+    Written by ``score_hospitals`` (see ``audit.risk``). Rates are shares of
+    the hospital's patients; ``score`` runs from 0 (no risk signals) to 100.
+    """
+    hospital = models.OneToOneField(
+        Hospital, on_delete=models.CASCADE, to_field='code', db_column='hospital_id', related_name='risk_score'
+    )
+    score = models.FloatField(default=0)
+
+    patients = models.PositiveIntegerField(default=0)
+    audits = models.PositiveIntegerField(default=0)
+    deviation_rate = models.FloatField(default=0)
+    money_collection_rate = models.FloatField(default=0)
+    oope_rate = models.FloatField(default=0)
+    oope_p90 = models.FloatField(default=0, verbose_name='90th percentile OOPE')
+    # Herfindahl index of the package codes claimed, 1 when all share one code
+    package_concentration = models.FloatField(default=0)
+    # Visits with findings after the first one, and visits finding fraud
+    repeat_findings = models.PositiveIntegerField(default=0)
+    fraud_findings = models.PositiveIntegerField(default=0)
+
+    # Digest of the hospital's patient and audit counts and last changes when
+    # scored; the hospital is rescored once it no longer matches
+    fingerprint = models.CharField(max_length=40)
+    scored_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.hospital_id}: {self.score:.1f}"
+
+    class Meta:
+        ordering = ['-score']
+        verbose_name = 'Hospital Risk Score'
+        verbose_name_plural = 'Hospital Risk Scores'
+        indexes = [
+            models.Index(fields=['-score'], name='audit_risk_score_idx'),
+        ]
+
+class PatientOverlap(models.Model):
+    """Two admissions of what looks like the same beneficiary in different
+    hospitals at overlapping dates, found by ``detect_overlaps``.
+
+    ``patient`` is the earlier admission. The review status survives later
+    runs; pairs that are no longer detected are deleted.
+    """
+    MATCH_CHOICES = [
+        ('mobile', 'Same mobile number'),
+        ('name', 'Same name in the same district'),
+    ]
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('confirmed', 'Confirmed double claim'),
+        ('dismissed', 'Dismissed'),
+    ]
+
+    patient = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='overlaps')
+    other = models.ForeignKey(Patient, on_delete=models.CASCADE, related_name='+')
+    match = models.CharField(max_length=10, choices=MATCH_CHOICES)
+    overlap_days = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+
+    detected_at = models.DateTimeField(auto_now_add=True)
+    # Start of the latest detector run that found the pair
+    last_seen = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.patient_id} / {self.other_id} ({self.match})"
+
+    class Meta:
+        ordering = ['-last_seen', '-overlap_days']
+        verbose_name = 'Overlapping Admission'
+        verbose_name_plural = 'Overlapping Admissions'
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'other', 'match'], name='audit_overlap_pair_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-last_seen'], name='audit_overlap_status_idx'),
+            models.Index(fields=['last_seen'], name='audit_overlap_seen_idx'),
+        ]
+
+class AuditLocationFlag(models.Model):
+    """An audit whose submitted coordinates fail a check of ``verify_locations``.
+
+    ``off_site`` audits were submitted too far from the hospital;
+    ``impossible_travel`` ones could not be reached from the auditor's
+    previous visit in the time between them. Audits that pass both checks
+    on a later run lose their flag.
+    """
+    audit = models.OneToOneField(FieldAudit, on_delete=models.CASCADE, related_name='location_flag')
+
+    off_site = models.BooleanField(default=False)
+    distance_km = models.FloatField(null=True, blank=True, verbose_name='Distance from hospital (km)')
+
+    impossible_travel = models.BooleanField(default=False)
+    previous_audit = models.ForeignKey(FieldAudit, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    travel_km = models.FloatField(null=True, blank=True)
+    travel_hours = models.FloatField(null=True, blank=True)
+    speed_kmh = models.FloatField(null=True, blank=True, verbose_name='Implied speed (km/h)')
+
+    # Start of the latest verifier run that flagged the audit
+    last_seen = models.DateTimeField()
+
+    def __str__(self):
+        return f"Audit {self.audit_id} location flag"
+
+    class Meta:
+        ordering = ['-last_seen']
+        verbose_name = 'Audit Location Flag'
+        verbose_name_plural = 'Audit Location Flags'
+
+class StoredBlob(models.Model):
+    """One distinct file in ContentAddressedStorage, named by its SHA-256."""
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    # Relative to MEDIA_ROOT
+    path = models.CharField(max_length=255)
+    # Number of StoredFile names pointing at this blob
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.ref_count} references)"
+
+class StoredFile(models.Model):
+    """Maps a logical storage name to the blob holding its content."""
+    name = models.CharField(max_length=255, unique=True)
+    blob = models.ForeignKey(StoredBlob, on_delete=models.PROTECT, related_name='files')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,117 @@
+from django.utils import timezone
+
+from .models import FieldAudit, Patient, PatientOverlap
+
+
+# Rows fetched per round trip while streaming patients in key order
+STREAM_CHUNK_SIZE = 5000
+# Pairs written per upsert
+WRITE_BATCH_SIZE = 1000
+# Shorter mobile keys are placeholders or typos, not phone numbers
+MIN_MOBILE_DIGITS = 10
+# A key with more simultaneous admissions than this is a placeholder shared by
+# unrelated patients (e.g. "0000000000"); its remaining rows are skipped
+MAX_ACTIVE_ADMISSIONS = 50
+
+# (match, key field, whether both admissions must be in the same district)
+MATCHES = (
+    ('mobile', 'mobile_key', False),
+    ('name', 'name_key', True),
+)
+
+
+class _Writer:
+    """Upserts detected pairs in batches, so memory stays bounded."""
+
+    def __init__(self, run_started):
+        self.run_started = run_started
+        self.pending = []
+        self.written = 0
+
+    def add(self, match, first, second, overlap_days):
+        self.pending.append(PatientOverlap(
+            patient_id=first, other_id=second, match=match,
+            overlap_days=overlap_days, last_seen=self.run_started,
+        ))
+        if len(self.pending) >= WRITE_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        # Known pairs keep their review status and detection date
+        PatientOverlap.objects.bulk_create(
+            self.pending,
+            update_conflicts=True,
+            unique_fields=['patient', 'other', 'match'],
+            update_fields=['overlap_days', 'last_seen'],
+        )
+        self.written += len(self.pending)
+        self.pending = []
+
+
+def _sweep(match, key_field, same_district, audits, writer):
+    """One pass over the patients in (key, admission date) order.
+
+    Within a key, the admissions still open at the current admission date
+    are kept in ``active``; each new admission is compared with those only,
+    so the work grows with the overlaps found, not with the square of the
+    patients sharing a key. Returns the number of placeholder keys skipped.
+    """
+    # A single-table scan in index order; ``audits`` supplies hospital and
+    # district instead of a join, which would make the database sort
+    rows = Patient.objects.exclude(**{key_field: ''}).order_by(key_field, 'admission_date').values_list(
+        'id', key_field, 'admission_date', 'discharge_date', 'audit_id'
+    ).iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+    skipped = 0
+    current_key = None
+    active = []
+    skipping = False
+    for patient_id, key, admitted, discharged, audit_id in rows:
+        if key != current_key:
+            current_key, active, skipping = key, [], False
+        if skipping or (match == 'mobile' and len(key) < MIN_MOBILE_DIGITS):
+            continue
+        # An unknown discharge date counts as a one-day stay. A transfer
+        # discharged and admitted on the same day is not an overlap.
+        discharged = discharged or admitted
+        active = [
+            admission for admission in active
+            if admitted < admission[1] or admitted == admission[0]
+        ]
+        hospital, district = audits[audit_id]
+        for start, end, other_id, other_hospital, other_district in active:
+            if other_hospital == hospital or (same_district and other_district != district):
+                continue
+            # Same-day admissions come in no fixed order; keep each pair's orientation stable
+            first, second = (other_id, patient_id) if start < admitted or other_id < patient_id else (patient_id, other_id)
+            writer.add(match, first, second, (min(end, discharged) - admitted).days)
+        active.append((admitted, discharged, patient_id, hospital, district))
+        if len(active) > MAX_ACTIVE_ADMISSIONS:
+            skipping, active = True, []
+            skipped += 1
+    return skipped
+
+
+def detect_overlaps():
+    """Find and store overlapping admissions of the same beneficiary.
+
+    Returns ``(pairs, removed, skipped_keys)``: the pairs found in this run,
+    the stored pairs deleted because they are no longer found, and the
+    placeholder keys that were skipped.
+    """
+    run_started = timezone.now()
+    writer = _Writer(run_started)
+    # One entry per audit, far fewer than patients
+    audits = {
+        audit_id: (hospital, district)
+        for audit_id, hospital, district in FieldAudit.objects.order_by().values_list('id', 'hospital_id', 'district_id').iterator()
+    }
+    skipped = 0
+    for match, key_field, same_district in MATCHES:
+        skipped += _sweep(match, key_field, same_district, audits, writer)
+    writer.flush()
+    # Only after a complete run, so an interrupted one removes nothing
+    removed, _ = PatientOverlap.objects.filter(last_seen__lt=run_started).delete()
+    return writer.written, removed, skipped
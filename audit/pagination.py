@@ -0,0 +1,73 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+PAGE_SIZE = 50
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, length):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError) as e:
+        raise InvalidCursor('Malformed page cursor') from e
+    if not isinstance(values, list) or len(values) != length:
+        raise InvalidCursor('Malformed page cursor')
+    return values
+
+
+def _after(fields, values, descending):
+    """Rows strictly after ``values`` in the (field, ...) sort order.
+
+    Written as ``first <= v AND (first < v OR (first = v AND ...))`` so the
+    leading column still bounds an index range scan.
+    """
+    op = 'lt' if descending else 'gt'
+    bound = 'lte' if descending else 'gte'
+    condition = Q()
+    for position, field in enumerate(fields):
+        clause = Q(**{f'{field}__{op}': values[position]})
+        for previous, previous_value in zip(fields[:position], values[:position]):
+            clause &= Q(**{previous: previous_value})
+        condition |= clause
+    return Q(**{f'{fields[0]}__{bound}': values[0]}) & condition
+
+
+def keyset_paginate(queryset, fields, cursor=None, page_size=PAGE_SIZE, descending=True):
+    """Return ``(items, next_cursor)`` for the page after ``cursor``.
+
+    Unlike OFFSET pagination the database seeks straight to the cursor
+    position, so deep pages cost the same as the first one. ``fields`` must
+    end with a unique column (normally ``id``) to make the order total.
+    """
+    fields = list(fields)
+    queryset = queryset.order_by(*[f'-{field}' if descending else field for field in fields])
+    if cursor:
+        values = decode_cursor(cursor, len(fields))
+        try:
+            # A cursor is client input: values of the wrong type must fail here, not in the query
+            values = [queryset.model._meta.get_field(field).to_python(value) for field, value in zip(fields, values)]
+            queryset = queryset.filter(_after(fields, values, descending))
+        except (ValidationError, ValueError, TypeError) as e:
+            raise InvalidCursor('Malformed page cursor') from e
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor([getattr(items[-1], field) for field in fields])
+    return items, next_cursor
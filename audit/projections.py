@@ -0,0 +1,38 @@
+# Named field sets for the list pages and JSON endpoints. Each one holds the
+# columns its template or payload reads, so the large text, JSON and file
+# columns below stay out of list queries. Add a field here before using it in
+# the matching template; otherwise every row costs an extra query to load it.
+
+# view_records and its infinite-scroll pages (includes/record_rows.html)
+AUDIT_LIST_FIELDS = (
+    'id', 'visit_date', 'district__name', 'hospital', 'ehcp_name', 'ehcp_type', 'auditor_name',
+    'ekgp_patients', 'findings_type', 'audit_findings_value', 'hnqa_value', 'fraudulent_value',
+)
+
+# Recent audit cards on home, admin_panel and admin_dashboard
+AUDIT_SUMMARY_FIELDS = (
+    'id', 'visit_date', 'created_at', 'district__name', 'ehcp_name', 'ehcp_type',
+)
+
+# hospital_patients and its pages (includes/patient_rows.html)
+PATIENT_TABLE_FIELDS = (
+    'id', 'audit', 'case_id', 'patient_name', 'mobile_number', 'admission_date', 'discharge_date',
+    'package_name', 'package_code', 'missing_records', 'deviation_flags', 'total_oope',
+    'patient_photo', 'case_file', 'discharge_summary', 'bills_documents',
+)
+
+# get_hospital payload: the latest audit's visit details prefill the audit form
+AUDIT_PREFILL_FIELDS = (
+    'id', 'hospital', 'auditor_name', 'designation', 'current_location', 'latitude', 'longitude',
+    'visit_date', 'visit_time', 'ekgp_patients', 'pmjay_patients', 'beneficiaries',
+    'findings_type', 'audit_findings_value', 'finding_type', 'abuse_type', 'oope_type',
+    'hnqa_value', 'hnqa_type', 'infrastructure_type', 'hr_type', 'services_type',
+    'fraudulent_value', 'fraudulent_type', 'observations',
+)
+
+# get_patient payload
+PATIENT_DETAIL_FIELDS = PATIENT_TABLE_FIELDS + ('money_collection', 'case_summary')
+
+# Columns only detail pages, forms and exports read
+AUDIT_HEAVY_FIELDS = ('photos', 'signature_file', 'observations', 'recommendations')
+PATIENT_HEAVY_FIELDS = ('case_summary', 'remarks', 'digital_signature_file')
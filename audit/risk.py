@@ -0,0 +1,191 @@
+import hashlib
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+from django.db.models import Count, FloatField, Max
+from django.db.models.functions import Cast
+
+from .models import FieldAudit, HospitalRiskScore, Patient
+
+
+# Bump when the indicators or weights change, so every hospital is rescored
+SCORING_VERSION = 1
+# Rows fetched per round trip while loading patients
+LOAD_CHUNK_SIZE = 10000
+# Hospitals per IN (...) list when loading a subset
+HOSPITAL_CHUNK_SIZE = 500
+
+# Share of the score each indicator contributes; they add up to 1
+RISK_WEIGHTS = {
+    'deviation_rate': 0.25,
+    'money_collection_rate': 0.20,
+    'oope': 0.15,
+    'package_concentration': 0.15,
+    'findings': 0.25,
+}
+# Rates of hospitals with few patients are pulled towards zero; a hospital
+# with this many patients keeps half of its observed rate
+PRIOR_PATIENTS = 20
+# A 90th percentile OOPE at or above this (in rupees) counts fully
+OOPE_P90_CAP = 10000
+# Repeat and fraud findings at or above this count fully
+FINDINGS_CAP = 3
+
+FINDING_FIELDS = ('audit_findings_value', 'hnqa_value', 'fraudulent_value')
+MISSING_PACKAGE_CODES = ('', 'NA')
+
+
+def hospital_fingerprints():
+    """Digest of each hospital's patient and audit counts and latest changes.
+
+    Deletes lower a count and saves move ``updated_at``, so the digest
+    changes whenever the data a score is computed from does.
+    """
+    patients = dict(
+        (row[0], row[1:]) for row in Patient.objects.order_by().values_list('audit__hospital_id').annotate(
+            Count('id'), Max('updated_at')
+        )
+    )
+    audits = dict(
+        (row[0], row[1:]) for row in FieldAudit.objects.order_by().values_list('hospital_id').annotate(
+            Count('id'), Max('updated_at')
+        )
+    )
+    return {
+        code: hashlib.sha1(repr((SCORING_VERSION, patients.get(code), audits.get(code))).encode()).hexdigest()
+        for code in audits.keys() | patients.keys()
+    }
+
+
+def _load(queryset, columns, codes):
+    if codes is None:
+        chunks = [queryset]
+    else:
+        codes = sorted(codes)
+        chunks = [
+            queryset.filter(**{f'{columns[0]}__in': codes[start:start + HOSPITAL_CHUNK_SIZE]})
+            for start in range(0, len(codes), HOSPITAL_CHUNK_SIZE)
+        ]
+    frames = [
+        pd.DataFrame.from_records(chunk.order_by().values_list(*columns).iterator(chunk_size=LOAD_CHUNK_SIZE), columns=columns)
+        for chunk in chunks
+    ]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def _shrunk(counts, totals):
+    return counts / (totals + PRIOR_PATIENTS)
+
+
+def compute_scores(codes=None):
+    """Risk indicators and scores of the hospitals in ``codes`` (all when None).
+
+    Patients and audits are loaded column by column and every indicator is
+    computed for all hospitals at once with NumPy group-wise passes
+    (bincount over factorized hospital codes), without a Python loop per
+    hospital or per patient. Returns a DataFrame indexed by hospital code.
+    """
+    patients = _load(
+        Patient.objects.all(),
+        ['audit__hospital_id', 'deviation_flags', 'money_collection', Cast('total_oope', FloatField()), 'package_code'],
+        codes,
+    )
+    patients.columns = ['hospital', 'deviation_flags', 'money_collection', 'oope', 'package_code']
+    audits = _load(FieldAudit.objects.all(), ['hospital_id', *FINDING_FIELDS], codes)
+    audits.columns = ['hospital', *FINDING_FIELDS]
+
+    hospitals = pd.Index(pd.unique(pd.concat([patients['hospital'], audits['hospital']], ignore_index=True)))
+    size = len(hospitals)
+
+    # Patient indicators
+    h = hospitals.get_indexer(patients['hospital'])
+    n = np.bincount(h, minlength=size).astype(float)
+    deviations = np.bincount(h, weights=patients['deviation_flags'].to_numpy() > 0, minlength=size)
+    money = np.bincount(h, weights=patients['money_collection'].to_numpy(dtype=bool), minlength=size)
+    oope = patients['oope'].fillna(0.0).to_numpy()
+    with_oope = np.bincount(h, weights=oope > 0, minlength=size)
+
+    # 90th percentile OOPE: sort by (hospital, oope) and pick a position within each hospital's run
+    sorted_oope = oope[np.lexsort((oope, h))]
+    starts = np.concatenate(([0], np.cumsum(n)[:-1])).astype(np.int64)
+    positions = starts + np.floor(0.9 * np.maximum(n - 1, 0)).astype(np.int64)
+    oope_p90 = np.zeros(size)
+    oope_p90[n > 0] = sorted_oope[positions[n > 0]]
+
+    # Package concentration: sum of squared package shares per hospital,
+    # over the patients with a package code ('NA' is the form's default)
+    coded = ~patients['package_code'].fillna('').isin(MISSING_PACKAGE_CODES).to_numpy()
+    package_codes, packages = pd.factorize(patients['package_code'][coded])
+    coded_n = np.bincount(h[coded], minlength=size).astype(float)
+    pairs, pair_counts = np.unique(h[coded].astype(np.int64) * max(len(packages), 1) + package_codes, return_counts=True)
+    concentration = np.bincount(
+        pairs // max(len(packages), 1), weights=pair_counts.astype(float) ** 2, minlength=size
+    ) / np.maximum(coded_n, 1) ** 2
+
+    # Audit indicators: repeat findings across visits and fraud findings
+    a = hospitals.get_indexer(audits['hospital'])
+    visits = np.bincount(a, minlength=size)
+    findings = np.zeros(len(audits), dtype=bool)
+    for field in FINDING_FIELDS:
+        findings |= (audits[field] == 'Yes').to_numpy()
+    finding_visits = np.bincount(a, weights=findings, minlength=size)
+    repeat_findings = np.maximum(finding_visits - 1, 0)
+    fraud_findings = np.bincount(a, weights=(audits['fraudulent_value'] == 'Yes').to_numpy(), minlength=size)
+
+    components = {
+        'deviation_rate': _shrunk(deviations, n),
+        'money_collection_rate': _shrunk(money, n),
+        'oope': 0.5 * _shrunk(with_oope, n) + 0.5 * np.minimum(oope_p90 / OOPE_P90_CAP, 1) * n / (n + PRIOR_PATIENTS),
+        'package_concentration': concentration * coded_n / (coded_n + PRIOR_PATIENTS),
+        'findings': np.minimum((repeat_findings + fraud_findings) / FINDINGS_CAP, 1),
+    }
+    score = 100 * sum(weight * components[name] for name, weight in RISK_WEIGHTS.items())
+
+    safe_n = np.maximum(n, 1)
+    return pd.DataFrame({
+        'score': np.round(score, 2),
+        'patients': n.astype(np.int64),
+        'audits': visits.astype(np.int64),
+        'deviation_rate': deviations / safe_n,
+        'money_collection_rate': money / safe_n,
+        'oope_rate': with_oope / safe_n,
+        'oope_p90': oope_p90,
+        'package_concentration': concentration,
+        'repeat_findings': repeat_findings.astype(np.int64),
+        'fraud_findings': fraud_findings.astype(np.int64),
+    }, index=hospitals)
+
+
+def update_risk_scores(rescore_all=False):
+    """Rescore the hospitals whose data changed since they were last scored.
+
+    Returns ``(scored, removed)``: the number of scores written and of
+    scores deleted because their hospital has no audits or patients left.
+    """
+    fingerprints = hospital_fingerprints()
+    stored = dict(HospitalRiskScore.objects.values_list('hospital_id', 'fingerprint'))
+    if rescore_all:
+        changed = set(fingerprints)
+    else:
+        changed = {code for code, fingerprint in fingerprints.items() if stored.get(code) != fingerprint}
+    gone = stored.keys() - fingerprints.keys()
+
+    scores = compute_scores(None if rescore_all else changed) if changed else None
+    with transaction.atomic():
+        if gone:
+            HospitalRiskScore.objects.filter(hospital_id__in=gone).delete()
+        if scores is not None:
+            fields = list(scores.columns)
+            HospitalRiskScore.objects.bulk_create(
+                [
+                    HospitalRiskScore(hospital_id=code, fingerprint=fingerprints[code], **row)
+                    for code, row in zip(scores.index, scores.to_dict('records'))
+                    if code in changed
+                ],
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['hospital'],
+                update_fields=fields + ['fingerprint', 'scored_at'],
+            )
+    return (len(changed), len(gone))
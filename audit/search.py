@@ -0,0 +1,172 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Hospital, Patient
+
+
+# Patient columns covered by the full-text index, in index column order
+PATIENT_SEARCH_FIELDS = ('patient_name', 'case_id', 'mobile_number', 'package_name', 'package_code')
+SEARCH_LIMIT = 20
+# Fuzzy matches must share at least this share of trigrams (pg_trgm's default)
+SIMILARITY_THRESHOLD = 0.3
+# Trigram candidates re-scored in Python on SQLite
+FUZZY_CANDIDATES = 200
+
+# SQLite shadow tables, kept in sync by audit.signals
+FTS_TABLE = 'audit_patient_search'
+TRIGRAM_TABLE = 'audit_patient_name_trigram'
+
+_TOKEN = re.compile(r'\w+')
+
+
+def tokens(term):
+    return _TOKEN.findall(term.lower())
+
+
+def trigrams(text):
+    """pg_trgm's trigrams: each word padded with two spaces in front and one behind."""
+    grams = set()
+    for word in tokens(text):
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    a, b = trigrams(a), trigrams(b)
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+def _ids(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _exact_ids(term, limit):
+    # Each column has its own B-tree index (case_id is unique)
+    return list(Patient.objects.filter(
+        Q(case_id=term) | Q(mobile_number=term) | Q(package_code=term)
+    ).order_by().values_list('id', flat=True)[:limit])
+
+
+def _prefix_ids(term, limit):
+    words = tokens(term)
+    if not words:
+        return []
+    if connection.vendor == 'postgresql':
+        query = ' & '.join(f'{word}:*' for word in words)
+        return _ids(
+            "SELECT id FROM audit_patient WHERE search_vector @@ to_tsquery('simple', %s) LIMIT %s",
+            [query, limit]
+        )
+    if connection.vendor == 'sqlite':
+        query = ' '.join(f'"{word}"*' for word in words)
+        return _ids(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT %s', [query, limit])
+    condition = Q()
+    for word in words:
+        condition &= Q(*[Q(**{f'{field}__istartswith': word}) for field in PATIENT_SEARCH_FIELDS], _connector=Q.OR)
+    return list(Patient.objects.filter(condition).order_by().values_list('id', flat=True)[:limit])
+
+
+def _fuzzy_ids(term, limit):
+    if len(term) < 3:
+        return []
+    if connection.vendor == 'postgresql':
+        # Same UPPER(col::text) expression as the audit_pat_name_trgm index
+        return _ids(
+            'SELECT id FROM audit_patient WHERE UPPER(patient_name::text) %% UPPER(%s) '
+            'ORDER BY similarity(UPPER(patient_name::text), UPPER(%s)) DESC LIMIT %s',
+            [term, term, limit]
+        )
+    if connection.vendor == 'sqlite':
+        grams = [gram.strip() for gram in trigrams(term) if len(gram.strip()) == 3]
+        if not grams:
+            return []
+        # Names sharing the most trigrams first, then scored like pg_trgm
+        query = ' OR '.join('"' + gram.replace('"', '""') + '"' for gram in grams)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, patient_name FROM {TRIGRAM_TABLE} WHERE {TRIGRAM_TABLE} MATCH %s ORDER BY rank LIMIT %s',
+                [query, FUZZY_CANDIDATES]
+            )
+            scored = [(similarity(term, name), rowid) for rowid, name in cursor.fetchall()]
+        return [rowid for score, rowid in sorted(scored, reverse=True) if score >= SIMILARITY_THRESHOLD][:limit]
+    return []
+
+
+def search_patient_ids(term, limit=SEARCH_LIMIT):
+    """Ids of patients matching ``term``: exact IDs first, then word prefixes, then similar names."""
+    term = term.strip()
+    found = []
+    for strategy in (_exact_ids, _prefix_ids, _fuzzy_ids):
+        if len(found) >= limit:
+            break
+        for patient_id in strategy(term, limit):
+            if patient_id not in found:
+                found.append(patient_id)
+    return found[:limit]
+
+
+def search_hospitals(term, limit=SEARCH_LIMIT):
+    term = term.strip()
+    # name__icontains is served by the audit_hosp_name_trgm index on PostgreSQL
+    return list(Hospital.objects.select_related('district').filter(
+        Q(code=term) | Q(name__icontains=term)
+    ).order_by('name')[:limit])
+
+
+def _chunks(patient_ids, size=500):
+    patient_ids = list(patient_ids)
+    for start in range(0, len(patient_ids), size):
+        chunk = patient_ids[start:start + size]
+        yield chunk, ', '.join(['%s'] * len(chunk))
+
+
+def index_patients(patient_ids):
+    """Refresh the SQLite search rows of ``patient_ids``.
+
+    PostgreSQL keeps its search vector in a generated column, so only the
+    SQLite shadow tables need this. bulk_create() bypasses the signals that
+    call it, so code using it must call it for the new rows.
+    """
+    patient_ids = list(patient_ids)
+    if connection.vendor != 'sqlite':
+        return
+    remove_patients(patient_ids)
+    columns = ', '.join(PATIENT_SEARCH_FIELDS)
+    with connection.cursor() as cursor:
+        for chunk, placeholders in _chunks(patient_ids):
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, {columns}) '
+                f'SELECT id, {columns} FROM audit_patient WHERE id IN ({placeholders})',
+                chunk
+            )
+            cursor.execute(
+                f'INSERT INTO {TRIGRAM_TABLE} (rowid, patient_name) '
+                f'SELECT id, patient_name FROM audit_patient WHERE id IN ({placeholders})',
+                chunk
+            )
+
+
+def remove_patients(patient_ids):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for chunk, placeholders in _chunks(patient_ids):
+            for table in (FTS_TABLE, TRIGRAM_TABLE):
+                cursor.execute(f'DELETE FROM {table} WHERE rowid IN ({placeholders})', chunk)
+
+
+def rebuild_index():
+    """Repopulate the SQLite search tables from audit_patient."""
+    if connection.vendor != 'sqlite':
+        return
+    columns = ', '.join(PATIENT_SEARCH_FIELDS)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'DELETE FROM {TRIGRAM_TABLE}')
+        cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, {columns}) SELECT id, {columns} FROM audit_patient')
+        cursor.execute(f'INSERT INTO {TRIGRAM_TABLE} (rowid, patient_name) SELECT id, patient_name FROM audit_patient')
@@ -0,0 +1,60 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import FieldAudit, Patient
+from .search import index_patients, remove_patients
+from .stats import mark_dirty
+
+
+# Keep DailyStats and the patient search index current. Each stats handler
+# only marks the district/day buckets a change touches; they are recounted
+# when the transaction commits. QuerySet.update() and bulk_create() bypass
+# these signals, so code using them must call mark_dirty_many() and
+# search.index_patients() itself (or run ``rebuild_stats`` and
+# ``rebuild_search_index`` afterwards).
+
+def _audit_bucket(audit_id):
+    return FieldAudit.objects.filter(pk=audit_id).values_list('district_id', 'visit_date').first()
+
+
+@receiver(pre_save, sender=FieldAudit)
+def remember_audit_bucket(sender, instance, **kwargs):
+    instance._stats_previous_bucket = _audit_bucket(instance.pk) if instance.pk else None
+
+
+@receiver(post_save, sender=FieldAudit)
+def audit_saved(sender, instance, **kwargs):
+    previous = getattr(instance, '_stats_previous_bucket', None)
+    if previous:
+        mark_dirty(*previous)
+    mark_dirty(instance.district_id, instance.visit_date)
+
+
+@receiver(post_delete, sender=FieldAudit)
+def audit_deleted(sender, instance, **kwargs):
+    mark_dirty(instance.district_id, instance.visit_date)
+
+
+@receiver(pre_save, sender=Patient)
+def remember_patient_audit(sender, instance, **kwargs):
+    if instance.pk:
+        instance._stats_previous_audit_id = Patient.objects.filter(pk=instance.pk).values_list('audit_id', flat=True).first()
+
+
+@receiver(post_save, sender=Patient)
+def patient_saved(sender, instance, **kwargs):
+    audit_ids = {instance.audit_id, getattr(instance, '_stats_previous_audit_id', None)}
+    for audit_id in audit_ids - {None}:
+        bucket = _audit_bucket(audit_id)
+        if bucket:
+            mark_dirty(*bucket)
+    index_patients([instance.pk])
+
+
+@receiver(post_delete, sender=Patient)
+def patient_deleted(sender, instance, **kwargs):
+    # During an audit's cascade delete the audit row is still present here
+    bucket = _audit_bucket(instance.audit_id)
+    if bucket:
+        mark_dirty(*bucket)
+    remove_patients([instance.pk])
@@ -0,0 +1,85 @@
+from django.db.models import Count, Q
+from django.db.models.functions import Substr
+
+from . import geo
+from .models import FieldAudit
+
+
+# Largest radius the proximity queries accept
+MAX_RADIUS_KM = 500
+NEAREST_START_KM = 2
+HEATMAP_PRECISIONS = range(1, geo.GEOHASH_LENGTH + 1)
+
+
+def _in_cells(cells):
+    """Rows whose geohash starts with one of ``cells``, as index range scans."""
+    condition = Q()
+    for cell in cells:
+        upper = geo.prefix_upper_bound(cell)
+        cell_range = Q(geohash__gte=cell)
+        if upper is not None:
+            cell_range &= Q(geohash__lt=upper)
+        condition |= cell_range
+    return condition
+
+
+def audits_within(latitude, longitude, radius_km, queryset=None, fields=('id',)):
+    """Audits within ``radius_km`` of a point, nearest first.
+
+    Candidates come from the geohash cells covering the circle; only those
+    get the exact haversine distance. Returns ``(distance_km, row)`` pairs,
+    where ``row`` is a dict of ``fields`` plus the coordinates.
+    """
+    queryset = FieldAudit.objects.all() if queryset is None else queryset
+    candidates = list(
+        queryset.filter(_in_cells(geo.covering_cells(latitude, longitude, radius_km)))
+        .order_by().values(*fields, 'latitude', 'longitude')
+    )
+    if not candidates:
+        return []
+    distances = geo.haversine_km(
+        latitude, longitude,
+        [row['latitude'] for row in candidates], [row['longitude'] for row in candidates],
+    )
+    found = [(float(distance), row) for distance, row in zip(distances, candidates) if distance <= radius_km]
+    found.sort(key=lambda pair: pair[0])
+    return found
+
+
+def nearest_hospitals(latitude, longitude, limit=5, max_radius_km=MAX_RADIUS_KM):
+    """The ``limit`` audited hospitals closest to a point, by their nearest audit location.
+
+    Searches a radius that doubles until it holds ``limit`` hospitals: every
+    hospital outside the radius is farther than those inside, so the first
+    radius that holds enough of them gives the exact answer.
+    """
+    radius = NEAREST_START_KM
+    while True:
+        nearest = {}
+        for distance, row in audits_within(
+            latitude, longitude, radius, fields=('hospital_id', 'hospital__name', 'district__name')
+        ):
+            nearest.setdefault(row['hospital_id'], (distance, row))
+        if len(nearest) >= limit or radius >= max_radius_km:
+            break
+        radius = min(radius * 2, max_radius_km)
+    return sorted(nearest.values(), key=lambda pair: pair[0])[:limit]
+
+
+def heatmap(precision, queryset=None):
+    """Audit counts per geohash cell of ``precision`` characters, with each cell's bounds."""
+    queryset = FieldAudit.objects.all() if queryset is None else queryset
+    rows = queryset.filter(geohash__isnull=False).order_by().values(
+        cell=Substr('geohash', 1, precision)
+    ).annotate(audits=Count('id'))
+    cells = []
+    for row in rows:
+        min_lat, max_lat, min_lon, max_lon = geo.bounds(row['cell'])
+        cells.append({
+            'cell': row['cell'],
+            'audits': row['audits'],
+            'latitude': (min_lat + max_lat) / 2,
+            'longitude': (min_lon + max_lon) / 2,
+            'bounds': [min_lat, min_lon, max_lat, max_lon],
+        })
+    return cells
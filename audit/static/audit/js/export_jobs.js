@@ -0,0 +1,84 @@
+// Queues an export in the background and polls its progress, so large
+// downloads never hold a web worker for the length of the export.
+document.addEventListener('DOMContentLoaded', function() {
+    const POLL_INTERVAL = 2000;
+
+    function getCsrfToken() {
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    function setLabel(button, html) {
+        button.innerHTML = html;
+    }
+
+    function pollJob(button, statusUrl, originalLabel) {
+        fetch(statusUrl)
+            .then(response => response.json())
+            .then(job => {
+                if (job.error && job.status !== 'Failed') {
+                    throw new Error(job.error);
+                }
+                if (job.status === 'Completed' && job.download_url) {
+                    button.classList.remove('disabled');
+                    button.dataset.busy = '';
+                    button.href = job.download_url;
+                    setLabel(button, '<i class="fas fa-check me-2"></i>Download Ready');
+                    window.location.href = job.download_url;
+                    return;
+                }
+                if (job.status === 'Failed') {
+                    throw new Error(job.error || 'Export failed');
+                }
+                const label = job.status === 'Pending' ? 'Queued…' : `Preparing… ${job.progress}%`;
+                setLabel(button, `<i class="fas fa-spinner fa-spin me-2"></i>${label}`);
+                setTimeout(() => pollJob(button, statusUrl, originalLabel), POLL_INTERVAL);
+            })
+            .catch(error => {
+                button.classList.remove('disabled');
+                button.dataset.busy = '';
+                setLabel(button, originalLabel);
+                alert('Export failed: ' + error.message);
+            });
+    }
+
+    document.querySelectorAll('[data-export-url]').forEach(button => {
+        button.addEventListener('click', function(e) {
+            // A finished export keeps its direct download link
+            if (button.href && button.href.indexOf('/audit/exports/') !== -1) {
+                return;
+            }
+            e.preventDefault();
+            if (button.dataset.busy) {
+                return;
+            }
+            button.dataset.busy = '1';
+            button.classList.add('disabled');
+            const originalLabel = button.innerHTML;
+            setLabel(button, '<i class="fas fa-spinner fa-spin me-2"></i>Queued…');
+
+            const formData = new FormData();
+            if (button.dataset.hospitalId) {
+                formData.append('hospital_id', button.dataset.hospitalId);
+            }
+            fetch(button.dataset.exportUrl, {
+                method: 'POST',
+                body: formData,
+                headers: {'X-CSRFToken': getCsrfToken()}
+            })
+                .then(response => response.json())
+                .then(job => {
+                    if (!job.status_url) {
+                        throw new Error(job.error || 'Unable to queue export');
+                    }
+                    pollJob(button, job.status_url, originalLabel);
+                })
+                .catch(error => {
+                    button.classList.remove('disabled');
+                    button.dataset.busy = '';
+                    setLabel(button, originalLabel);
+                    alert('Export failed: ' + error.message);
+                });
+        });
+    });
+});
@@ -0,0 +1,50 @@
+// Appends the next keyset page of table rows when the "Load more" marker
+// scrolls into view (or its button is clicked).
+document.addEventListener('DOMContentLoaded', function() {
+    document.querySelectorAll('[data-infinite-scroll]').forEach(container => {
+        const target = document.querySelector(container.dataset.target);
+        const button = container.querySelector('button');
+        let loading = false;
+
+        function loadNextPage() {
+            const nextUrl = container.dataset.nextUrl;
+            if (loading || !nextUrl) {
+                return;
+            }
+            loading = true;
+            button.disabled = true;
+            button.innerHTML = '<i class="fas fa-spinner fa-spin me-2"></i>Loading…';
+
+            fetch(nextUrl, {headers: {'X-Requested-With': 'XMLHttpRequest'}})
+                .then(response => response.json())
+                .then(data => {
+                    if (data.error) {
+                        throw new Error(data.error);
+                    }
+                    target.insertAdjacentHTML('beforeend', data.html);
+                    if (data.next_url) {
+                        container.dataset.nextUrl = data.next_url;
+                    } else {
+                        container.remove();
+                        observer.disconnect();
+                    }
+                })
+                .catch(error => {
+                    alert('Error loading more records: ' + error.message);
+                })
+                .finally(() => {
+                    loading = false;
+                    button.disabled = false;
+                    button.textContent = 'Load more';
+                });
+        }
+
+        const observer = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadNextPage();
+            }
+        }, {rootMargin: '200px'});
+        observer.observe(container);
+        button.addEventListener('click', loadNextPage);
+    });
+});
@@ -0,0 +1,149 @@
+// Queues the patients entered with "Save & Add Another" in the page and
+// submits them in one request to the batch endpoint on "Save & Complete".
+// Each patient carries a random key, so resending a batch after a dropped
+// connection does not store anyone twice.
+document.addEventListener('DOMContentLoaded', function() {
+    const form = document.querySelector('form[data-batch-url]');
+    if (!form) {
+        return;
+    }
+    const queueButton = form.querySelector('[data-queue-patient]');
+    const completeButton = form.querySelector('[data-complete-patients]');
+    const status = document.getElementById('patientQueueStatus');
+    const errors = document.getElementById('patientQueueErrors');
+    const csrfToken = form.querySelector('[name=csrfmiddlewaretoken]').value;
+    let queue = [];
+    // Files of an entry loaded back into the form for correction
+    let carriedFiles = {};
+
+    function newKey() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return Date.now().toString(36) + Math.random().toString(36).slice(2);
+    }
+
+    function readForm() {
+        const values = {};
+        const files = Object.assign({}, carriedFiles);
+        Array.from(form.elements).forEach(element => {
+            if (!element.name || element.name === 'csrfmiddlewaretoken' || element.type === 'submit') {
+                return;
+            }
+            if (element.type === 'file') {
+                if (element.files.length) {
+                    files[element.name] = element.files[0];
+                }
+            } else if (element.type === 'checkbox') {
+                values[element.name] = element.checked ? 'on' : '';
+            } else {
+                values[element.name] = element.value;
+            }
+        });
+        return {key: newKey(), values: values, files: files};
+    }
+
+    function loadForm(entry) {
+        form.reset();
+        Object.entries(entry.values).forEach(([name, value]) => {
+            const element = form.elements[name];
+            if (!element) {
+                return;
+            }
+            if (element.type === 'checkbox') {
+                element.checked = value === 'on';
+            } else {
+                element.value = value;
+            }
+        });
+        carriedFiles = entry.files;
+    }
+
+    function showStatus() {
+        status.textContent = queue.length
+            ? `${queue.length} patient(s) queued; they are saved together with "Save & Complete".`
+            : '';
+    }
+
+    function queueCurrent() {
+        if (!form.checkValidity()) {
+            form.classList.add('was-validated');
+            return false;
+        }
+        queue.push(readForm());
+        form.reset();
+        form.classList.remove('was-validated');
+        carriedFiles = {};
+        showStatus();
+        return true;
+    }
+
+    function showErrors(invalid) {
+        errors.innerHTML = '';
+        invalid.forEach(({entry, result}) => {
+            const item = document.createElement('li');
+            item.textContent = `${entry.values.case_id || 'Patient'}: ${result.errors.join(' ')}`;
+            errors.appendChild(item);
+        });
+        errors.closest('.alert').classList.toggle('d-none', !invalid.length);
+    }
+
+    function flush() {
+        const data = new FormData();
+        data.append('patients', JSON.stringify(queue.map(entry => Object.assign({key: entry.key}, entry.values))));
+        queue.forEach((entry, index) => {
+            Object.entries(entry.files).forEach(([name, file]) => data.append(`${name}-${index}`, file));
+        });
+
+        completeButton.disabled = queueButton.disabled = true;
+        status.textContent = `Saving ${queue.length} patient(s)…`;
+        fetch(form.dataset.batchUrl, {method: 'POST', body: data, headers: {'X-CSRFToken': csrfToken}})
+            .then(response => response.json())
+            .then(data => {
+                if (data.error) {
+                    throw new Error(data.error);
+                }
+                const invalid = [];
+                data.results.forEach((result, index) => {
+                    if (result.status === 'invalid') {
+                        invalid.push({entry: queue[index], result: result});
+                    }
+                });
+                queue = invalid.map(({entry}) => entry);
+                if (!queue.length) {
+                    window.location.href = form.dataset.doneUrl;
+                    return;
+                }
+                showErrors(invalid);
+                // Put the first rejected patient back in the form to be corrected
+                loadForm(queue.shift());
+                showStatus();
+            })
+            .catch(error => {
+                // Nothing is lost: the queue is kept and can be sent again
+                alert('Error saving patients: ' + error.message);
+                showStatus();
+            })
+            .finally(() => {
+                completeButton.disabled = queueButton.disabled = false;
+            });
+    }
+
+    queueButton.addEventListener('click', function(event) {
+        event.preventDefault();
+        queueCurrent();
+    });
+
+    completeButton.addEventListener('click', function(event) {
+        const current = form.elements.case_id.value.trim();
+        if (!queue.length) {
+            // A single patient goes through the regular form post
+            return;
+        }
+        event.preventDefault();
+        if (current && !queueCurrent()) {
+            return;
+        }
+        flush();
+    });
+});
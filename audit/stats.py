@@ -0,0 +1,181 @@
+import functools
+import itertools
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import DailyStats, District, FieldAudit, Patient
+
+
+AUDIT_COUNTERS = ('audits', 'audits_completed', 'audits_pending', 'audits_in_progress', 'beneficiaries')
+PATIENT_COUNTERS = ('patients', 'patients_missing_records', 'patients_money_collection', 'patients_flagged')
+COUNTERS = AUDIT_COUNTERS + PATIENT_COUNTERS
+
+FLAGGED = Q(money_collection=True) | Q(missing_records=True)
+
+
+def audit_aggregates():
+    return {
+        'audits': Count('id'),
+        'audits_completed': Count('id', filter=Q(status='Completed')),
+        'audits_pending': Count('id', filter=Q(status='Pending')),
+        'audits_in_progress': Count('id', filter=Q(status='In Progress')),
+        'beneficiaries': Coalesce(Sum('beneficiaries'), 0),
+    }
+
+
+def patient_aggregates():
+    return {
+        'patients': Count('id'),
+        'patients_missing_records': Count('id', filter=Q(missing_records=True)),
+        'patients_money_collection': Count('id', filter=Q(money_collection=True)),
+        'patients_flagged': Count('id', filter=FLAGGED),
+    }
+
+
+def bucket_totals(audits, patients):
+    """Counter values per (district_id, date) for the given querysets."""
+    buckets = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for row in audits.order_by().values('district_id', 'visit_date').annotate(**audit_aggregates()):
+        buckets[row.pop('district_id'), row.pop('visit_date')].update(row)
+    patient_rows = patients.order_by().values(
+        'audit__district_id', 'audit__visit_date'
+    ).annotate(**patient_aggregates())
+    for row in patient_rows:
+        buckets[row.pop('audit__district_id'), row.pop('audit__visit_date')].update(row)
+    return buckets
+
+
+def _buckets_filter(keys, district_field, date_field):
+    dates_by_district = defaultdict(set)
+    for district_id, date in keys:
+        dates_by_district[district_id].add(date)
+    condition = Q(pk__in=[])
+    for district_id, dates in dates_by_district.items():
+        condition |= Q(**{district_field: district_id, f'{date_field}__in': dates})
+    return condition
+
+
+def refresh_buckets(keys):
+    """Recount the given (district_id, date) buckets from the source tables.
+
+    The queries are bounded by the (district, visit_date) index, so the cost
+    depends on the days being refreshed, not on the size of the history.
+    """
+    keys = set(keys)
+    if not keys:
+        return
+    buckets = bucket_totals(
+        FieldAudit.objects.filter(_buckets_filter(keys, 'district_id', 'visit_date')),
+        Patient.objects.filter(_buckets_filter(keys, 'audit__district_id', 'audit__visit_date')),
+    )
+    with transaction.atomic():
+        DailyStats.objects.filter(_buckets_filter(keys, 'district_id', 'date')).delete()
+        DailyStats.objects.bulk_create([
+            DailyStats(district_id=district_id, date=date, **totals)
+            for (district_id, date), totals in buckets.items()
+            if totals['audits']
+        ])
+
+
+def rebuild_daily_stats():
+    """Throw away the rollup and recount every bucket from scratch."""
+    buckets = bucket_totals(FieldAudit.objects.all(), Patient.objects.all())
+    with transaction.atomic():
+        DailyStats.objects.all().delete()
+        DailyStats.objects.bulk_create(
+            [
+                DailyStats(district_id=district_id, date=date, **totals)
+                for (district_id, date), totals in buckets.items()
+                if totals['audits']
+            ],
+            batch_size=1000,
+        )
+
+
+# Latest mark per bucket in this thread. Every mark schedules a refresh for
+# when the transaction commits, but only the callback of the latest mark does
+# the work, so a cascade (an audit deleted with all its patients) recounts
+# each day once. Marks from rolled-back transactions are simply overwritten.
+_pending = threading.local()
+_marks = itertools.count()
+
+
+def _refresh_if_latest(keys, mark):
+    marks = _pending.marks
+    keys = [key for key in keys if marks.get(key) == mark]
+    for key in keys:
+        del marks[key]
+    try:
+        refresh_buckets(keys)
+    except Exception as e:
+        print(f'Error refreshing statistics for {len(keys)} district/day bucket(s): {str(e)}')
+
+
+def mark_dirty_many(keys):
+    """Schedule a recount of (district_id, date) buckets for when the transaction commits."""
+    visit_date = FieldAudit._meta.get_field('visit_date')
+    # Views assign visit_date straight from the form, so it may still be a string
+    keys = {
+        (int(district_id), visit_date.to_python(date))
+        for district_id, date in keys
+        if district_id is not None and date is not None
+    }
+    if not keys:
+        return
+    if not hasattr(_pending, 'marks'):
+        _pending.marks = {}
+    mark = next(_marks)
+    for key in keys:
+        _pending.marks[key] = mark
+    transaction.on_commit(functools.partial(_refresh_if_latest, keys, mark))
+
+
+def mark_dirty(district_id, date):
+    mark_dirty_many([(district_id, date)])
+
+
+class StatsSnapshot:
+    """Dashboard numbers read from DailyStats in a single query.
+
+    The query returns one row per district and month (districts without
+    audits included), which is enough for overall totals, per-district
+    breakdowns and monthly trends.
+    """
+
+    def __init__(self):
+        rows = District.objects.values(
+            'id', 'name', month=TruncMonth('daily_stats__date')
+        ).annotate(**{
+            counter: Coalesce(Sum(f'daily_stats__{counter}'), 0) for counter in COUNTERS
+        }).order_by('name', 'month')
+
+        self.totals = dict.fromkeys(COUNTERS, 0)
+        self.monthly = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        districts = {}
+        for row in rows:
+            district = districts.setdefault(row['id'], {'id': row['id'], 'name': row['name'], **dict.fromkeys(COUNTERS, 0)})
+            for counter in COUNTERS:
+                district[counter] += row[counter]
+                self.totals[counter] += row[counter]
+                if row['month'] is not None:
+                    self.monthly[row['month']][counter] += row[counter]
+        self.districts = list(districts.values())
+
+        for totals in [self.totals, *self.districts]:
+            totals['patients_compliant'] = totals['patients'] - totals['patients_flagged']
+            totals['patients_documented'] = totals['patients'] - totals['patients_missing_records']
+
+    @property
+    def total_districts(self):
+        return len(self.districts)
+
+    def months(self, since=None):
+        """``(month, counters)`` pairs in date order, optionally from ``since`` on."""
+        return [
+            (month, counters) for month, counters in sorted(self.monthly.items())
+            if since is None or month >= since
+        ]
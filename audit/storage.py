@@ -0,0 +1,223 @@
+import hashlib
+import os
+import tempfile
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# Names per IN (...) list when resolving many names at once
+LOOKUP_CHUNK_SIZE = 500
+# Blob files are moved into place before the upload's transaction commits;
+# younger files without a StoredBlob row may still be about to get one
+ORPHAN_GRACE_SECONDS = getattr(settings, 'CONTENT_STORAGE_ORPHAN_GRACE_HOURS', 24) * 3600
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores each distinct file once, keyed by its SHA-256.
+
+    Logical names (``case_files/2025/01/31/scan.pdf``) map to blobs through
+    ``StoredFile`` rows, and ``StoredBlob`` counts how many names point at a
+    blob. Uploading content that is already stored only adds a mapping row,
+    and the blob is removed when its last name is deleted. Names without a
+    mapping are files written before this backend existed and are served
+    from MEDIA_ROOT as before.
+    """
+
+    def __init__(self, blob_directory='blobs', **kwargs):
+        self.blob_directory = blob_directory
+        super().__init__(**kwargs)
+
+    @cached_property
+    def blob_location(self):
+        return os.path.join(self.location, self.blob_directory)
+
+    def _models(self):
+        return apps.get_model('audit', 'StoredBlob'), apps.get_model('audit', 'StoredFile')
+
+    def _blob_path(self, name):
+        StoredBlob, StoredFile = self._models()
+        return StoredFile.objects.filter(name=name).values_list('blob__path', flat=True).first()
+
+    def _resolve(self, name):
+        """Path relative to MEDIA_ROOT: the blob for mapped names, the name itself otherwise."""
+        return self._blob_path(name) or name
+
+    def _save(self, name, content):
+        StoredBlob, StoredFile = self._models()
+        os.makedirs(self.blob_location, exist_ok=True)
+
+        # Hash while spooling into the blob directory so the final move is a rename
+        digest = hashlib.sha256()
+        size = 0
+        fd, temp_path = tempfile.mkstemp(dir=self.blob_location, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as temp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(HASH_CHUNK_SIZE):
+                    digest.update(chunk)
+                    temp.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            blob_path = '/'.join([
+                self.blob_directory, sha256[:2], sha256[2:4], sha256 + os.path.splitext(name)[1].lower()
+            ])
+
+            with transaction.atomic():
+                if not StoredBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1):
+                    try:
+                        with transaction.atomic():
+                            StoredBlob.objects.create(sha256=sha256, size=size, path=blob_path, ref_count=1)
+                    except IntegrityError:
+                        # Another upload of the same content won the race
+                        StoredBlob.objects.filter(sha256=sha256).update(ref_count=F('ref_count') + 1)
+                    else:
+                        full_path = os.path.join(self.location, blob_path)
+                        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                        os.replace(temp_path, full_path)
+                        self._set_permissions(full_path)
+                StoredFile.objects.create(name=name, blob_id=sha256)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return name
+
+    def adopt(self, name):
+        """Move a file written before this backend into blob storage under the same name.
+
+        Returns False when ``name`` is already stored as a blob.
+        """
+        StoredBlob, StoredFile = self._models()
+        if StoredFile.objects.filter(name=name).exists():
+            return False
+        legacy_path = super().path(name)
+        with open(legacy_path, 'rb') as f:
+            self._save(name, File(f, name=name))
+        os.remove(legacy_path)
+        return True
+
+    def remove_orphaned_blobs(self, grace_seconds=ORPHAN_GRACE_SECONDS):
+        """Delete blob files that no StoredBlob row points at; returns their paths.
+
+        They are left behind when the transaction around an upload rolls back
+        after the file was moved into place, or by an upload that crashed
+        mid-write. Files modified within ``grace_seconds`` are kept.
+        """
+        StoredBlob, StoredFile = self._models()
+        cutoff = time.time() - grace_seconds
+        candidates = {}
+        for dirpath, _, filenames in os.walk(self.blob_location):
+            for filename in filenames:
+                full_path = os.path.join(dirpath, filename)
+                if os.path.getmtime(full_path) <= cutoff:
+                    candidates[os.path.relpath(full_path, self.location).replace(os.sep, '/')] = full_path
+
+        paths = sorted(candidates)
+        for start in range(0, len(paths), LOOKUP_CHUNK_SIZE):
+            for path in StoredBlob.objects.filter(path__in=paths[start:start + LOOKUP_CHUNK_SIZE]).values_list('path', flat=True):
+                del candidates[path]
+        removed = []
+        for path, full_path in sorted(candidates.items()):
+            try:
+                # Re-uploaded content replaces the file, which makes it new again
+                if os.path.getmtime(full_path) <= cutoff:
+                    os.remove(full_path)
+                    removed.append(path)
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _set_permissions(self, full_path):
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+
+    def _open(self, name, mode='rb'):
+        return super()._open(self._resolve(name), mode)
+
+    def delete(self, name):
+        if not name:
+            raise ValueError('The name must be given to delete().')
+        StoredBlob, StoredFile = self._models()
+        with transaction.atomic():
+            stored = StoredFile.objects.select_related('blob').filter(name=name).first()
+            if stored is None:
+                return super().delete(name)
+            stored.delete()
+            StoredBlob.objects.filter(pk=stored.blob_id).update(ref_count=F('ref_count') - 1)
+            deleted, _ = StoredBlob.objects.filter(pk=stored.blob_id, ref_count__lte=0).delete()
+            if deleted:
+                transaction.on_commit(lambda: self._remove_blob(stored.blob))
+
+    def _remove_blob(self, blob):
+        StoredBlob, _ = self._models()
+        # The same content may have been uploaded again since the delete
+        if not StoredBlob.objects.filter(pk=blob.pk).exists():
+            super().delete(blob.path)
+
+    def exists(self, name):
+        StoredBlob, StoredFile = self._models()
+        return StoredFile.objects.filter(name=name).exists() or super().exists(name)
+
+    def path(self, name):
+        return super().path(self._resolve(name))
+
+    def size(self, name):
+        StoredBlob, StoredFile = self._models()
+        size = StoredFile.objects.filter(name=name).values_list('blob__size', flat=True).first()
+        return size if size is not None else super().size(name)
+
+    def url(self, name):
+        return super().url(self._resolve(name))
+
+    def urls(self, names):
+        """``{name: url}`` for many names, with one mapping lookup per ``LOOKUP_CHUNK_SIZE`` names."""
+        StoredBlob, StoredFile = self._models()
+        names = sorted({name for name in names if name})
+        paths = {}
+        for start in range(0, len(names), LOOKUP_CHUNK_SIZE):
+            paths.update(StoredFile.objects.filter(name__in=names[start:start + LOOKUP_CHUNK_SIZE]).values_list('name', 'blob__path'))
+        return {name: super(ContentAddressedStorage, self).url(paths.get(name, name)) for name in names}
+
+    def get_accessed_time(self, name):
+        return super().get_accessed_time(self._resolve(name))
+
+    def get_created_time(self, name):
+        return super().get_created_time(self._resolve(name))
+
+    def get_modified_time(self, name):
+        return super().get_modified_time(self._resolve(name))
+
+
+def attach_file_urls(instances, fields):
+    """Set ``file_urls`` on each instance to ``{field: url}`` for its non-empty ``fields``.
+
+    Templates listing many rows read links from ``file_urls`` instead of
+    ``field.url``, which would look each name up separately.
+    """
+    instances = list(instances)
+    urls = content_storage().urls(
+        getattr(instance, field).name for instance in instances for field in fields
+    )
+    for instance in instances:
+        instance.file_urls = {
+            field: urls[getattr(instance, field).name] for field in fields if getattr(instance, field)
+        }
+    return instances
+
+
+def content_storage():
+    """Storage for audit photos and patient documents (referenced by the model fields)."""
+    return _content_storage
+
+
+_content_storage = ContentAddressedStorage(blob_directory=getattr(settings, 'CONTENT_STORAGE_BLOB_DIRECTORY', 'blobs'))
@@ -1,3 +1,413 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import Workbook
+from django.utils import timezone
+
+from . import geo
+from .loadgen import generate
+from .export_jobs import EXPORT_MAX_ATTEMPTS, STALE_JOB_TIMEOUT, claim_next_job, requeue_stale_jobs
+from .imports import import_patient_file
+from .models import AuditLocationFlag, DailyStats, ExportJob, FieldAudit, Hospital, Patient, StoredBlob, StoredFile
+from .management.commands.check_list_projections import heavy_columns, list_pages
+from .management.commands.check_query_plans import full_scans, main_queries
+from .pagination import InvalidCursor, encode_cursor, keyset_paginate
+from .spatial import audits_within, nearest_hospitals
+from .stats import COUNTERS, bucket_totals
+from .storage import ContentAddressedStorage
+from .verification import verify_locations
+
+
+class QueryPlanTests(TestCase):
+    """The main query of each list view and admin changelist is served by an index."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate(2000, hospitals=20, audits=100, prefix='TEST')
+
+    def test_main_queries_avoid_full_scans(self):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                # Test tables are small enough that a seq scan is the cheapest plan;
+                # with seq scans priced out, one is only chosen when no index applies
+                cursor.execute('SET LOCAL enable_seqscan = off')
+            for name, queryset, postgres_only in main_queries():
+                if postgres_only and connection.vendor != 'postgresql':
+                    continue
+                with self.subTest(name):
+                    plan = queryset.explain()
+                    self.assertEqual(full_scans(plan), [], f'{name} scans a whole table:\n{plan}')
+
+
+class ListProjectionTests(TestCase):
+    """List pages never read the heavy columns, in their main query or per row."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate(300, hospitals=5, audits=20, prefix='TEST')
+        cls.user = User.objects.create_superuser('auditor', 'auditor@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_list_pages_skip_heavy_columns(self):
+        columns = heavy_columns()
+        for name, path in list_pages():
+            with self.subTest(name):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                loaded = sorted({
+                    label for query in queries.captured_queries
+                    for label, pattern in columns if pattern.search(query['sql'])
+                })
+                self.assertEqual(loaded, [], f'{name} reads heavy columns')
+
+
+class KeysetPaginationTests(TestCase):
+    def test_wrong_typed_cursor_is_invalid(self):
+        for values in (['x', '1'], [None, 1], [[1], {}], ['2024-01-01', 'x']):
+            with self.subTest(values):
+                with self.assertRaises(InvalidCursor):
+                    keyset_paginate(Patient.objects.all(), ('admission_date', 'id'), encode_cursor(values))
+
+
+class HospitalIdentityTests(TestCase):
+    """Hospital holds the current name and type; each audit keeps the ones recorded at its visit."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate(100, hospitals=1, audits=5, prefix='TEST')
+        cls.user = User.objects.create_superuser('auditor', 'auditor@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.hospital = Hospital.objects.get()
+        self.latest = self.hospital.latest_audit()
+        self.other_type = 'Private' if self.hospital.ehcp_type == 'Public' else 'Public'
+
+    def submit_audit(self, visit_date):
+        return self.client.post(reverse('audit_form'), {
+            'district': self.hospital.district.name,
+            'hospital_id': self.hospital.code,
+            'ehcp_name': 'Renamed Hospital',
+            'ehcp_type': self.other_type,
+            'auditor_name': 'New Auditor',
+            'designation': 'Medical Auditor',
+            'visit_date': visit_date.isoformat(),
+            'visit_time': '10:00',
+            'location': '12.97, 77.59',
+        })
+
+    def test_edit_renames_the_hospital_and_its_latest_audit_only(self):
+        earlier = dict(FieldAudit.objects.exclude(pk=self.latest.pk).values_list('pk', 'ehcp_name'))
+        response = self.client.post(reverse('edit_hospital', args=[self.hospital.code]), {
+            'ehcp_name': 'Renamed Hospital',
+            'ehcp_type': self.other_type,
+            'district': self.hospital.district.name,
+            'auditor_name': 'New Auditor',
+            'designation': 'Medical Auditor',
+            'visit_date': self.latest.visit_date.isoformat(),
+            'visit_time': '10:00',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.hospital.refresh_from_db()
+        self.latest.refresh_from_db()
+        self.assertEqual((self.hospital.name, self.hospital.ehcp_type), ('Renamed Hospital', self.other_type))
+        self.assertEqual((self.latest.ehcp_name, self.latest.auditor_name), ('Renamed Hospital', 'New Auditor'))
+        self.assertEqual(dict(FieldAudit.objects.exclude(pk=self.latest.pk).values_list('pk', 'ehcp_name')), earlier)
+
+    def test_new_audit_updates_the_hospital(self):
+        self.submit_audit(self.latest.visit_date + timedelta(days=1))
+        self.hospital.refresh_from_db()
+        self.assertEqual((self.hospital.name, self.hospital.ehcp_type), ('Renamed Hospital', self.other_type))
+
+    def test_back_dated_audit_leaves_the_hospital(self):
+        name = self.hospital.name
+        self.submit_audit(self.latest.visit_date - timedelta(days=1))
+        self.hospital.refresh_from_db()
+        self.assertEqual(self.hospital.name, name)
+        self.assertTrue(FieldAudit.objects.filter(ehcp_name='Renamed Hospital').exists())
+
+
+class SpatialTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate(20, hospitals=3, audits=5, prefix='TEST')
+
+    def place(self, audit, latitude, longitude):
+        audit.latitude, audit.longitude = round(latitude, 6), round(longitude, 6)
+        audit.save()
+        return audit
+
+    def test_prefix_upper_bound_stays_in_the_alphabet(self):
+        self.assertEqual(geo.prefix_upper_bound('tdr'), 'tds')
+        self.assertEqual(geo.prefix_upper_bound('tdh'), 'tdj')
+        self.assertEqual(geo.prefix_upper_bound('tdz'), 'te')
+        self.assertIsNone(geo.prefix_upper_bound('zz'))
+        self.assertIsNone(geo.prefix_upper_bound(''))
+
+    def test_radius_crosses_a_cell_edge(self):
+        # A point just inside the east edge of its 5-character cell
+        _, _, _, max_lon = geo.bounds(geo.encode(12.97, 77.59, 5))
+        latitude, longitude = 12.97, max_lon - 0.0005
+        inside, across, *far = FieldAudit.objects.order_by('id')
+        self.place(inside, latitude, longitude)
+        self.place(across, latitude, max_lon + 0.0005)
+        for audit in far:
+            self.place(audit, latitude, longitude + 0.1)
+        self.assertNotEqual(inside.geohash[:5], across.geohash[:5])
+
+        found = audits_within(latitude, longitude, 1)
+        self.assertEqual([row['id'] for _, row in found], [inside.id, across.id])
+        self.assertAlmostEqual(found[1][0], 0.108, places=2)
+
+    def test_nearest_hospitals_widen_the_radius_and_rank_by_nearest_audit(self):
+        near, farther, far = Hospital.objects.order_by('code')
+        # (hospital, km north of the point); the second audit of ``near`` is far away
+        placements = [(near, 1), (near, -20), (farther, 5), (far, 30), (far, 30)]
+        for audit, (hospital, km) in zip(FieldAudit.objects.order_by('id'), placements):
+            audit.hospital = hospital
+            self.place(audit, 12.97 + km / geo.KM_PER_DEGREE, 77.59)
+
+        found = nearest_hospitals(12.97, 77.59, limit=2)
+        self.assertEqual([row['hospital_id'] for _, row in found], [near.code, farther.code])
+        self.assertEqual([round(distance, 1) for distance, _ in found], [1.0, 5.0])
+
+
+class ExportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate(20, hospitals=1, audits=2, prefix='TEST')
+        cls.user = User.objects.create_superuser('auditor', 'auditor@example.com', 'password')
+
+    def stall(self, job):
+        ExportJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - STALE_JOB_TIMEOUT * 2)
+
+    def test_job_that_keeps_killing_its_worker_fails(self):
+        job = ExportJob.objects.create(requested_by=self.user, export_type='all_data')
+        for attempt in range(1, EXPORT_MAX_ATTEMPTS + 1):
+            self.assertEqual(claim_next_job().pk, job.pk)
+            # The worker dies without reporting back
+            self.stall(job)
+            requeued, failed = requeue_stale_jobs()
+            self.assertEqual((requeued, failed), (0, 1) if attempt == EXPORT_MAX_ATTEMPTS else (1, 0))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('Failed', EXPORT_MAX_ATTEMPTS))
+        self.assertIsNone(claim_next_job())
+
+    def test_patient_download_queues_a_job(self):
+        self.client.force_login(self.user)
+        hospital = Hospital.objects.get()
+        for _ in range(2):
+            response = self.client.get(reverse('download_patient_data', args=[hospital.code]))
+            self.assertRedirects(response, reverse('hospital_patients', args=[hospital.code]), fetch_redirect_response=False)
+        # A second request reuses the queued job
+        self.assertEqual(
+            list(ExportJob.objects.values_list('export_type', 'hospital_id', 'status')),
+            [('patient_data', hospital.code, 'Pending')],
+        )
+
+
+class ContentStorageTests(TestCase):
+    def setUp(self):
+        self.location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.location)
+        self.storage = ContentAddressedStorage(location=self.location)
+
+    def blob_files(self):
+        return sorted(
+            os.path.relpath(os.path.join(dirpath, filename), self.location)
+            for dirpath, _, filenames in os.walk(self.storage.blob_location) for filename in filenames
+        )
+
+    def test_shared_content_is_counted_and_removed_with_its_last_name(self):
+        first = self.storage.save('case_files/a.pdf', ContentFile(b'same scan'))
+        second = self.storage.save('case_files/b.pdf', ContentFile(b'same scan'))
+        blob = StoredBlob.objects.get()
+        self.assertEqual((blob.ref_count, StoredFile.objects.count()), (2, 2))
+        self.assertEqual(self.blob_files(), [blob.path])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(first)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        with self.storage.open(second) as f:
+            self.assertEqual(f.read(), b'same scan')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.storage.delete(second)
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertEqual(self.blob_files(), [])
+
+    def test_rolled_back_upload_leaves_a_blob_that_the_sweep_removes(self):
+        kept = self.storage.save('case_files/kept.pdf', ContentFile(b'kept'))
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                self.storage.save('case_files/lost.pdf', ContentFile(b'lost'))
+                raise RuntimeError('audit_form failed after saving its files')
+        self.assertEqual(StoredBlob.objects.count(), 1)
+        self.assertEqual(len(self.blob_files()), 2)
+
+        # Within the grace period the file may still belong to an open transaction
+        self.assertEqual(self.storage.remove_orphaned_blobs(), [])
+        removed = self.storage.remove_orphaned_blobs(grace_seconds=0)
+        self.assertEqual(len(removed), 1)
+        self.assertEqual(self.blob_files(), [StoredBlob.objects.get().path])
+        with self.storage.open(kept) as f:
+            self.assertEqual(f.read(), b'kept')
+
+
+class PatientImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate(0, hospitals=1, audits=1, prefix='TEST')
+        cls.audit = FieldAudit.objects.get()
+
+    def xlsx(self, rows):
+        workbook = Workbook()
+        for row in rows:
+            workbook.active.append(row)
+        output = io.BytesIO()
+        workbook.save(output)
+        return SimpleUploadedFile('patients.xlsx', output.getvalue())
+
+    def test_xlsx_date_cells_and_sparse_rows(self):
+        upload = self.xlsx([
+            ['Patient import'],
+            ['Case ID', 'Patient Name', 'Admission Date', 'Discharge Date', 'Package Name', 'Mobile Number'],
+            # Excel stores the dates as serial numbers with a date style; the mobile number as a number
+            ['C-1', 'Lakshmi Rao', date(2024, 2, 29), date(2024, 3, 4), 'Dialysis', 9876543210],
+            # Blank cells are left out of the sheet XML, so later cells carry their column reference
+            ['C-2', 'Ramesh Naik', '15/03/2024', None, 'Cataract surgery'],
+        ])
+        report = import_patient_file(self.audit, upload)
+        self.assertEqual((report.imported, report.errors), (2, []))
+        patients = {patient.case_id: patient for patient in Patient.objects.filter(audit=self.audit)}
+        self.assertEqual(patients['C-1'].admission_date, date(2024, 2, 29))
+        self.assertEqual(patients['C-1'].discharge_date, date(2024, 3, 4))
+        self.assertEqual(patients['C-1'].mobile_number, '9876543210')
+        self.assertEqual((patients['C-2'].admission_date, patients['C-2'].discharge_date), (date(2024, 3, 15), None))
+        self.assertEqual(patients['C-2'].package_name, 'Cataract surgery')
+
+    def test_any_bad_row_rolls_back_the_whole_file(self):
+        upload = SimpleUploadedFile('patients.csv', (
+            '\ufeffCase ID,Patient Name,Admission Date,Package Name\n'
+            'C-1,Lakshmi Rao,2024-02-29,Dialysis\n'
+            'C-2,Ramesh Naik,31/02/2024,Dialysis\n'
+            'C-1,Lakshmi Rao,2024-02-29,Dialysis\n'
+        ).encode('utf-8'))
+        report = import_patient_file(self.audit, upload)
+        self.assertEqual(report.imported, 0)
+        self.assertEqual([row for row, _ in report.errors], [3, 4])
+        self.assertFalse(Patient.objects.filter(audit=self.audit).exists())
+
+
+class DailyStatsTests(TestCase):
+    """Signals keep DailyStats equal to a recount from the source tables."""
+
+    @classmethod
+    def setUpTestData(cls):
+        generate(200, hospitals=2, audits=6, prefix='TEST')
+
+    def rollup(self):
+        return {
+            (row['district_id'], row['date']): {counter: row[counter] for counter in COUNTERS}
+            for row in DailyStats.objects.values('district_id', 'date', *COUNTERS)
+        }
+
+    def recount(self):
+        buckets = bucket_totals(FieldAudit.objects.all(), Patient.objects.all())
+        return {key: dict(totals) for key, totals in buckets.items() if totals['audits']}
+
+    def test_deleting_a_patient_decrements_its_bucket(self):
+        patient = Patient.objects.select_related('audit').order_by('id').first()
+        key = (patient.audit.district_id, patient.audit.visit_date)
+        before = self.rollup()[key]['patients']
+        with self.captureOnCommitCallbacks(execute=True):
+            patient.delete()
+        self.assertEqual(self.rollup()[key]['patients'], before - 1)
+        self.assertEqual(self.rollup(), self.recount())
+
+    def test_moving_an_audit_recounts_both_days(self):
+        audit = FieldAudit.objects.order_by('id').first()
+        old_key = (audit.district_id, audit.visit_date)
+        audit.visit_date = date(2030, 1, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.save()
+        rollup = self.rollup()
+        self.assertEqual(rollup[audit.district_id, date(2030, 1, 1)]['audits'], 1)
+        # The day it left is recounted too (and dropped if it held only this audit)
+        self.assertEqual(rollup, self.recount())
+        self.assertEqual(old_key in rollup, FieldAudit.objects.filter(district_id=old_key[0], visit_date=old_key[1]).exists())
+
+    def test_deleting_an_audit_with_its_patients_empties_its_bucket(self):
+        audit = FieldAudit.objects.order_by('id').first()
+        audit.visit_date = date(2030, 1, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            audit.delete()
+        self.assertNotIn((audit.district_id, date(2030, 1, 1)), self.rollup())
+        self.assertEqual(self.rollup(), self.recount())
+
+
+class LocationVerificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        generate(20, hospitals=2, audits=6, prefix='TEST')
+
+    def setUp(self):
+        # Only the audits a test places take part in the checks
+        FieldAudit.objects.update(latitude=None, longitude=None)
+        self.surveyed, self.unsurveyed = Hospital.objects.order_by('code')
+        Hospital.objects.filter(pk=self.surveyed.pk).update(latitude=12.97, longitude=77.59)
+        Hospital.objects.filter(pk=self.unsurveyed.pk).update(latitude=None, longitude=None)
+
+    def place(self, audit, hospital, auditor, hour, km_north):
+        audit.hospital = hospital
+        audit.auditor_name = auditor
+        audit.visit_date = date(2030, 1, 1)
+        audit.visit_time = f'{hour:02d}:00'
+        audit.latitude = round(12.97 + km_north / geo.KM_PER_DEGREE, 6)
+        audit.longitude = 77.59
+        audit.save()
+        return audit
+
+    def test_off_site_and_impossible_travel_are_flagged(self):
+        on_site, off_site, too_fast, *_ = FieldAudit.objects.order_by('id')
+        self.place(on_site, self.surveyed, 'Asha', 10, 0.5)
+        self.place(off_site, self.surveyed, 'Ravi', 10, 10)
+        # Same auditor (names compared case- and space-insensitively), 300 km in one hour
+        self.place(too_fast, self.unsurveyed, ' asha ', 11, 300)
+
+        self.assertEqual(verify_locations(), (1, 1, 0))
+        flags = {flag.audit_id: flag for flag in AuditLocationFlag.objects.all()}
+        self.assertEqual(set(flags), {off_site.id, too_fast.id})
+        self.assertTrue(flags[off_site.id].off_site)
+        self.assertAlmostEqual(flags[off_site.id].distance_km, 10, places=1)
+        self.assertFalse(flags[too_fast.id].off_site)
+        self.assertTrue(flags[too_fast.id].impossible_travel)
+        self.assertEqual(flags[too_fast.id].previous_audit_id, on_site.id)
+        self.assertAlmostEqual(flags[too_fast.id].speed_kmh, 299.5, places=0)
+
+    def test_plausible_travel_and_fixed_locations_clear_flags(self):
+        first, second, *_ = FieldAudit.objects.order_by('id')
+        self.place(first, self.surveyed, 'Asha', 10, 0)
+        self.place(second, self.unsurveyed, 'Asha', 11, 300)
+        self.assertEqual(verify_locations(), (0, 1, 0))
 
-# Create your tests here.
+        # 300 km over six hours is within MAX_TRAVEL_KMH
+        self.place(second, self.unsurveyed, 'Asha', 16, 300)
+        self.assertEqual(verify_locations(), (0, 0, 1))
+        self.assertFalse(AuditLocationFlag.objects.exists())
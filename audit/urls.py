@@ -6,13 +6,23 @@ urlpatterns = [
     path('home/', views.home, name='home'),
     path('audit/new/', views.audit_form, name='audit_form'),
     path('audit/<int:audit_id>/patient/', views.add_patient, name='add_patient'),
+    path('audit/<int:audit_id>/patients/batch/', views.add_patients_batch, name='add_patients_batch'),
     path('audit/records/', views.view_records, name='view_records'),
+    path('audit/records/page/', views.view_records_page, name='view_records_page'),
     path('audit/report/', views.report, name='report'),
+    path('audit/report/data/', views.report_data, name='report_data'),
     path('audit/download/', views.download_all_data, name='download_all_data'),
+    path('audit/search/', views.search, name='search'),
+    path('audit/geo/nearby/', views.audits_nearby, name='audits_nearby'),
+    path('audit/geo/nearest-hospitals/', views.hospitals_nearest, name='hospitals_nearest'),
+    path('audit/geo/heatmap/', views.audit_heatmap, name='audit_heatmap'),
+    path('audit/geo/district/', views.resolve_district, name='resolve_district'),
     
     # Hospital Records URLs
     path('audit/hospitals/', views.hospital_records, name='hospital_records'),
     path('audit/hospitals/<str:hospital_id>/patients/', views.hospital_patients, name='hospital_patients'),
+    path('audit/hospitals/<str:hospital_id>/patients/page/', views.hospital_patients_page, name='hospital_patients_page'),
+    path('audit/hospitals/<str:hospital_id>/patients/import/', views.import_patients, name='import_patients'),
     path('audit/hospitals/<str:hospital_id>/create/', views.create_hospital, name='create_hospital'),
     path('audit/hospitals/<str:hospital_id>/', views.get_hospital, name='get_hospital'),
     path('audit/hospitals/<str:hospital_id>/edit/', views.edit_hospital, name='edit_hospital'),
@@ -20,6 +30,11 @@ urlpatterns = [
     path('audit/hospital/<str:hospital_id>/patients/download/', views.download_patient_data, name='download_patient_data'),
     path('audit/hospital/<str:hospital_id>/download-excel/', views.download_patient_excel, name='download_patient_excel'),
     
+    # Background export URLs
+    path('audit/exports/<str:export_type>/request/', views.request_export, name='request_export'),
+    path('audit/exports/<int:job_id>/', views.export_job_status, name='export_job_status'),
+    path('audit/exports/<int:job_id>/download/', views.download_export, name='download_export'),
+    
     # Patient CRUD URLs
     path('audit/patient/<int:patient_id>/', views.get_patient, name='get_patient'),
     path('audit/patient/<int:patient_id>/edit/', views.edit_patient, name='edit_patient'),
@@ -35,4 +50,5 @@ urlpatterns = [
     path('admin/user/<int:user_id>/edit/', views.edit_user, name='edit_user'),
     path('admin/user/<int:user_id>/delete/', views.delete_user, name='delete_user'),
     path('admin/statistics/', views.audit_statistics, name='audit_statistics'),
+    path('admin/metrics/', views.request_metrics, name='request_metrics'),
 ]
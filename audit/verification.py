@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .geo import haversine_km
+from .models import AuditLocationFlag, FieldAudit, Hospital
+
+
+# Submissions farther than this from the hospital are off-site (GPS error
+# in a large campus stays well below it)
+OFF_SITE_KM = 2.0
+# Fastest plausible door-to-door travel between two visits
+MAX_TRAVEL_KMH = 100.0
+# Moves shorter than this are GPS noise, whatever the time between them
+MIN_TRAVEL_KM = 5.0
+# Hospitals without surveyed coordinates need this many audits for the
+# median of their audit locations to stand in for them
+MIN_AUDITS_FOR_REFERENCE = 3
+WRITE_BATCH_SIZE = 1000
+
+
+def _load_audits():
+    rows = FieldAudit.objects.filter(latitude__isnull=False, longitude__isnull=False).order_by().values_list(
+        'id', 'auditor_name', 'visit_date', 'visit_time', 'hospital_id',
+        Cast('latitude', FloatField()), Cast('longitude', FloatField()),
+    )
+    audits = pd.DataFrame.from_records(
+        rows.iterator(chunk_size=5000),
+        columns=['id', 'auditor', 'visit_date', 'visit_time', 'hospital', 'latitude', 'longitude'],
+    )
+    audits['visited_at'] = pd.to_datetime(audits['visit_date']) + pd.to_timedelta(audits['visit_time'].astype(str))
+    return audits
+
+
+def _hospital_references(audits):
+    """Reference coordinates per hospital code: surveyed, or the median of its audits."""
+    medians = audits.groupby('hospital')[['latitude', 'longitude']].median()
+    counts = audits.groupby('hospital').size()
+    references = medians[counts >= MIN_AUDITS_FOR_REFERENCE]
+    surveyed = pd.DataFrame.from_records(
+        Hospital.objects.filter(latitude__isnull=False, longitude__isnull=False).values_list(
+            'code', Cast('latitude', FloatField()), Cast('longitude', FloatField())
+        ),
+        columns=['hospital', 'latitude', 'longitude'],
+    ).set_index('hospital')
+    if surveyed.empty:
+        return references
+    return pd.concat([references[~references.index.isin(surveyed.index)], surveyed])
+
+
+def check_locations():
+    """Distance and travel checks for every audit with coordinates.
+
+    Returns a DataFrame with one row per flagged audit. All distances and
+    speeds are computed as whole-array NumPy operations: audits are sorted
+    once by (auditor, visit time) and each one is compared with the row
+    before it.
+    """
+    audits = _load_audits()
+    if audits.empty:
+        return audits
+
+    references = _hospital_references(audits)
+    reference = references.reindex(audits['hospital'])
+    distance = haversine_km(
+        audits['latitude'].to_numpy(), audits['longitude'].to_numpy(),
+        reference['latitude'].to_numpy(), reference['longitude'].to_numpy(),
+    )
+    # Hospitals without a reference location cannot be checked
+    off_site = np.nan_to_num(distance, nan=0.0) > OFF_SITE_KM
+
+    auditor_codes, _ = pd.factorize(audits['auditor'].str.strip().str.upper())
+    visited_at = audits['visited_at'].to_numpy().astype('datetime64[s]').astype(np.int64)
+    ids = audits['id'].to_numpy()
+    order = np.lexsort((ids, visited_at, auditor_codes))
+    lat, lon = audits['latitude'].to_numpy()[order], audits['longitude'].to_numpy()[order]
+
+    # Row i is compared with row i - 1 of the same auditor
+    same_auditor = auditor_codes[order][1:] == auditor_codes[order][:-1]
+    travel_km = haversine_km(lat[:-1], lon[:-1], lat[1:], lon[1:])
+    travel_hours = np.diff(visited_at[order]) / 3600
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = np.where(travel_hours > 0, travel_km / travel_hours, np.inf)
+    impossible = same_auditor & (travel_km > MIN_TRAVEL_KM) & (speed > MAX_TRAVEL_KMH)
+
+    results = pd.DataFrame({
+        'audit_id': ids,
+        'off_site': off_site,
+        'distance_km': distance,
+        'impossible_travel': False,
+        'previous_audit_id': pd.array([None] * len(ids), dtype='Int64'),
+        'travel_km': np.nan,
+        'travel_hours': np.nan,
+        'speed_kmh': np.nan,
+    })
+    later = order[1:][impossible]
+    results.loc[later, 'impossible_travel'] = True
+    results.loc[later, 'previous_audit_id'] = ids[order[:-1][impossible]]
+    results.loc[later, 'travel_km'] = travel_km[impossible]
+    results.loc[later, 'travel_hours'] = travel_hours[impossible]
+    results.loc[later, 'speed_kmh'] = np.where(np.isfinite(speed[impossible]), speed[impossible], np.nan)
+    return results[results['off_site'] | results['impossible_travel']]
+
+
+def _value(value):
+    return None if pd.isna(value) else value
+
+
+def verify_locations():
+    """Run the checks and store their flags.
+
+    Returns ``(off_site, impossible_travel, cleared)`` counts, where
+    ``cleared`` is the number of earlier flags that no longer apply.
+    """
+    run_started = timezone.now()
+    flagged = check_locations()
+    fields = ['off_site', 'distance_km', 'impossible_travel', 'previous_audit_id', 'travel_km', 'travel_hours', 'speed_kmh']
+    flags = [
+        AuditLocationFlag(
+            audit_id=int(row['audit_id']), last_seen=run_started,
+            **{field: _value(row[field]) for field in fields},
+        )
+        for row in flagged.to_dict('records')
+    ]
+    AuditLocationFlag.objects.bulk_create(
+        flags,
+        batch_size=WRITE_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['audit'],
+        update_fields=[field.removesuffix('_id') for field in fields] + ['last_seen'],
+    )
+    # Only after a complete run, so an interrupted one clears nothing
+    cleared, _ = AuditLocationFlag.objects.filter(last_seen__lt=run_started).delete()
+    return sum(flag.off_site for flag in flags), sum(flag.impossible_travel for flag in flags), cleared
@@ -1,26 +1,55 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.core.files.storage import default_storage
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponseBadRequest, StreamingHttpResponse, FileResponse
 from django.contrib.auth.models import User
-from django.db.models import Count, Sum, Q
+from django.db.models import F
 from django.views.generic import ListView
 from django.contrib import messages
-from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_http_methods
 from django.contrib.auth.mixins import LoginRequiredMixin
-from .models import FieldAudit, District, Patient
+from .models import FieldAudit, District, Hospital, Patient, ExportJob
+from .http import (
+    FastJsonResponse, hospital_etag, hospital_last_modified, patient_etag, patient_last_modified
+)
+from .imports import (
+    BATCH_FILE_FIELDS, MAX_BATCH_PATIENTS, ImportFileError, add_patient_batch, import_patient_file
+)
+from .analytics import PATIENT_DIMENSIONS, AnalyticsError, get_cube, parse_month
+from .pagination import InvalidCursor, keyset_paginate
+from .gazetteer import resolve_district_name
+from .instrumentation import histogram
+from .search import search_hospitals, search_patient_ids
+from .spatial import HEATMAP_PRECISIONS, MAX_RADIUS_KM, audits_within, heatmap, nearest_hospitals
+from .projections import AUDIT_PREFILL_FIELDS
+from .stats import StatsSnapshot
+from .storage import attach_file_urls
+from .images import InvalidImage, process_images, save_renditions, signature_from_data_url
+from .exports import XLSX_CONTENT_TYPE, all_data_filename, stream_all_data_xlsx
 from django.utils import timezone
-from datetime import datetime, timedelta
-from django.db.models import Count, Sum
-from django.db.models.functions import TruncMonth
-import pandas as pd
-from django.http import HttpResponse
-from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.utils import get_column_letter
+from datetime import date, datetime, timedelta
+from django.db import IntegrityError, transaction
+import json
+import os
 from django.urls import reverse
+from django.template.loader import render_to_string
 
 
+# Row errors listed after a failed import; messages live in a cookie or the session
+IMPORT_ERRORS_SHOWN = 20
+
+# File links shown per row of includes/patient_rows.html
+PATIENT_FILE_FIELDS = ('patient_photo', 'case_file', 'discharge_summary', 'bills_documents')
+
+# Most audits audits_nearby lists
+NEARBY_AUDITS_LIMIT = 200
+
+# Orderings of the hospital_records table by its ``sort`` parameter
+HOSPITAL_SORTS = {
+    'name': ('name',),
+    'risk': (F('risk_score__score').desc(nulls_last=True), 'name'),
+}
+
 def is_admin(user):
     return user.is_superuser
 
@@ -29,27 +58,23 @@ def home(request):
     try:
         # Get audit statistics with error handling
         try:
-            total_audits = FieldAudit.objects.count()
-            recent_audits = FieldAudit.objects.order_by('-visit_date')[:5]
+            recent_audits = list(FieldAudit.objects.for_summary().order_by('-visit_date')[:5])
         except Exception as audit_error:
             print(f'Error fetching audit data: {str(audit_error)}')
-            total_audits = 0
             recent_audits = []
             messages.error(request, 'Unable to fetch audit data. Please try refreshing the page.')
 
-        # Get patient statistics with error handling
+        # Get audit and patient statistics from the daily rollup
         try:
-            documentation_complete = Patient.objects.filter(missing_records=False).count()
-            missing_records = Patient.objects.filter(missing_records=True).count()
-            compliance_issues = Patient.objects.filter(Q(money_collection=True) | Q(missing_records=True)).count()
-            process_gaps = Patient.objects.filter(Q(money_collection=True) | Q(missing_records=True)).count()
-            best_practices = Patient.objects.filter(
-                Q(missing_records=False) & 
-                Q(money_collection=False) 
-            ).count()
-        except Exception as patient_error:
-            print(f'Error fetching patient statistics: {str(patient_error)}')
-            documentation_complete = missing_records = compliance_issues = process_gaps = best_practices = 0
+            totals = StatsSnapshot().totals
+            total_audits = totals['audits']
+            documentation_complete = totals['patients_documented']
+            missing_records = totals['patients_missing_records']
+            compliance_issues = process_gaps = totals['patients_flagged']
+            best_practices = totals['patients_compliant']
+        except Exception as stats_error:
+            print(f'Error fetching statistics: {str(stats_error)}')
+            total_audits = documentation_complete = missing_records = compliance_issues = process_gaps = best_practices = 0
             messages.error(request, 'Unable to fetch patient statistics. Please try refreshing the page.')
 
         context = {
@@ -77,6 +102,21 @@ def home(request):
         }
         return render(request, 'audit/home.html', context)
 
+def _record_current_identity(hospital, data):
+    """Take the submitted name and type as the hospital's current ones, unless the visit is back-dated.
+
+    Audits keep the name and type as recorded at their visit, so only the
+    hospital row changes; earlier audits are left as they were.
+    """
+    name, ehcp_type = data.get('ehcp_name'), data.get('ehcp_type')
+    if (hospital.name, hospital.ehcp_type) == (name, ehcp_type):
+        return
+    latest = hospital.latest_audit('visit_date')
+    if latest and FieldAudit._meta.get_field('visit_date').to_python(data.get('visit_date')) < latest.visit_date:
+        return
+    hospital.name, hospital.ehcp_type = name, ehcp_type
+    hospital.save(update_fields=['name', 'ehcp_type', 'updated_at'])
+
 @login_required
 def audit_form(request):
     if request.method == 'POST':
@@ -96,54 +136,74 @@ def audit_form(request):
                 messages.error(request, 'Selected district does not exist.')
                 return redirect('audit_form')
             
-            # Create audit record with new fields
-            audit = FieldAudit.objects.create(
-                district=district,
-                hospital_id=request.POST.get('hospital_id'),
-                ehcp_name=request.POST.get('ehcp_name'),
-                ehcp_type=request.POST.get('ehcp_type'),
-                auditor_name=request.POST.get('auditor_name'),
-                designation=request.POST.get('designation'),
-                current_location=request.POST.get('location'),
-                latitude=request.POST.get('latitude'),
-                longitude=request.POST.get('longitude'),
-                visit_date=request.POST.get('visit_date'),
-                visit_time=request.POST.get('visit_time'),
-                ekgp_patients=request.POST.get('kasp_hospital_record', 0),
-                pmjay_patients=request.POST.get('kasp_tms_record', 0),
-                beneficiaries=request.POST.get('beneficiaries_visited', 0),
+            # Process the photos and signature up front so a bad upload fails before anything is saved
+            uploaded_photos = request.FILES.getlist('audit_photos')
+            try:
+                photo_renditions = process_images([photo.read() for photo in uploaded_photos])
+                signature_file = signature_from_data_url(request.POST.get('signature_data'))
+            except InvalidImage as e:
+                messages.error(request, f'Could not process upload: {str(e)}')
+                return redirect('audit_form')
+
+            with transaction.atomic():
+                # Look the hospital up by its unique code, registering it on first visit
+                hospital, created = Hospital.objects.get_or_create(
+                    code=request.POST.get('hospital_id'),
+                    defaults={
+                        'name': request.POST.get('ehcp_name'),
+                        'ehcp_type': request.POST.get('ehcp_type'),
+                        'district': district,
+                    }
+                )
+                if not created:
+                    _record_current_identity(hospital, request.POST)
+
+                # Create audit record with new fields
+                audit = FieldAudit.objects.create(
+                    district=district,
+                    hospital=hospital,
+                    ehcp_name=request.POST.get('ehcp_name'),
+                    ehcp_type=request.POST.get('ehcp_type'),
+                    auditor_name=request.POST.get('auditor_name'),
+                    designation=request.POST.get('designation'),
+                    current_location=request.POST.get('location'),
+                    latitude=request.POST.get('latitude'),
+                    longitude=request.POST.get('longitude'),
+                    visit_date=request.POST.get('visit_date'),
+                    visit_time=request.POST.get('visit_time'),
+                    ekgp_patients=request.POST.get('kasp_hospital_record', 0),
+                    pmjay_patients=request.POST.get('kasp_tms_record', 0),
+                    beneficiaries=request.POST.get('beneficiaries_visited', 0),
                 
-                # Findings fields
-                findings_type=request.POST.get('findings_type'),
-                audit_findings_value=request.POST.get('audit_findings_value'),
-                finding_type=request.POST.get('finding_type'),
-                abuse_type=request.POST.get('abuse_type'),
-                oope_type=request.POST.get('oope_type'),
+                    # Findings fields
+                    findings_type=request.POST.get('findings_type'),
+                    audit_findings_value=request.POST.get('audit_findings_value'),
+                    finding_type=request.POST.get('finding_type'),
+                    abuse_type=request.POST.get('abuse_type'),
+                    oope_type=request.POST.get('oope_type'),
                 
-                # HNQA fields
-                hnqa_value=request.POST.get('hnqa_value'),
-                hnqa_type=request.POST.get('hnqa_type'),
-                infrastructure_type=request.POST.get('infrastructure_type'),
-                hr_type=request.POST.get('hr_type'),
-                services_type=request.POST.get('services_type'),
+                    # HNQA fields
+                    hnqa_value=request.POST.get('hnqa_value'),
+                    hnqa_type=request.POST.get('hnqa_type'),
+                    infrastructure_type=request.POST.get('infrastructure_type'),
+                    hr_type=request.POST.get('hr_type'),
+                    services_type=request.POST.get('services_type'),
                 
-                # Fraudulent activities fields
-                fraudulent_value=request.POST.get('fraudulent_value'),
-                fraudulent_type=request.POST.get('fraudulent_type'),
+                    # Fraudulent activities fields
+                    fraudulent_value=request.POST.get('fraudulent_value'),
+                    fraudulent_type=request.POST.get('fraudulent_type'),
                 
-                observations=request.POST.get('audit_observation', ''),
-                signature=request.POST.get('signature_data'),
-            )
+                    observations=request.POST.get('audit_observation', ''),
+                    signature_file=signature_file,
+                )
             
-            # Handle photo uploads
-            if request.FILES.getlist('audit_photos'):
-                photo_paths = []
-                for photo in request.FILES.getlist('audit_photos'):
-                    file_path = f'audit_photos/{audit.id}/{photo.name}'
-                    default_storage.save(file_path, photo)
-                    photo_paths.append(file_path)
-                audit.photos = photo_paths
-                audit.save()
+            # Store the photo renditions and record them with a single-column update
+            if uploaded_photos:
+                audit.photos = [
+                    save_renditions(f'audit_photos/{audit.id}', photo.name, renditions)
+                    for photo, renditions in zip(uploaded_photos, photo_renditions)
+                ]
+                FieldAudit.objects.filter(pk=audit.pk).update(photos=audit.photos)
             
             messages.success(request, 'Audit record created successfully. Please add patient details.')
             return redirect('add_patient', audit_id=audit.id)
@@ -234,6 +294,51 @@ def add_patient(request, audit_id):
     }
     return render(request, 'audit/patient_form.html', context)
 
+@login_required
+@require_http_methods(["POST"])
+def add_patients_batch(request, audit_id):
+    audit = get_object_or_404(FieldAudit.objects.only('id', 'district', 'visit_date'), id=audit_id)
+
+    # The patients come as a JSON list in the "patients" field; the files of
+    # the i-th patient are sent as case_file-<i>, discharge_summary-<i>, ...
+    try:
+        items = json.loads(request.POST.get('patients', ''))
+    except ValueError:
+        return JsonResponse({'error': 'patients must be a JSON list.'}, status=400)
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        return JsonResponse({'error': 'patients must be a JSON list.'}, status=400)
+    if not 0 < len(items) <= MAX_BATCH_PATIENTS:
+        return JsonResponse({'error': f'Send between 1 and {MAX_BATCH_PATIENTS} patients.'}, status=400)
+
+    keys = [str(item.get('key') or '') for item in items]
+    if not all(0 < len(key) <= 64 for key in keys) or len(set(keys)) != len(keys):
+        return JsonResponse({'error': 'Every patient needs a unique key of at most 64 characters.'}, status=400)
+
+    entries = [
+        {
+            'key': key,
+            'values': item,
+            'files': {
+                field: request.FILES[f'{field}-{index}']
+                for field in BATCH_FILE_FIELDS if f'{field}-{index}' in request.FILES
+            },
+        }
+        for index, (key, item) in enumerate(zip(keys, items))
+    ]
+    try:
+        results = add_patient_batch(audit, entries)
+    except IntegrityError:
+        # A concurrent submission stored the same key or case ID first; retrying is safe
+        return JsonResponse({'error': 'These patients are being saved by another request. Please retry.'}, status=409)
+    except Exception as e:
+        print(f'Error in add_patients_batch: {str(e)}')
+        return JsonResponse({'error': 'An error occurred while saving the patients.'}, status=500)
+
+    return FastJsonResponse({
+        'results': results,
+        'created': sum(result['status'] == 'created' for result in results),
+    })
+
 class AuditListView(LoginRequiredMixin, ListView):
     model = FieldAudit
     template_name = 'audit/audit_list.html'
@@ -322,10 +427,8 @@ def edit_patient(request, patient_id):
             
     return render(request, 'audit/patient_form.html', {'patient': patient, 'is_edit': True})
 
-@login_required
-def view_records(request):
-    audits = FieldAudit.objects.select_related('district').all().order_by('-visit_date')
-    districts = District.objects.all()
+def _filtered_audits(request):
+    audits = FieldAudit.objects.for_list()
     
     # Filter by hospital name
     ehcp_name = request.GET.get('ehcp_name')
@@ -347,251 +450,141 @@ def view_records(request):
     if visit_date:
         audits = audits.filter(visit_date=visit_date)
     
+    return audits
+
+def _next_page_url(request, url, next_cursor):
+    if not next_cursor:
+        return None
+    params = request.GET.copy()
+    params['cursor'] = next_cursor
+    return f'{url}?{params.urlencode()}'
+
+@login_required
+def view_records(request):
+    try:
+        audits, next_cursor = keyset_paginate(_filtered_audits(request), ('visit_date', 'id'), request.GET.get('cursor'))
+    except InvalidCursor:
+        messages.error(request, 'Invalid page link.')
+        return redirect('view_records')
+    districts = District.objects.all()
+    
     context = {
         'audits': audits,
         'districts': districts,
+        'next_page_url': _next_page_url(request, reverse('view_records_page'), next_cursor),
         'download_link': request.build_absolute_uri(reverse('download_all_data'))
     }
     
     return render(request, 'audit/view_records.html', context)
 
 @login_required
-def download_all_data(request):
+def view_records_page(request):
     try:
-        # Query data with error handling
-        try:
-            audits = FieldAudit.objects.select_related('district').prefetch_related('patients').all().order_by('-visit_date')
-            if not audits.exists():
-                messages.warning(request, 'No audit data available to download.')
-                return redirect('view_records')
-        except Exception as db_error:
-            messages.error(request, 'Failed to retrieve audit data. Please try again later.')
-            print(f'Database error in download_all_data: {str(db_error)}')
-            return redirect('view_records')
-
-        all_data = []
-        try:
-            for audit in audits:
-                audit_data = {
-                    'Hospital ID': audit.hospital_id,
-                    'Hospital Name': audit.ehcp_name,
-                    'District': audit.district.name if audit.district else 'N/A',
-                    'Hospital Type': audit.ehcp_type,
-                    'Visit Date': audit.visit_date.strftime('%Y-%m-%d') if audit.visit_date else 'N/A',
-                    'Visit Time': audit.visit_time.strftime('%H:%M:%S') if audit.visit_time else 'N/A',
-                    'Auditor Name': audit.auditor_name,
-                    'Designation': audit.designation,
-                    'Location': audit.current_location,
-                    'EKGP Patients': audit.ekgp_patients or 0,
-                    'PMJAY Patients': audit.pmjay_patients or 0,
-                    'Total Beneficiaries': audit.beneficiaries or 0,
-                    'Findings Type': audit.findings_type or 'N/A',
-                    'Audit Findings Value': audit.audit_findings_value or 'N/A',
-                    'Finding Type': audit.finding_type or 'N/A',
-                    'Abuse Type': audit.abuse_type or 'N/A',
-                    'OOPE Type': audit.oope_type or 'N/A',
-                    'HNQA Value': audit.hnqa_value or 'N/A',
-                    'HNQA Type': audit.hnqa_type or 'N/A',
-                    'Infrastructure Type': audit.infrastructure_type or 'N/A',
-                    'HR Type': audit.hr_type or 'N/A',
-                    'Services Type': audit.services_type or 'N/A',
-                    'Fraudulent Value': audit.fraudulent_value or 'N/A',
-                    'Fraudulent Type': audit.fraudulent_type or 'N/A',
-                    'Observations': audit.observations or ''
-                }
-                patients = audit.patients.all()
-                for patient in patients:
-                    try:
-                        patient_data = {
-                            'Case ID': patient.case_id,
-                            'Patient Name': patient.patient_name,
-                            'Mobile Number': patient.mobile_number or 'N/A',
-                            'Admission Date': patient.admission_date.strftime('%Y-%m-%d') if patient.admission_date else 'N/A',
-                            'Discharge Date': patient.discharge_date.strftime('%Y-%m-%d') if patient.discharge_date else 'N/A',
-                            'Package Name': patient.package_name,
-                            'Package Code': patient.package_code or 'N/A',
-                            'Mandatory Records': 'Yes' if patient.missing_records else 'No',
-                            'Money Collection': 'Yes' if patient.money_collection else 'No',
-                            'Case Summary': patient.case_summary or '',
-                            'Deviations': ', '.join(patient.deviations) if patient.deviations else 'None',
-                            'Total OOPE': patient.total_oope or 0,
-                            'Patient Photo': patient.patient_photo.url if patient.patient_photo else 'No Photo',
-                            'Case File': patient.case_file.url if patient.case_file else 'No File',
-                            'Discharge Summary': patient.discharge_summary.url if patient.discharge_summary else 'No Summary',
-                            'Bills & Documents': patient.bills_documents.url if patient.bills_documents else 'No Documents'
-                        }
-                        all_data.append({**audit_data, **patient_data})
-                    except Exception as patient_error:
-                        print(f'Error processing patient {patient.id}: {str(patient_error)}')
-                        continue
-
-            # Generate Excel file
-            try:
-                df = pd.DataFrame(all_data)
-                response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-                response['Content-Disposition'] = f'attachment; filename="audit_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-                with pd.ExcelWriter(response, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='All Data')
-                return response
-            except Exception as excel_error:
-                messages.error(request, 'Failed to generate Excel file. Please try again.')
-                print(f'Excel generation error: {str(excel_error)}')
-                return redirect('view_records')
-
-        except Exception as processing_error:
-            messages.error(request, 'An error occurred while processing the data.')
-            print(f'Data processing error: {str(processing_error)}')
-            return redirect('view_records')
-
-    except Exception as e:
-        messages.error(request, 'An unexpected error occurred. Please try again or contact support.')
-        print(f'Unexpected error in download_all_data: {str(e)}')
-        return redirect('view_records')
+        audits, next_cursor = keyset_paginate(_filtered_audits(request), ('visit_date', 'id'), request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'html': render_to_string('audit/includes/record_rows.html', {'audits': audits}, request=request),
+        'next_url': _next_page_url(request, reverse('view_records_page'), next_cursor)
+    })
 
 @login_required
 def download_all_data(request):
     try:
-        # Query data with error handling
-        try:
-            audits = FieldAudit.objects.select_related('district').prefetch_related('patients').all().order_by('-visit_date')
-            if not audits.exists():
-                messages.warning(request, 'No audit data available to download.')
-                return redirect('view_records')
-        except Exception as db_error:
-            messages.error(request, 'Failed to retrieve audit data. Please try again later.')
-            print(f'Database error in download_all_data: {str(db_error)}')
+        if not FieldAudit.objects.exists():
+            messages.warning(request, 'No audit data available to download.')
             return redirect('view_records')
-
-        all_data = []
-        try:
-            for audit in audits:
-                audit_data = {
-                    'Hospital ID': audit.hospital_id,
-                    'Hospital Name': audit.ehcp_name,
-                    'District': audit.district.name if audit.district else 'N/A',
-                    'Hospital Type': audit.ehcp_type,
-                    'Visit Date': audit.visit_date.strftime('%Y-%m-%d') if audit.visit_date else 'N/A',
-                    'Visit Time': audit.visit_time.strftime('%H:%M:%S') if audit.visit_time else 'N/A',
-                    'Auditor Name': audit.auditor_name,
-                    'Designation': audit.designation,
-                    'Location': audit.current_location,
-                    'EKGP Patients': audit.ekgp_patients or 0,
-                    'PMJAY Patients': audit.pmjay_patients or 0,
-                    'Total Beneficiaries': audit.beneficiaries or 0,
-                    'Findings Type': audit.findings_type or 'N/A',
-                    'Audit Findings Value': audit.audit_findings_value or 'N/A',
-                    'Finding Type': audit.finding_type or 'N/A',
-                    'Abuse Type': audit.abuse_type or 'N/A',
-                    'OOPE Type': audit.oope_type or 'N/A',
-                    'HNQA Value': audit.hnqa_value or 'N/A',
-                    'HNQA Type': audit.hnqa_type or 'N/A',
-                    'Infrastructure Type': audit.infrastructure_type or 'N/A',
-                    'HR Type': audit.hr_type or 'N/A',
-                    'Services Type': audit.services_type or 'N/A',
-                    'Fraudulent Value': audit.fraudulent_value or 'N/A',
-                    'Fraudulent Type': audit.fraudulent_type or 'N/A',
-                    'Observations': audit.observations or ''
-                }
-                patients = audit.patients.all()
-                for patient in patients:
-                    try:
-                        patient_data = {
-                            'Case ID': patient.case_id,
-                            'Patient Name': patient.patient_name,
-                            'Mobile Number': patient.mobile_number or 'N/A',
-                            'Admission Date': patient.admission_date.strftime('%Y-%m-%d') if patient.admission_date else 'N/A',
-                            'Discharge Date': patient.discharge_date.strftime('%Y-%m-%d') if patient.discharge_date else 'N/A',
-                            'Package Name': patient.package_name,
-                            'Package Code': patient.package_code or 'N/A',
-                            'Mandatory Records': 'Yes' if patient.missing_records else 'No',
-                            'Money Collection': 'Yes' if patient.money_collection else 'No',
-                            'Case Summary': patient.case_summary or '',
-                            'Deviations': ', '.join(patient.deviations) if patient.deviations else 'None',
-                            'Total OOPE': patient.total_oope or 0,
-                            'Patient Photo': patient.patient_photo.url if patient.patient_photo else 'No Photo',
-                            'Case File': patient.case_file.url if patient.case_file else 'No File',
-                            'Discharge Summary': patient.discharge_summary.url if patient.discharge_summary else 'No Summary',
-                            'Bills & Documents': patient.bills_documents.url if patient.bills_documents else 'No Documents'
-                        }
-                        all_data.append({**audit_data, **patient_data})
-                    except Exception as patient_error:
-                        print(f'Error processing patient {patient.id}: {str(patient_error)}')
-                        continue
-
-            # Generate Excel file
-            try:
-                df = pd.DataFrame(all_data)
-                response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-                response['Content-Disposition'] = f'attachment; filename="audit_data_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx"'
-                with pd.ExcelWriter(response, engine='openpyxl') as writer:
-                    df.to_excel(writer, index=False, sheet_name='All Data')
-                return response
-            except Exception as excel_error:
-                messages.error(request, 'Failed to generate Excel file. Please try again.')
-                print(f'Excel generation error: {str(excel_error)}')
-                return redirect('view_records')
-
-        except Exception as processing_error:
-            messages.error(request, 'An error occurred while processing the data.')
-            print(f'Data processing error: {str(processing_error)}')
-            return redirect('view_records')
-
-    except Exception as e:
-        messages.error(request, 'An unexpected error occurred. Please try again or contact support.')
-        print(f'Unexpected error in download_all_data: {str(e)}')
+    except Exception as db_error:
+        messages.error(request, 'Failed to retrieve audit data. Please try again later.')
+        print(f'Database error in download_all_data: {str(db_error)}')
         return redirect('view_records')
 
+    # Rows are read in chunks and written straight into the response, so the
+    # workbook is never held in memory and the download starts immediately.
+    response = StreamingHttpResponse(stream_all_data_xlsx(), content_type=XLSX_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{all_data_filename()}"'
+    return response
+
 @login_required
 def report(request):
-    # Get overall statistics
-    total_audits = FieldAudit.objects.count()
-    total_districts = District.objects.count()
-    total_patients = Patient.objects.count()
+    stats = StatsSnapshot()
     
     # Get district-wise audit counts
-    district_stats = District.objects.annotate(
-        audit_count=Count('fieldaudit'),
-        total_patients=Sum('fieldaudit__beneficiaries')
-    )
+    district_stats = [
+        {'name': district['name'], 'audit_count': district['audits'], 'total_patients': district['beneficiaries']}
+        for district in stats.districts
+    ]
     
     # Get monthly audit counts
     current_year = timezone.now().year
-    monthly_stats = FieldAudit.objects.filter(
-        visit_date__year=current_year
-    ).values('visit_date__month').annotate(
-        audit_count=Count('id')
-    ).order_by('visit_date__month')
+    monthly_stats = [
+        {'visit_date__month': month.month, 'audit_count': counters['audits']}
+        for month, counters in stats.months(since=date(current_year, 1, 1))
+        if month.year == current_year
+    ]
     
     context = {
-        'total_audits': total_audits,
-        'total_districts': total_districts,
-        'total_patients': total_patients,
+        'total_audits': stats.totals['audits'],
+        'total_districts': stats.total_districts,
+        'total_patients': stats.totals['patients'],
         'district_stats': district_stats,
         'monthly_stats': monthly_stats,
     }
     
     return render(request, 'audit/report.html', context)
 
+@login_required
+def report_data(request):
+    """Drill-down data for the report charts, pivoted from the analytics cube."""
+    try:
+        filters = {
+            dimension: request.GET.getlist(dimension)
+            for dimension in PATIENT_DIMENSIONS if dimension in request.GET
+        }
+        cube, version = get_cube()
+        data = cube.pivot(
+            request.GET.get('measure', 'audits'),
+            request.GET.get('rows', 'district'),
+            columns=request.GET.get('columns') or None,
+            filters=filters,
+            since=parse_month(request.GET.get('since')),
+            until=parse_month(request.GET.get('until')),
+        )
+    except AnalyticsError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    data['version'] = list(version)
+    return FastJsonResponse(data)
+
 @login_required
 def hospital_records(request):
-    # Get all unique hospitals from audits
-    hospitals = FieldAudit.objects.values('hospital_id', 'ehcp_name', 'district__name').distinct()
+    sort = request.GET.get('sort') if request.GET.get('sort') in HOSPITAL_SORTS else 'name'
+    hospitals = Hospital.objects.select_related('district', 'risk_score').order_by(*HOSPITAL_SORTS[sort])
     
     context = {
         'hospitals': hospitals,
+        'sort': sort,
     }
     return render(request, 'audit/hospital_records.html', context)
 
+def _hospital_patients_page(request, hospital_id):
+    patients = Patient.objects.for_table().filter(audit__hospital_id=hospital_id)
+    patients, next_cursor = keyset_paginate(patients, ('admission_date', 'id'), request.GET.get('cursor'))
+    return attach_file_urls(patients, PATIENT_FILE_FIELDS), next_cursor
+
 @login_required
 def hospital_patients(request, hospital_id):
     # Get the hospital details
-    try:
-        hospital = FieldAudit.objects.filter(hospital_id=hospital_id).latest('visit_date')
-    except FieldAudit.DoesNotExist:
-        hospital = None
+    hospital = Hospital.objects.select_related('district').filter(code=hospital_id).first()
     
     if request.method == 'POST':
         try:
+            # New patients are recorded against the hospital's most recent audit
+            audit = hospital.latest_audit('id') if hospital else None
+            if audit is None:
+                messages.error(request, 'No audit found for this hospital.')
+                return redirect('hospital_patients', hospital_id=hospital_id)
+
             # Get selected deviations
             deviations = []
             if request.POST.get('money_collection') == 'on':
@@ -603,7 +596,7 @@ def hospital_patients(request, hospital_id):
 
             # Create new patient
             patient = Patient.objects.create(
-                audit=hospital,
+                audit=audit,
                 case_id=request.POST.get('case_id'),
                 patient_name=request.POST.get('patient_name'),
                 mobile_number=request.POST.get('mobile_number', ''),
@@ -628,10 +621,12 @@ def hospital_patients(request, hospital_id):
         except Exception as e:
             messages.error(request, f'Error adding patient: {str(e)}')
     
-    # Get all patients for this hospital
-    patients = Patient.objects.filter(
-        audit__hospital_id=hospital_id
-    ).select_related('audit').order_by('-admission_date')
+    # Get the first page of patients for this hospital
+    try:
+        patients, next_cursor = _hospital_patients_page(request, hospital_id)
+    except InvalidCursor:
+        messages.error(request, 'Invalid page link.')
+        return redirect('hospital_patients', hospital_id=hospital_id)
     
     # Get all districts for hospital creation form
     districts = District.objects.all()
@@ -640,17 +635,198 @@ def hospital_patients(request, hospital_id):
         'hospital': hospital,
         'patients': patients,
         'hospital_id': hospital_id,
-        'districts': districts
+        'districts': districts,
+        'next_page_url': _next_page_url(request, reverse('hospital_patients_page', args=[hospital_id]), next_cursor)
     }
     return render(request, 'audit/hospital_patients.html', context)
 
 @login_required
+@require_http_methods(["POST"])
+def import_patients(request, hospital_id):
+    hospital = get_object_or_404(Hospital, code=hospital_id)
+    # Imported patients are recorded against the hospital's most recent audit
+    audit = hospital.latest_audit('id', 'district', 'visit_date')
+    if audit is None:
+        messages.error(request, 'No audit found for this hospital.')
+        return redirect('hospital_patients', hospital_id=hospital_id)
+
+    upload = request.FILES.get('patient_file')
+    if not upload:
+        messages.error(request, 'Please choose an Excel or CSV file to import.')
+        return redirect('hospital_patients', hospital_id=hospital_id)
+
+    try:
+        report = import_patient_file(audit, upload)
+    except ImportFileError as e:
+        messages.error(request, str(e))
+        return redirect('hospital_patients', hospital_id=hospital_id)
+    except Exception as e:
+        print(f'Error in import_patients: {str(e)}')
+        messages.error(request, 'An error occurred while importing patients. Please try again.')
+        return redirect('hospital_patients', hospital_id=hospital_id)
+
+    if report.error_count:
+        messages.error(request, f'No patients were imported: {report.error_count} row(s) need fixing.')
+        for row_number, error in report.errors[:IMPORT_ERRORS_SHOWN]:
+            messages.warning(request, f'Row {row_number}: {error}')
+        if report.error_count > IMPORT_ERRORS_SHOWN:
+            messages.warning(request, f'... and {report.error_count - IMPORT_ERRORS_SHOWN} more.')
+    else:
+        messages.success(request, f'Imported {report.imported} patients.')
+    return redirect('hospital_patients', hospital_id=hospital_id)
+
+@login_required
+def hospital_patients_page(request, hospital_id):
+    try:
+        patients, next_cursor = _hospital_patients_page(request, hospital_id)
+    except InvalidCursor as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    
+    return JsonResponse({
+        'html': render_to_string('audit/includes/patient_rows.html', {'patients': patients}, request=request),
+        'next_url': _next_page_url(request, reverse('hospital_patients_page', args=[hospital_id]), next_cursor)
+    })
+
+def _point(request):
+    """The ``lat``/``lon`` query parameters as floats; ValueError when missing or out of range."""
+    latitude, longitude = float(request.GET['lat']), float(request.GET['lon'])
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError('Coordinates out of range')
+    return latitude, longitude
+
+@login_required
+def audits_nearby(request):
+    try:
+        latitude, longitude = _point(request)
+        radius_km = float(request.GET.get('radius_km', 5))
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            raise ValueError(f'radius_km must be between 0 and {MAX_RADIUS_KM}')
+    except (KeyError, ValueError) as e:
+        return JsonResponse({'error': f'Invalid parameters: {e}'}, status=400)
+
+    found = audits_within(
+        latitude, longitude, radius_km,
+        fields=('id', 'hospital_id', 'ehcp_name', 'district__name', 'visit_date', 'auditor_name'),
+    )
+    return FastJsonResponse({
+        'audits': [
+            {
+                'id': row['id'],
+                'hospital_id': row['hospital_id'],
+                'ehcp_name': row['ehcp_name'],
+                'district': row['district__name'],
+                'visit_date': row['visit_date'].strftime('%Y-%m-%d'),
+                'auditor_name': row['auditor_name'],
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude']),
+                'distance_km': round(distance, 3),
+            }
+            for distance, row in found[:NEARBY_AUDITS_LIMIT]
+        ],
+        'total': len(found),
+    })
+
+@login_required
+def hospitals_nearest(request):
+    try:
+        latitude, longitude = _point(request)
+        limit = min(max(int(request.GET.get('limit', 5)), 1), 50)
+    except (KeyError, ValueError) as e:
+        return JsonResponse({'error': f'Invalid parameters: {e}'}, status=400)
+
+    return FastJsonResponse({
+        'hospitals': [
+            {
+                'hospital_id': row['hospital_id'],
+                'ehcp_name': row['hospital__name'],
+                'district': row['district__name'],
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude']),
+                'distance_km': round(distance, 3),
+            }
+            for distance, row in nearest_hospitals(latitude, longitude, limit)
+        ]
+    })
+
+@login_required
+def audit_heatmap(request):
+    try:
+        precision = int(request.GET.get('precision', 5))
+        if precision not in HEATMAP_PRECISIONS:
+            raise ValueError(f'precision must be between {HEATMAP_PRECISIONS.start} and {HEATMAP_PRECISIONS.stop - 1}')
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid parameters: {e}'}, status=400)
+
+    audits = FieldAudit.objects.all()
+    if request.GET.get('district'):
+        audits = audits.filter(district_id=request.GET['district'])
+    return FastJsonResponse({'precision': precision, 'cells': heatmap(precision, audits)})
+
+@login_required
+def resolve_district(request):
+    """The district containing a point, from the local boundaries file."""
+    try:
+        latitude, longitude = _point(request)
+    except (KeyError, ValueError) as e:
+        return JsonResponse({'error': f'Invalid parameters: {e}'}, status=400)
+
+    name = resolve_district_name(latitude, longitude)
+    district = District.objects.filter(name__iexact=name).only('id', 'name').first() if name else None
+    return JsonResponse({
+        'district': district.name if district else None,
+        'district_id': district.id if district else None,
+        'boundary_name': name,
+    })
+
+@login_required
+def search(request):
+    """Global search: patients by exact ID, word prefix or similar name, and hospitals by code or name."""
+    term = request.GET.get('q', '').strip()
+    if len(term) < 2:
+        return JsonResponse({'error': 'Search for at least 2 characters'}, status=400)
+
+    patient_ids = search_patient_ids(term)
+    patients = Patient.objects.select_related('audit').only(
+        'id', 'case_id', 'patient_name', 'mobile_number', 'package_name', 'package_code',
+        'admission_date', 'audit__hospital_id', 'audit__ehcp_name'
+    ).in_bulk(patient_ids)
+    data = {
+        'patients': [
+            {
+                'id': patient.id,
+                'case_id': patient.case_id,
+                'patient_name': patient.patient_name,
+                'mobile_number': patient.mobile_number,
+                'package_name': patient.package_name,
+                'package_code': patient.package_code,
+                'admission_date': patient.admission_date.strftime('%Y-%m-%d'),
+                'hospital_id': patient.audit.hospital_id,
+                'ehcp_name': patient.audit.ehcp_name,
+            }
+            # in_bulk() loses the relevance order
+            for patient in (patients[patient_id] for patient_id in patient_ids if patient_id in patients)
+        ],
+        'hospitals': [
+            {
+                'hospital_id': hospital.code,
+                'ehcp_name': hospital.name,
+                'district': hospital.district.name,
+                'url': reverse('hospital_patients', args=[hospital.code]),
+            }
+            for hospital in search_hospitals(term)
+        ],
+    }
+    return FastJsonResponse(data)
+
+@login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=patient_etag, last_modified_func=patient_last_modified)
 def get_patient(request, patient_id):
     if request.method != 'GET':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
         
     try:
-        patient = get_object_or_404(Patient, id=patient_id)
+        patient = get_object_or_404(Patient.objects.for_detail(), id=patient_id)
         data = {
             'id': patient.id,
             'case_id': patient.case_id,
@@ -669,7 +845,7 @@ def get_patient(request, patient_id):
             'discharge_summary': patient.discharge_summary.url if patient.discharge_summary else None,
             'bills_documents': patient.bills_documents.url if patient.bills_documents else None
         }
-        return JsonResponse(data)
+        return FastJsonResponse(data)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
@@ -733,43 +909,49 @@ def delete_patient(request, patient_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=hospital_etag, last_modified_func=hospital_last_modified)
 def get_hospital(request, hospital_id):
     if request.method != 'GET':
         return JsonResponse({'error': 'Method not allowed'}, status=405)
         
     try:
-        hospital = FieldAudit.objects.filter(hospital_id=hospital_id).latest('visit_date')
+        hospital = Hospital.objects.select_related('district').get(code=hospital_id)
+        audit = hospital.latest_audit(*AUDIT_PREFILL_FIELDS)
         data = {
-            'hospital_id': hospital.hospital_id,
-            'ehcp_name': hospital.ehcp_name,
+            'hospital_id': hospital.code,
+            'ehcp_name': hospital.name,
             'ehcp_type': hospital.ehcp_type,
             'district': hospital.district.name,
-            'auditor_name': hospital.auditor_name,
-            'designation': hospital.designation,
-            'current_location': hospital.current_location,
-            'latitude': hospital.latitude,
-            'longitude': hospital.longitude,
-            'visit_date': hospital.visit_date.strftime('%Y-%m-%d'),
-            'visit_time': hospital.visit_time.strftime('%H:%M:%S') if hospital.visit_time else '',
-            'ekgp_patients': hospital.ekgp_patients,
-            'pmjay_patients': hospital.pmjay_patients,
-            'beneficiaries': hospital.beneficiaries,
-            'findings_type': hospital.findings_type,
-            'audit_findings_value': hospital.audit_findings_value,
-            'finding_type': hospital.finding_type,
-            'abuse_type': hospital.abuse_type,
-            'oope_type': hospital.oope_type,
-            'hnqa_value': hospital.hnqa_value,
-            'hnqa_type': hospital.hnqa_type,
-            'infrastructure_type': hospital.infrastructure_type,
-            'hr_type': hospital.hr_type,
-            'services_type': hospital.services_type,
-            'fraudulent_value': hospital.fraudulent_value,
-            'fraudulent_type': hospital.fraudulent_type,
-            'observations': hospital.observations
         }
-        return JsonResponse(data)
-    except FieldAudit.DoesNotExist:
+        if audit:
+            data.update({
+                'auditor_name': audit.auditor_name,
+                'designation': audit.designation,
+                'current_location': audit.current_location,
+                'latitude': audit.latitude,
+                'longitude': audit.longitude,
+                'visit_date': audit.visit_date.strftime('%Y-%m-%d'),
+                'visit_time': audit.visit_time.strftime('%H:%M:%S') if audit.visit_time else '',
+                'ekgp_patients': audit.ekgp_patients,
+                'pmjay_patients': audit.pmjay_patients,
+                'beneficiaries': audit.beneficiaries,
+                'findings_type': audit.findings_type,
+                'audit_findings_value': audit.audit_findings_value,
+                'finding_type': audit.finding_type,
+                'abuse_type': audit.abuse_type,
+                'oope_type': audit.oope_type,
+                'hnqa_value': audit.hnqa_value,
+                'hnqa_type': audit.hnqa_type,
+                'infrastructure_type': audit.infrastructure_type,
+                'hr_type': audit.hr_type,
+                'services_type': audit.services_type,
+                'fraudulent_value': audit.fraudulent_value,
+                'fraudulent_type': audit.fraudulent_type,
+                'observations': audit.observations
+            })
+        return FastJsonResponse(data)
+    except Hospital.DoesNotExist:
         return JsonResponse({'error': 'Hospital not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -778,32 +960,39 @@ def get_hospital(request, hospital_id):
 @require_http_methods(["POST"])
 def edit_hospital(request, hospital_id):
     try:
-        hospital = get_object_or_404(FieldAudit, hospital_id=hospital_id)
+        hospital = get_object_or_404(Hospital, code=hospital_id)
         
         # Get district
         district_name = request.POST.get('district')
         district = get_object_or_404(District, name=district_name)
         
-        # Update hospital fields
-        hospital.ehcp_name = request.POST.get('ehcp_name')
-        hospital.ehcp_type = request.POST.get('ehcp_type')
-        hospital.district = district
-        hospital.auditor_name = request.POST.get('auditor_name')
-        hospital.designation = request.POST.get('designation')
-        hospital.current_location = request.POST.get('current_location') or hospital.ehcp_name  # Use hospital name if location not provided
-        hospital.latitude = request.POST.get('latitude')
-        hospital.longitude = request.POST.get('longitude')
-        hospital.visit_date = request.POST.get('visit_date')
-        hospital.visit_time = request.POST.get('visit_time')
-        hospital.ekgp_patients = request.POST.get('ekgp_patients', 0)
-        hospital.pmjay_patients = request.POST.get('pmjay_patients', 0)
-        hospital.beneficiaries = request.POST.get('beneficiaries', 0)
-        hospital.audit_findings = request.POST.get('audit_findings', 'No')
-        hospital.hnqa_related = request.POST.get('hnqa_related', 'No')
-        hospital.other_fraudulent_activities = request.POST.get('other_fraudulent_activities', 'No')
-        hospital.observations = request.POST.get('observations', '')
-        
-        hospital.save()
+        with transaction.atomic():
+            # Update hospital fields
+            hospital.name = request.POST.get('ehcp_name')
+            hospital.ehcp_type = request.POST.get('ehcp_type')
+            hospital.district = district
+            hospital.save()
+
+            # Visit details belong to the most recent audit of the hospital; earlier
+            # audits keep the name and type recorded at their visit
+            audit = hospital.latest_audit()
+            if audit:
+                audit.ehcp_name = hospital.name
+                audit.ehcp_type = hospital.ehcp_type
+                audit.district = district
+                audit.auditor_name = request.POST.get('auditor_name')
+                audit.designation = request.POST.get('designation')
+                audit.current_location = request.POST.get('current_location') or hospital.name  # Use hospital name if location not provided
+                audit.latitude = request.POST.get('latitude') or None
+                audit.longitude = request.POST.get('longitude') or None
+                audit.visit_date = request.POST.get('visit_date')
+                audit.visit_time = request.POST.get('visit_time')
+                audit.ekgp_patients = request.POST.get('ekgp_patients', 0)
+                audit.pmjay_patients = request.POST.get('pmjay_patients', 0)
+                audit.beneficiaries = request.POST.get('beneficiaries', 0)
+                audit.observations = request.POST.get('observations', '')
+                audit.save()
+
         messages.success(request, 'Hospital details updated successfully.')
         return JsonResponse({'success': True})
         
@@ -814,11 +1003,13 @@ def edit_hospital(request, hospital_id):
 @require_http_methods(["POST"])
 def delete_hospital(request, hospital_id):
     try:
-        hospital = FieldAudit.objects.get(hospital_id=hospital_id)
-        hospital.delete()
+        hospital = Hospital.objects.get(code=hospital_id)
+        with transaction.atomic():
+            hospital.audits.all().delete()
+            hospital.delete()
         messages.success(request, 'Hospital record deleted successfully.')
         return JsonResponse({'success': True})
-    except FieldAudit.DoesNotExist:
+    except Hospital.DoesNotExist:
         return JsonResponse({'error': 'Hospital not found'}, status=404)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -831,21 +1022,22 @@ def admin_panel(request):
     
     try:
         # Get statistics
+        snapshot = StatsSnapshot()
         stats = {
-            'total_patients': Patient.objects.count(),
-            'total_audits': FieldAudit.objects.count(),
-            'total_districts': District.objects.count(),
+            'total_patients': snapshot.totals['patients'],
+            'total_audits': snapshot.totals['audits'],
+            'total_districts': snapshot.total_districts,
             'total_users': User.objects.count(),
         }
         
         # Get recent audits
-        recent_audits = FieldAudit.objects.select_related('district').order_by('-created_at')[:5]
+        recent_audits = FieldAudit.objects.for_summary().order_by('-created_at')[:5]
         
         # Get districts
-        districts = District.objects.annotate(
-            audit_count=Count('fieldaudit'),
-            patient_count=Count('fieldaudit__patients')
-        ).order_by('name')
+        districts = [
+            {'id': district['id'], 'name': district['name'], 'audit_count': district['audits'], 'patient_count': district['patients']}
+            for district in snapshot.districts
+        ]
         
         # Get users
         users = User.objects.all().order_by('-date_joined')
@@ -994,36 +1186,36 @@ def audit_statistics(request):
     if not request.user.is_superuser:
         return JsonResponse({'status': 'error', 'message': 'Access denied'})
     
-    total_audits = FieldAudit.objects.count()
-    completed_audits = FieldAudit.objects.filter(status='Completed').count()
-    pending_audits = FieldAudit.objects.filter(status='Pending').count()
-    in_progress_audits = FieldAudit.objects.filter(status='In Progress').count()
+    stats = StatsSnapshot()
     
-    fraud_cases = Patient.objects.filter(
-        Q(money_collection=True) | 
-        Q(missing_records=True)
-    ).count()
-    
-    district_stats = District.objects.annotate(
-        audit_count=Count('fieldaudit'),
-        fraud_count=Count('fieldaudit__patients', filter=Q(
-            fieldaudit__patients__money_collection=True) | 
-            Q(fieldaudit__patients__missing_records=True)
-        )
-    ).values('name', 'audit_count', 'fraud_count')
+    district_stats = [
+        {'name': district['name'], 'audit_count': district['audits'], 'fraud_count': district['patients_flagged']}
+        for district in stats.districts
+    ]
     
     return JsonResponse({
         'status': 'success',
         'data': {
-            'total_audits': total_audits,
-            'completed_audits': completed_audits,
-            'pending_audits': pending_audits,
-            'in_progress_audits': in_progress_audits,
-            'fraud_cases': fraud_cases,
-            'district_stats': list(district_stats)
+            'total_audits': stats.totals['audits'],
+            'completed_audits': stats.totals['audits_completed'],
+            'pending_audits': stats.totals['audits_pending'],
+            'in_progress_audits': stats.totals['audits_in_progress'],
+            'fraud_cases': stats.totals['patients_flagged'],
+            'district_stats': district_stats
         }
     })
 
+@login_required
+def request_metrics(request):
+    """Latency and query statistics per URL name from RequestMetricsMiddleware, for this process."""
+    if not request.user.is_superuser:
+        return JsonResponse({'status': 'error', 'message': 'Access denied'}, status=403)
+
+    return FastJsonResponse({
+        'window_minutes': histogram.minutes,
+        'views': histogram.snapshot(),
+    })
+
 @login_required
 def admin_dashboard(request):
     if not request.user.is_superuser:
@@ -1034,8 +1226,8 @@ def admin_dashboard(request):
     current_date = timezone.now()
     
     # Basic statistics
-    total_patients = Patient.objects.count()
-    total_audits = FieldAudit.objects.count()
+    stats = StatsSnapshot()
+    total_patients = stats.totals['patients']
     
     # Mock data for demonstration
     todays_appointments = 15
@@ -1044,24 +1236,18 @@ def admin_dashboard(request):
     monthly_revenue = "45,000"
     
     # Get recent audits
-    recent_audits = FieldAudit.objects.order_by('-created_at')[:5]
+    recent_audits = FieldAudit.objects.for_summary().order_by('-created_at')[:5]
     
     # Get monthly audit counts
-    six_months_ago = current_date - timedelta(days=180)
-    monthly_audits = FieldAudit.objects.filter(
-        created_at__gte=six_months_ago
-    ).annotate(
-        month=TruncMonth('created_at')
-    ).values('month').annotate(
-        count=Count('id')
-    ).order_by('month')
+    six_months_ago = (current_date - timedelta(days=180)).date().replace(day=1)
+    monthly_audits = [
+        {'month': month, 'count': counters['audits']}
+        for month, counters in stats.months(since=six_months_ago)
+    ]
     
     # Calculate compliance rate
-    total_reviews = Patient.objects.count()
-    compliant = Patient.objects.filter(
-        Q(money_collection=False) & 
-        Q(missing_records=False)
-    ).count()
+    total_reviews = stats.totals['patients']
+    compliant = stats.totals['patients_compliant']
     compliance_rate = (compliant / total_reviews * 100) if total_reviews > 0 else 0
     
     context = {
@@ -1072,220 +1258,137 @@ def admin_dashboard(request):
         'total_doctors': total_doctors,
         'monthly_revenue': monthly_revenue,
         'recent_audits': recent_audits,
-        'monthly_audits': list(monthly_audits),
+        'monthly_audits': monthly_audits,
         'compliance_rate': compliance_rate,
     }
     
     return render(request, 'audit/admin_dashboard.html', context)
 
 @login_required
-def create_hospital(request):
+def create_hospital(request, hospital_id):
     if request.method == 'POST':
         try:
             district = get_object_or_404(District, id=request.POST.get('district'))
-            hospital = FieldAudit.objects.create(
-                district=district,
-                hospital_id=request.POST.get('hospital_id'),
-                ehcp_name=request.POST.get('ehcp_name'),
-                ehcp_type=request.POST.get('ehcp_type'),
-                auditor_name=request.user.get_full_name() or request.user.username,
-                designation='Auditor',  # Default value
-                current_location=district.name,
-                latitude=request.POST.get('latitude'),
-                longitude=request.POST.get('longitude'),
-                visit_date=timezone.now().date(),
-                visit_time=timezone.now().time(),
-            )
+            if Hospital.objects.filter(code=hospital_id).exists():
+                messages.error(request, 'A hospital with this ID already exists.')
+                return redirect('hospital_patients', hospital_id=hospital_id)
+
+            with transaction.atomic():
+                hospital = Hospital.objects.create(
+                    code=hospital_id,
+                    name=request.POST.get('ehcp_name'),
+                    ehcp_type=request.POST.get('ehcp_type'),
+                    district=district,
+                )
+                # Patients are attached to audits, so start the hospital with an initial visit
+                FieldAudit.objects.create(
+                    district=district,
+                    hospital=hospital,
+                    ehcp_name=hospital.name,
+                    ehcp_type=hospital.ehcp_type,
+                    auditor_name=request.user.get_full_name() or request.user.username,
+                    designation='Auditor',  # Default value
+                    current_location=district.name,
+                    latitude=request.POST.get('latitude'),
+                    longitude=request.POST.get('longitude'),
+                    visit_date=timezone.now().date(),
+                    visit_time=timezone.now().time(),
+                )
             messages.success(request, 'Hospital created successfully.')
-            return redirect('hospital_patients', hospital_id=hospital.hospital_id)
+            return redirect('hospital_patients', hospital_id=hospital.code)
         except Exception as e:
             messages.error(request, f'Error creating hospital: {str(e)}')
-            return redirect('hospital_patients', hospital_id=request.POST.get('hospital_id'))
+            return redirect('hospital_patients', hospital_id=hospital_id)
     
     return redirect('hospital_records')
 
+def _queued_download(request, export_type, hospital_id):
+    """Queue a hospital export instead of building the workbook in the request.
+
+    The export buttons queue and poll through export_jobs.js; these links
+    are what they fall back to without JavaScript.
+    """
+    hospital = get_object_or_404(Hospital, code=hospital_id)
+    _queue_export(request.user, export_type, hospital.code)
+    messages.info(request, 'Your export is being prepared in the background. Download it from this page once it is ready.')
+    return redirect('hospital_patients', hospital_id=hospital.code)
+
 @login_required
 def download_patient_data(request, hospital_id):
-    hospital = get_object_or_404(FieldAudit, hospital_id=hospital_id)
-    patients = Patient.objects.filter(audit__hospital_id=hospital_id)
-    
-    # Create data for Excel
-    data = []
-    for patient in patients:
-        # Get deviation list as comma-separated string
-        deviations = ', '.join(patient.deviations) if patient.deviations else 'None'
-        
-        # Get document status
-        documents = []
-        if patient.patient_photo:
-            documents.append('Photo')
-        if patient.case_file:
-            documents.append('Case File')
-        if patient.discharge_summary:
-            documents.append('Discharge Summary')
-        if patient.bills_documents:
-            documents.append('Bills')
-        documents_status = ', '.join(documents) if documents else 'None'
-        
-        data.append({
-            'Hospital Name': hospital.ehcp_name,
-            'Hospital ID': hospital.hospital_id,
-            'District': hospital.district.name,
-            'Case ID': patient.case_id,
-            'Patient Name': patient.patient_name,
-            'Mobile Number': patient.mobile_number,
-            'Admission Date': patient.admission_date.strftime('%d/%m/%Y') if patient.admission_date else '',
-            'Discharge Date': patient.discharge_date.strftime('%d/%m/%Y') if patient.discharge_date else '',
-            'Package Name': patient.package_name,
-            'Package Code': patient.package_code,
-            'Mandatory Records': 'No' if patient.missing_records else 'Yes',
-            'Deviations': deviations,
-            'OOPE Amount': patient.total_oope,
-            'Documents': documents_status
-        })
-    
-    # Create DataFrame
-    df = pd.DataFrame(data)
-    
-    # Create Excel response
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename="{hospital.ehcp_name}_patients_{datetime.now().strftime("%Y%m%d")}.xlsx"'
-    
-    # Write to Excel
-    with pd.ExcelWriter(response, engine='openpyxl') as writer:
-        df.to_excel(writer, index=False, sheet_name='Patient Data')
-        
-        # Auto-adjust columns' width
-        worksheet = writer.sheets['Patient Data']
-        for idx, col in enumerate(df.columns):
-            max_length = max(
-                df[col].astype(str).apply(len).max(),
-                len(str(col))
-            ) + 2
-            worksheet.column_dimensions[chr(65 + idx)].width = min(max_length, 50)
-    
-    return response
+    return _queued_download(request, 'patient_data', hospital_id)
 
 @login_required
 def download_patient_excel(request, hospital_id):
-    hospital = get_object_or_404(FieldAudit, hospital_id=hospital_id)
-    patients = Patient.objects.filter(audit__hospital_id=hospital_id)
-    
-    # Create a new workbook and select the active sheet
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Patient Details"
-    
-    # Define styles
-    header_font = Font(name='Arial', size=11, bold=True, color='FFFFFF')
-    header_fill = PatternFill(start_color='366092', end_color='366092', fill_type='solid')
-    hospital_font = Font(name='Arial', size=11, bold=True)
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
+    return _queued_download(request, 'patient_excel', hospital_id)
+
+def _queue_export(user, export_type, hospital_id=''):
+    """The user's queued or running export of this kind, queuing a new one if there is none."""
+    # Re-use an export the user already has queued instead of piling up duplicates
+    job = ExportJob.objects.filter(
+        requested_by=user,
+        export_type=export_type,
+        hospital_id=hospital_id,
+        status__in=['Pending', 'Running'],
+    ).first()
+    if job is None:
+        job = ExportJob.objects.create(
+            requested_by=user,
+            export_type=export_type,
+            hospital_id=hospital_id,
+        )
+    return job
+
+def _export_job_data(job):
+    return {
+        'id': job.id,
+        'export_type': job.export_type,
+        'hospital_id': job.hospital_id,
+        'status': job.status,
+        'progress': job.progress,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+        'status_url': reverse('export_job_status', args=[job.id]),
+        'download_url': reverse('download_export', args=[job.id]) if job.is_downloadable else None,
+    }
+
+@login_required
+@require_http_methods(["POST"])
+def request_export(request, export_type):
+    if export_type not in dict(ExportJob.EXPORT_TYPES):
+        return JsonResponse({'error': 'Unknown export type'}, status=400)
+
+    hospital_id = request.POST.get('hospital_id', '')
+    if export_type != 'all_data':
+        if not hospital_id:
+            return JsonResponse({'error': 'Hospital ID is required'}, status=400)
+        if not Hospital.objects.filter(code=hospital_id).exists():
+            return JsonResponse({'error': 'Hospital not found'}, status=404)
+
+    try:
+        job = _queue_export(request.user, export_type, hospital_id)
+        return JsonResponse(_export_job_data(job), status=202)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+@login_required
+def export_job_status(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, requested_by=request.user)
+    return JsonResponse(_export_job_data(job))
+
+@login_required
+def download_export(request, job_id):
+    job = get_object_or_404(ExportJob, id=job_id, requested_by=request.user)
+    if not job.is_downloadable:
+        if job.is_expired:
+            messages.error(request, 'This export has expired. Please request a new download.')
+        else:
+            messages.warning(request, 'This export is not ready yet.')
+        return redirect('view_records')
+
+    return FileResponse(
+        job.file.open('rb'),
+        as_attachment=True,
+        filename=os.path.basename(job.file.name),
+        content_type=XLSX_CONTENT_TYPE,
     )
-    
-    # Add hospital details in first row
-    ws.merge_cells('A1:B1')
-    ws.merge_cells('C1:D1')
-    ws.merge_cells('E1:F1')
-    
-    ws['A1'] = f"Hospital Name: {hospital.ehcp_name}"
-    ws['C1'] = f"Hospital ID: {hospital.hospital_id}"
-    ws['E1'] = f"District: {hospital.district.name if hospital.district else ''}"
-    
-    # Style hospital details
-    for cell in ['A1', 'C1', 'E1']:
-        ws[cell].font = hospital_font
-        ws[cell].border = border
-        ws[cell].alignment = Alignment(horizontal='left', vertical='center')
-    
-    # Add headers in second row
-    headers = [
-        'SI.NO', 'Case ID', 'Patient Name', 'Mobile Number', 'Admission Date', 
-        'Discharge Date', 'Package Name', 'Package Code', 'Mandatory Records',
-        'Deviations', 'OOPE Amount'
-    ]
-    
-    # Write and style headers
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=2, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.border = border
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-    
-    # Write data starting from row 3
-    row = 3
-    for index, patient in enumerate(patients, 1):
-        # Format deviations - convert list to string
-        deviations = patient.deviations
-        if isinstance(deviations, list):
-            deviations = ', '.join(deviations) if deviations else 'None'
-        elif deviations is None:
-            deviations = 'None'
-        
-        # Add data
-        data = [
-            index,  # SI.NO
-            patient.case_id,
-            patient.patient_name,
-            patient.mobile_number,
-            patient.admission_date.strftime('%d/%m/%Y') if patient.admission_date else '',
-            patient.discharge_date.strftime('%d/%m/%Y') if patient.discharge_date else '',
-            patient.package_name,
-            patient.package_code,
-            'Yes' if patient.missing_records else 'No',
-            deviations,
-            patient.total_oope if patient.total_oope else 0
-        ]
-        
-        # Write and style each cell
-        for col, value in enumerate(data, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            cell.border = border
-            cell.alignment = Alignment(horizontal='left', vertical='center')
-            cell.font = Font(name='Arial', size=10)
-            
-            # Center align specific columns
-            if col in [1, 3, 4, 5, 8]:  # SI.NO, Mobile, Dates, and Mandatory Records
-                cell.alignment = Alignment(horizontal='center', vertical='center')
-            
-            # Right align amount
-            if col == 11:  # OOPE Amount (now column 11 due to SI.NO)
-                cell.alignment = Alignment(horizontal='right', vertical='center')
-                cell.number_format = '#,##0.00'
-        
-        row += 1
-    
-    # Auto-adjust column widths
-    for col in range(1, len(headers) + 1):
-        column = get_column_letter(col)
-        max_length = 0
-        column_cells = ws[column]
-        
-        for cell in column_cells:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column].width = min(adjusted_width, 25)  # Reduced max width to make columns more compact
-    
-    # Set row heights
-    ws.row_dimensions[1].height = 20  # Hospital details row
-    ws.row_dimensions[2].height = 20  # Headers row
-    
-    # Freeze the header rows
-    ws.freeze_panes = 'A3'
-    
-    # Create response
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = f'attachment; filename=patient_details_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    wb.save(response)
-    return response